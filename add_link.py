@@ -10,8 +10,18 @@ from util import init_args
 from util import handler
 from util import create_network
 from util import connect_node_to_network
+from util import direct_link_commands
+from util import helper_plan
+from util import xml_network
+from util import xml_interface
+from util import NETWORK_IDS
+from util import is_interface_connected
 from util import init_server_info
 from util import args_check
+from util import TRACE
+from util import show_result
+from util import EXIT_USAGE
+from util import EXIT_CONFLICT
 
 if __name__ == "__main__":
     dotenv.load_dotenv()
@@ -21,147 +31,193 @@ if __name__ == "__main__":
 
 
     signal(SIGINT, handler)
-    args = init_args().parse_args()
+    parser = init_args()
+    parser.add_argument(
+        "--datapath",
+        choices=["bridge", "direct"],
+        default="bridge",
+        help="bridge: taps of a node to node link on a linux bridge. direct: taps cross connected "
+             "with tc mirred, no bridge. direct needs both nodes running, else bridge is used.",
+    )
+    args = parser.parse_args()
 
     # login to eve api server as admin
-    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass)
-
-    args_check(args, eve_http)
-
-    if eve_http.lab_networks:
-        for _, network in eve_http.lab_networks.items():
-            if network["visibility"] == 1:
-                eve_http.lab_nodes.append({
-                    "id": f"net{network['id']}",
-                    "name": network["name"],
-                    "status": "passive",
-                    "type": network["type"], 
-                    "ethernet": str(network["count"])
-                })
-
-    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass)
-    eve_ssh.connect()
-
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh)
+
+    # interfaces of all nodes, used to pick ports and check if they are connected.
+    # with both end points given only the interfaces of their nodes are fetched.
+    TRACE.phase("port map")
+    if not (args.node_a and args.node_b):
+        eve_http.get_port_map()
+
+    # visible networks can be picked like nodes, their id in the table is net<network id>
+    eve_http.lab_nodes.extend(network.node_row() for network in eve_http.topology.visible_networks())
+
+    TRACE.phase("select interfaces")
+    # a broken ssh connection should stop us before the user answers any question
+    if not (args.node_a and args.node_b):
+        eve_ssh.wait_connected()
     print("[    Info  ] ==> Insert Information for Node A and B")
-    node_a, node_a_intf, node_a_type = eve_http.select_node_interface(device="A")
+    node_a, node_a_intf, node_a_type = eve_http.select_node_interface(device="A", end_point=args.node_a)
     # check if interface is not connected
-    if node_a_type != "net" and node_a_intf["connected"] == "True":
-        print(f"[    Error ] ==> Interface {node_a_intf['name']} on device {node_a['name']} is connected already.")
-        sys.exit(1)
-    node_b, node_b_intf, node_b_type = eve_http.select_node_interface(device="B")
+    if node_a_type != "net" and node_a_intf.connected:
+        print(f"[    Error ] ==> Interface {node_a_intf.name} on device {node_a.name} is connected already.")
+        sys.exit(EXIT_CONFLICT)
+    node_b, node_b_intf, node_b_type = eve_http.select_node_interface(device="B", end_point=args.node_b)
     # check if interface is not connected
-    if node_b_type != "net" and node_b_intf["connected"] == "True":
-        print(f"[    Error ] ==> Interface {node_b_intf['name']} on device {node_b['name']} is connected already.")
-        sys.exit(1)
+    if node_b_type != "net" and node_b_intf.connected:
+        print(f"[    Error ] ==> Interface {node_b_intf.name} on device {node_b.name} is connected already.")
+        sys.exit(EXIT_CONFLICT)
 
     if node_a_type == "node" and node_b_type == "node":
-        linux_intf_a = f"vunl{eve_http.user_id}_{node_a['id']}_{node_a_intf['id']}"
-        linux_intf_b = f"vunl{eve_http.user_id}_{node_b['id']}_{node_b_intf['id']}"
+        linux_intf_a = node_a_intf.linux_name
+        linux_intf_b = node_b_intf.linux_name
         print(f"[    Info  ] ==> NOde A interface name on Linux = {linux_intf_a}")
         print(f"[    Info  ] ==> NOde B interface name on Linux = {linux_intf_b}")
 
-        # get not used bridge id
-        if eve_http.lab_networks:
-            net_ids = [int(item) for item in eve_http.lab_networks]
-            net_ids.sort()
-            max = net_ids[-1]
-            not_used_ids = []
-            for item in range(1, max+1):
-                if item not in net_ids:
-                    not_used_ids.append(item)
-            if not_used_ids:
-                network_id = not_used_ids[0]
-            else:
-                network_id = max + 1
-        else:
-            network_id = 1
-        bridge_name = f"vnet{ eve_http.user_id }_{network_id}"
-        print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
-
-        # read lab file
-        lab_file = eve_ssh.get_lab_file(lab_info=eve_http.lab)
-
-        if "networks" in lab_file["lab"]["topology"]:
-            lab_networks = lab_file["lab"]["topology"]["networks"]
+        network_name = f'Net-{node_a.name}iface_{node_a_intf.id}'
+
+        def add_network(lab_file):
+            # runs under the lab lock, so the free network id is reserved by the write
+            for node, node_intf in [(node_a, node_a_intf), (node_b, node_b_intf)]:
+                if is_interface_connected(lab_file, node.id, node_intf.id):
+                    print(f"[    Error ] ==> Interface {node_intf.name} on device {node.name} is connected already.")
+                    sys.exit(EXIT_CONFLICT)
+            network_id = NETWORK_IDS(lab_file.network_ids()).allocate()
+            create_network(lab_file, network_id, network_name)
+            connect_node_to_network(lab_file, node_a, node_a_intf, network_id)
+            connect_node_to_network(lab_file, node_b, node_b_intf, network_id)
+            return network_id
+
+        datapath = args.datapath
+        if datapath == "direct" and not (node_a.running and node_b.running):
+            # the taps exist only while the nodes run, eve-ng puts them on the bridge when they start
+            print("[    Warrning ] ==> direct datapath needs both nodes running, use a Linux bridge")
+            datapath = "bridge"
+        profiles = eve_ssh.bridge_profiles
+        if datapath == "direct":
+            # the lab file keeps the hidden network, so eve-ng shows the link and
+            # uses a bridge for it again when a node is restarted
+            print("[    Info  ] ==> cross connect node interfaces with tc mirred, no Linux bridge")
         else:
-            lab_file["lab"]["topology"]["networks"] = {}
-            lab_networks = lab_file["lab"]["topology"]["networks"]
-        lab_nodes = lab_file["lab"]["topology"]["nodes"]
-
-        
-        create_network(lab_networks, network_id, f'Net-{node_a["name"]}iface_{node_a_intf["id"]}')
-        connect_node_to_network(lab_nodes, node_a, node_a_intf, network_id)
-        connect_node_to_network(lab_nodes, node_b, node_b_intf, network_id)
+            print("[    Info  ] ==> create Linux bridge interface and connect node interfaces to bridge")
+            print(f"[    Info  ] ==> Bridge profile = {profiles.select(hidden=True)}")
+
+        def kernel_commands(bridge_name):
+            # (tool, commands) that connect the taps once the network is in the lab file
+            if datapath == "direct":
+                return "tc", direct_link_commands(linux_intf_a, linux_intf_b)
+            commands = profiles.create_commands(bridge_name, hidden=True)
+            if node_a.running:
+                commands.extend(profiles.attach_commands(linux_intf_a, bridge_name, hidden=True))
+            if node_b.running:
+                commands.extend(profiles.attach_commands(linux_intf_b, bridge_name, hidden=True))
+            return "ip", commands
 
         print("[    Info  ] ==> Update lab file")
-        eve_ssh.update_lab_file(lab_info=eve_http.lab, file_data=lab_file)
-
-        print("[    Info  ] ==> create Linux bridge interface")
-        eve_ssh.send_command(f"ip link add {bridge_name} mtu 9000 type bridge")
-        eve_ssh.send_command(f"ip link set {bridge_name} up")
-        print("[    Info  ] ==> connect node interfaces to bridge")
-        if node_a["status"] == "ON":
-            eve_ssh.send_command(f"ip link set {linux_intf_a} master {bridge_name}")
-        if node_b["status"] == "ON":
-            eve_ssh.send_command(f"ip link set {linux_intf_b} master {bridge_name}")
-
-
+        helper = None
+        if eve_ssh.server_helper:
+            # lab file and kernel in one command on the server, the network id is chosen there
+            TRACE.phase("server helper")
+            tool, commands = kernel_commands(f"vnet{eve_http.user_id}_{{network_id}}")
+            edits = [{"op": "check_free", "node": node.id, "interface": node_intf.id,
+                      "error": f"Interface {node_intf.name} on device {node.name} is connected already."}
+                     for node, node_intf in [(node_a, node_a_intf), (node_b, node_b_intf)]]
+            edits.append({"op": "create_network", "network": xml_network("{network_id}", network_name)})
+            edits.extend({"op": "connect", "node": node.id, "interface": xml_interface(node_intf, "{network_id}")}
+                         for node, node_intf in [(node_a, node_a_intf), (node_b, node_b_intf)])
+            helper = eve_ssh.run_helper(helper_plan(eve_http.lab, eve_http.user_id, edits,
+                                                    [{"tool": tool, "commands": commands}], allocate=True))
+        if helper:
+            network_id = helper["network_id"]
+        else:
+            TRACE.phase("update lab file")
+            network_id = eve_ssh.edit_lab_file(lab_info=eve_http.lab, edit=add_network)
+            TRACE.phase("kernel commands")
+            tool, commands = kernel_commands(f"vnet{ eve_http.user_id }_{network_id}")
+            eve_ssh.run_batch(commands, tool=tool)
+        bridge_name = "" if datapath == "direct" else f"vnet{ eve_http.user_id }_{network_id}"
+        if bridge_name:
+            print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
+        result = {"action": "add", "lab": eve_http.lab["path"], "network_id": str(network_id),
+                  "bridge": bridge_name, "datapath": datapath, "interfaces": [linux_intf_a, linux_intf_b]}
+
+
+        TRACE.phase("close")
         print("[    Info  ] ==> Close SSH connection")
         eve_ssh.client.close()
         print("[    Info  ] ==> Close HTTP connection")
         eve_http.session.close()
+        show_result(result, args.output, args.stream)
 
 
     elif node_a_type == "net" and node_b_type == "net":
         print("[    Error ] ==> cannot connect Bridge to Bridge")
-        sys.exit(1)
+        sys.exit(EXIT_USAGE)
 
     elif node_a_type == "net" or node_b_type == "net":
         if node_a_type == "node":
-            linux_intf = f"vunl{eve_http.user_id}_{node_a['id']}_{node_a_intf['id']}"
-            node = node_a
-            node_intf = node_a_intf
-            network_id = node_b["id"].split("net")[1]
-            network = node_b
+            node, node_intf, network = node_a, node_a_intf, node_b
         else:
-            linux_intf = f"vunl{eve_http.user_id}_{node_b['id']}_{node_b_intf['id']}"
-            node = node_b
-            node_intf = node_b_intf
-            network_id = node_a["id"].split("net")[1]
-            network = node_a
+            node, node_intf, network = node_b, node_b_intf, node_a
+        linux_intf = node_intf.linux_name
+        network_id = network.id
+        if args.datapath == "direct":
+            print("[    Warrning ] ==> direct datapath is only for node to node links, use the network bridge")
         
         print(f"[    Info  ] ==> Node interface name on Linux = {linux_intf}")
-        linux_interfaces = eve_ssh.get_linux_interfaces()
-
-        lab_file = eve_ssh.get_lab_file(lab_info=eve_http.lab)
-
-        if "networks" in lab_file["lab"]["topology"]:
-            lab_networks = lab_file["lab"]["topology"]["networks"]
-        else:
-            lab_file["lab"]["topology"]["networks"] = {}
-            lab_networks = lab_file["lab"]["topology"]["networks"]
-        lab_nodes = lab_file["lab"]["topology"]["nodes"]
-        
-        connect_node_to_network(lab_nodes, node, node_intf, network_id)
-
-        eve_ssh.update_lab_file(lab_info=eve_http.lab, file_data=lab_file)
-
-        if network["type"] == "bridge":
-            bridge_name = f"vnet{eve_http.user_id}_{network_id}"
-        else:
-            bridge_name = network["type"]
+        bridge_name = network.bridge_name(eve_http.user_id)
         print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
-
-        # check if bridge is exists 
-        bridge = list(filter(lambda x: x["ifname"] == bridge_name, linux_interfaces))
-        if node["status"] == "ON":
-            if not bridge:
-                eve_ssh.send_command(f"ip link add {bridge_name} mtu 9000 type bridge")
-                eve_ssh.send_command(f"ip link set {bridge_name} up")            
-            eve_ssh.send_command(f"ip link set {linux_intf} master {bridge_name}")
-
+        profiles = eve_ssh.bridge_profiles
+        error = f"Interface {node_intf.name} on device {node.name} is connected already."
+
+        helper = None
+        if eve_ssh.server_helper:
+            # the helper makes the bridge only when it is not on the host yet
+            TRACE.phase("server helper")
+            kernel = []
+            if node.running:
+                kernel.append({"tool": "ip", "if_missing": bridge_name,
+                               "commands": profiles.create_commands(bridge_name, hidden=network.hidden)})
+                kernel.append({"tool": "ip",
+                               "commands": profiles.attach_commands(linux_intf, bridge_name, hidden=network.hidden)})
+            edits = [{"op": "check_free", "node": node.id, "interface": node_intf.id, "error": error},
+                     {"op": "connect", "node": node.id, "interface": xml_interface(node_intf, network_id)}]
+            helper = eve_ssh.run_helper(helper_plan(eve_http.lab, eve_http.user_id, edits, kernel))
+        if not helper:
+            TRACE.phase("update lab file")
+            linux_interfaces = eve_ssh.get_linux_interfaces()
+
+            def add_interface(lab_file):
+                if is_interface_connected(lab_file, node.id, node_intf.id):
+                    print(f"[    Error ] ==> {error}")
+                    sys.exit(EXIT_CONFLICT)
+                connect_node_to_network(lab_file, node, node_intf, network_id)
+
+            eve_ssh.edit_lab_file(lab_info=eve_http.lab, edit=add_interface)
+
+            # check if bridge is exists 
+            bridge = list(filter(lambda x: x["ifname"] == bridge_name, linux_interfaces))
+            TRACE.phase("kernel commands")
+            if node.running:
+                commands = []
+                if not bridge:
+                    print(f"[    Info  ] ==> Bridge profile = {profiles.select(hidden=network.hidden)}")
+                    commands.extend(profiles.create_commands(bridge_name, hidden=network.hidden))
+                commands.extend(profiles.attach_commands(linux_intf, bridge_name, hidden=network.hidden))
+                eve_ssh.run_batch(commands)
+        result = {"action": "add", "lab": eve_http.lab["path"], "network_id": str(network_id),
+                  "bridge": bridge_name, "datapath": "bridge", "interfaces": [linux_intf]}
+
+        TRACE.phase("close")
         print("[    Info  ] ==> Close SSH connection")
         eve_ssh.client.close()
         print("[    Info  ] ==> Close HTTP connection")
         eve_http.session.close()
-
+        show_result(result, args.output, args.stream)
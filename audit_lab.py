@@ -0,0 +1,66 @@
+import sys
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import LAB_AUDIT
+from util import TRACE
+from util import EXIT_OK
+from util import EXIT_CONFLICT
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "--all",
+        dest="all_labs",
+        action="store_true",
+        help="Audit every lab of the user, not only the lab given with -C.",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Fix the drift found: lab files under the lab lock and the kernel with one command batch.",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh, need_lab=not args.all_labs)
+
+    lab_audit = LAB_AUDIT(eve_http, eve_ssh)
+    if args.all_labs:
+        rows = lab_audit.run(eve_http.lab_lists, repair=args.repair)
+    else:
+        # eve-ng community runs one lab per user, so bridges of the user that the running
+        # lab does not use are left overs. a lab that is not running says nothing about them.
+        running = {node.id for node in eve_http.topology.nodes.values() if node.running}
+        rows = lab_audit.run([eve_http.lab], running={eve_http.lab["path"]: running},
+                             orphans=bool(running), repair=args.repair)
+
+    TRACE.phase("close")
+    print("[    Info  ] ==> Close SSH connection")
+    eve_ssh.client.close()
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()
+    show_rows("Drift", rows, args.output, args.stream)
+    sys.exit(EXIT_OK if args.repair or not rows else EXIT_CONFLICT)
@@ -0,0 +1,61 @@
+import sys
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import EXIT_USAGE
+from util import load_batch_file
+from util import LINK_BATCH
+from util import TRACE
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "-F",
+        "--batch-file",
+        required=False,
+        help="csv, yaml or json file with add/remove link operations.",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh)
+
+    if not args.batch_file:
+        print("[    Error ] ==> batch file is needed, use -F")
+        sys.exit(EXIT_USAGE)
+    operations = load_batch_file(args.batch_file)
+    if not operations:
+        print("[    Info  ] ==> there is no operation in the batch file")
+        sys.exit(0)
+
+    link_batch = LINK_BATCH(eve_http, eve_ssh)
+    results = link_batch.run(operations)
+
+    TRACE.phase("close")
+    print("[    Info  ] ==> Close SSH connection")
+    eve_ssh.client.close()
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()
+    show_rows("Batch Result", results, args.output, args.stream)
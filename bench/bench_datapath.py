@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.util import direct_link_commands
+from util.util import direct_unlink_commands
+
+
+# latency and packets per second of a point to point link on a linux bridge against
+# the direct tc mirred cross connect, on this host. two network namespaces stand in for
+# the nodes and the host side of their veth pairs for the vunl taps:
+#   netns bench_a: a0 10.99.0.1 <-> a1 == bridge or mirred == b1 <-> b0 10.99.0.2 netns bench_b
+# needs root, ip and tc. the traffic is made by this script in helper roles inside the namespaces.
+
+NETNS = ["bench_a", "bench_b"]
+ADDRESS = ["10.99.0.1", "10.99.0.2"]
+BRIDGE = "bench_br"
+PORT = 9999
+
+
+def sh(command, check=True):
+    return subprocess.run(command, shell=True, check=check, capture_output=True, text=True)
+
+
+def setup(mode):
+    for index, netns in enumerate(NETNS):
+        inner, outer = f"{'ab'[index]}0", f"{'ab'[index]}1"
+        sh(f"ip netns add {netns}")
+        sh(f"ip link add {outer} type veth peer name {inner} netns {netns}")
+        sh(f"ip link set {outer} up")
+        sh(f"ip -n {netns} addr add {ADDRESS[index]}/24 dev {inner}")
+        sh(f"ip -n {netns} link set {inner} up")
+        sh(f"ip -n {netns} link set lo up")
+    if mode == "bridge":
+        # the same bridge add_link.py makes for a node to node link
+        sh(f"ip link add {BRIDGE} mtu 9000 type bridge")
+        sh(f"ip link set {BRIDGE} up")
+        sh(f"ip link set a1 master {BRIDGE}")
+        sh(f"ip link set b1 master {BRIDGE}")
+    else:
+        for command in direct_link_commands("a1", "b1"):
+            sh(command)
+
+
+def teardown():
+    for command in direct_unlink_commands(["a1", "b1"]):
+        sh(command, check=False)
+    sh(f"ip link del {BRIDGE}", check=False)
+    for netns in NETNS:
+        # the veth pairs go with their namespace
+        sh(f"ip netns del {netns}", check=False)
+
+
+def helper(netns, role, *args):
+    # this script in a helper role inside a namespace
+    return subprocess.Popen(["ip", "netns", "exec", netns, sys.executable, os.path.abspath(__file__),
+                             "--role", role, *map(str, args)], stdout=subprocess.PIPE, text=True)
+
+
+def rx_packets(netns, ifname) -> int:
+    link = json.loads(sh(f"ip -n {netns} -s -json link show {ifname}").stdout)[0]
+    return link["stats64"]["rx"]["packets"]
+
+
+def role_echo(seconds):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((ADDRESS[1], PORT))
+    sock.settimeout(seconds)
+    try:
+        while True:
+            data, peer = sock.recvfrom(2048)
+            sock.sendto(data, peer)
+    except socket.timeout:
+        pass
+
+
+def role_ping(count, size):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1)
+    payload = b"x" * size
+    # first packets resolve arp and fill the bridge fdb
+    for _ in range(10):
+        sock.sendto(payload, (ADDRESS[1], PORT))
+        sock.recvfrom(2048)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        sock.sendto(payload, (ADDRESS[1], PORT))
+        sock.recvfrom(2048)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    print(json.dumps({"p50": samples[len(samples) // 2], "p99": samples[int(len(samples) * 0.99)]}))
+
+
+def role_sink(seconds):
+    # bound but never read, full socket buffers drop packets without icmp replies
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((ADDRESS[1], PORT))
+    time.sleep(seconds)
+
+
+def role_flood(seconds, size):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payload = b"x" * size
+    sent = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for _ in range(1000):
+            try:
+                sock.sendto(payload, (ADDRESS[1], PORT))
+            except OSError:
+                pass
+        sent += 1000
+    print(json.dumps({"sent": sent}))
+
+
+def measure(mode, args):
+    teardown()
+    setup(mode)
+    try:
+        echo = helper(NETNS[1], "echo", args.count // 1000 + 5)
+        time.sleep(0.3)
+        ping = helper(NETNS[0], "ping", args.count, args.size)
+        latency = json.loads(ping.communicate()[0])
+        echo.kill()
+        echo.wait()
+
+        sink = helper(NETNS[1], "sink", args.seconds + 2)
+        time.sleep(0.3)
+        before = rx_packets(NETNS[1], "b0")
+        floods = [helper(NETNS[0], "flood", args.seconds, args.size) for _ in range(args.senders)]
+        sent = sum(json.loads(flood.communicate()[0])["sent"] for flood in floods)
+        received = rx_packets(NETNS[1], "b0") - before
+        sink.kill()
+        sink.wait()
+    finally:
+        teardown()
+    return {"datapath": mode, "p50 us": latency["p50"], "p99 us": latency["p99"],
+            "sent pps": sent / args.seconds, "received pps": received / args.seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bridge against tc mirred datapath on veth pairs")
+    parser.add_argument("--count", type=int, default=5000, help="Round trips for the latency.")
+    parser.add_argument("--seconds", type=float, default=3, help="Seconds of udp flood for the pps.")
+    parser.add_argument("--senders", type=int, default=os.cpu_count() or 1, help="Flood processes.")
+    parser.add_argument("--size", type=int, default=64, help="Udp payload bytes.")
+    parser.add_argument("--role", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role:
+        role, values = args.role[0], [float(value) if "." in value else int(value) for value in args.role[1:]]
+        {"echo": role_echo, "ping": role_ping, "sink": role_sink, "flood": role_flood}[role](*values)
+        return
+    if os.geteuid() != 0:
+        print("[    Error ] ==> network namespaces, veth pairs and tc need root")
+        sys.exit(1)
+
+    rows = [measure(mode, args) for mode in ["bridge", "direct"]]
+    print(f"{'datapath':10} {'p50 us':>10} {'p99 us':>10} {'sent pps':>12} {'received pps':>14}")
+    for row in rows:
+        print(f"{row['datapath']:10} {row['p50 us']:10.1f} {row['p99 us']:10.1f} "
+              f"{row['sent pps']:12.0f} {row['received pps']:14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+# loaded up front, so the first login and ssh connect do not count the import time
+import requests
+import paramiko
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import LAB_INDEX
+from util import LINK_BATCH
+from util import LAB_AUDIT
+from util import LINK_STATS
+from util import LAB_WATCH
+
+from mock_eve import MOCK_EVE
+from mock_eve import LABS_DIR
+from mock_eve import write_synthetic_lab
+from mock_eve import write_synthetic_tree
+
+
+# end to end benchmark of the scripts against a local mock eve-ng server.
+# every operation reports wall time, http requests, ssh channels and peak memory.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(name, mock, function):
+    mock.reset_counters()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"operation": name, "time": elapsed, "http": mock.http_count,
+                    "channels": mock.channel_count, "memory": peak}
+
+
+def run_script(name, mock, script, args, answers, home, env=None):
+    # run one of the scripts with answers for its prompts on stdin,
+    # peak memory is the max rss of the child process
+    mock.reset_counters()
+    env = dict(os.environ, HOME=home, **mock.env(), **(env or {}))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, script)] + args, cwd=home, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    process.stdin.write(answers.encode())
+    process.stdin.close()
+    output = process.stdout.read().decode()
+    _pid, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        print(output)
+        print(f"[    Error ] ==> {script} failed with exit status {process.returncode}")
+        sys.exit(1)
+    return {"operation": name, "time": elapsed, "http": mock.http_count,
+            "channels": mock.channel_count, "memory": usage.ru_maxrss * 1024}
+
+
+def bench_lab(mock, nodes, home, workers):
+    # one lab of the given size inside the folder tree, driven in process and by the scripts
+    lab_path = f"/bench/deep/bench_{nodes}.unl"
+    write_synthetic_lab(mock.root + LABS_DIR + lab_path, nodes)
+    mock.kernel.add_taps(mock.tenant, mock.root + LABS_DIR + lab_path)
+    rows = []
+
+    eve_http = EVE_HTTP(eve_url=mock.env_url(), http_user="admin", http_password="eve", workers=workers)
+    _, row = measure("http login", mock, eve_http.connect)
+    rows.append(row)
+    eve_http.lab_index = LAB_INDEX("127.0.0.1", eve_http.user_id, cache_dir=os.path.join(home, "index"))
+    _, row = measure("lab discovery, index cold", mock, eve_http.get_lab_lists)
+    rows.append(row)
+    _, row = measure("lab discovery, index warm", mock, eve_http.get_lab_lists)
+    rows.append(row)
+    eve_http.lab_name = f"bench_{nodes}"
+    eve_http.find_lab_name()
+    _, row = measure("lab nodes + networks", mock, lambda: (eve_http.get_lab_nodes(), eve_http.get_lab_networks()))
+    rows.append(row)
+    _, row = measure("port map", mock, eve_http.get_port_map)
+    rows.append(row)
+
+    eve_ssh = EVE_SSH(ip="127.0.0.1", user=mock.ssh_user, password=mock.ssh_password, port=mock.ssh_port)
+    eve_ssh.lab_file_cache.cache_dir = os.path.join(home, "labfiles")
+    _, row = measure("ssh connect", mock, eve_ssh.connect)
+    rows.append(row)
+    _, row = measure("lab file read, cold", mock, lambda: eve_ssh.get_lab_file(eve_http.lab))
+    rows.append(row)
+    # the local copy is settled by a hash check once the server clock is past the second of the last change
+    time.sleep(1.1)
+    for _ in range(2):
+        eve_ssh.get_lab_file(eve_http.lab)
+    _, row = measure("lab file read, cached", mock, lambda: eve_ssh.get_lab_file(eve_http.lab))
+    rows.append(row)
+    _, row = measure("linux interfaces", mock, eve_ssh.get_linux_interfaces)
+    rows.append(row)
+    lab_audit = LAB_AUDIT(eve_http, eve_ssh)
+    _, row = measure(f"audit {len(eve_http.lab_lists)} labs", mock, lambda: lab_audit.run(eve_http.lab_lists))
+    rows.append(row)
+    link_stats = LINK_STATS(eve_http, eve_ssh)
+    link_stats.map_links(eve_ssh.get_lab_file(eve_http.lab))
+    link_stats.sweep()
+    _, row = measure(f"stats sweep, {len(link_stats.ports)} ports", mock,
+                     lambda: (link_stats.sweep(), link_stats.rows(), link_stats.prometheus()))
+    rows.append(row)
+    lab_watch = LAB_WATCH(eve_http)
+    lab_watch.poll()
+    _, row = measure("watch poll, nothing changed", mock, lab_watch.poll)
+    rows.append(row)
+
+    # free ports: every node uses at most e0 and e1, e2 and e3 are left for the benchmark
+    link_batch = LINK_BATCH(eve_http, eve_ssh)
+    operations = [{"action": "add", "a": f"R{node_id}:e2", "b": f"R{node_id + 1}:e2"}
+                  for node_id in range(1, min(nodes, 20), 2)]
+    _, row = measure(f"batch add {len(operations)} links", mock, lambda: link_batch.run(operations))
+    rows.append(row)
+    eve_http.get_lab_nodes()
+    eve_http.get_lab_networks()
+    link_batch = LINK_BATCH(eve_http, eve_ssh)
+    operations = [{"action": "remove", "a": operation["a"], "b": ""} for operation in operations]
+    _, row = measure(f"batch remove {len(operations)} links", mock, lambda: link_batch.run(operations))
+    rows.append(row)
+    eve_ssh.client.close()
+    eve_http.session.close()
+
+    # the scripts as a user runs them, prompts answered on stdin
+    answers = "1\ne3\n2\ne3\n"
+    rows.append(run_script("add_link.py", mock, "add_link.py", ["-C", f"bench_{nodes}"], answers, home))
+    rows.append(run_script("remove_link.py", mock, "remove_link.py", ["-C", f"bench_{nodes}"], "1\ne3\n", home))
+    # the same with the server helper, the first run uploads it
+    helper = {"eve_server_helper": "1"}
+    run_script("upload helper", mock, "add_link.py", ["-C", f"bench_{nodes}"], answers, home, helper)
+    run_script("upload helper", mock, "remove_link.py", ["-C", f"bench_{nodes}"], "1\ne3\n", home, helper)
+    rows.append(run_script("add_link.py, server helper", mock, "add_link.py", ["-C", f"bench_{nodes}"], answers, home,
+                           helper))
+    rows.append(run_script("remove_link.py, server helper", mock, "remove_link.py", ["-C", f"bench_{nodes}"],
+                           "1\ne3\n", home, helper))
+    # a link moved to another port and back, one lab write and one timed kernel exec each
+    lab = ["-C", f"bench_{nodes}"]
+    rows.append(run_script("migrate_link.py, swap", mock, "migrate_link.py", lab + ["--swap", "R1:e0", "R2:e0"], "", home))
+    run_script("swap back", mock, "migrate_link.py", lab + ["--swap", "R1:e0", "R2:e0"], "", home)
+    return rows
+
+
+def show(title, rows):
+    print(f"\n{title}")
+    print(f"{'operation':34} {'time ms':>10} {'http':>6} {'channels':>9} {'peak MB':>9}")
+    for row in rows:
+        print(f"{row['operation']:34} {row['time'] * 1000:10.1f} {row['http']:6} {row['channels']:9} "
+              f"{row['memory'] / 1024 / 1024:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="end to end benchmark against a mock eve-ng server")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--labs", type=int, default=50, help="Labs in the folder tree (default 50).")
+    parser.add_argument("--depth", type=int, default=4, help="Folder depth of the lab tree (default 4).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request (default 0).")
+    parser.add_argument("-W", "--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="eve-bench-")
+    mock = MOCK_EVE(root=os.path.join(home, "server"), latency=args.latency).start()
+    try:
+        write_synthetic_tree(mock.root, args.labs, args.depth, 10, config_size=256)
+        for nodes in args.nodes:
+            rows = bench_lab(mock, nodes, home, args.workers)
+            show(f"lab with {nodes} nodes, {args.labs} labs at depth {args.depth}, "
+                 f"latency {args.latency * 1000:.0f} ms", rows)
+    finally:
+        mock.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import base64
+import argparse
+import tracemalloc
+
+import xmltodict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import LAB_FILE
+from util import create_network
+from util import connect_node_to_network
+from util.topology import LAB_NODE
+from util.topology import LAB_INTERFACE
+
+
+# compare parse + edit + write of the old full xmltodict round trip with LAB_FILE
+# on synthetic labs that carry large base64 startup configs.
+
+
+def synthetic_lab(nodes, size_mb) -> bytes:
+    config_size = max(1, int(size_mb * 1024 * 1024 * 3 / 4 / nodes))
+    lines = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+             '<lab name="bench" id="00000000-0000-0000-0000-000000000000" version="1">',
+             '  <topology>', '    <nodes>']
+    for node_id in range(1, nodes + 1):
+        lines.append(f'    <node id="{node_id}" name="R{node_id}" type="qemu" template="xrv9k" image="xrv9k" '
+                     f'console="telnet" cpu="4" ram="16384" ethernet="8" left="100" top="100">')
+        lines.append(f'      <interface id="0" name="Gi0/0/0/0" type="ethernet" network_id="{node_id}"/>')
+        lines.append('    </node>')
+    lines.append('    </nodes>')
+    lines.append('    <networks>')
+    for network_id in range(1, nodes + 1):
+        lines.append(f'      <network id="{network_id}" type="bridge" name="Net{network_id}" left="1" top="1" visibility="0"/>')
+    lines.append('    </networks>')
+    lines.append('  </topology>')
+    lines.append('  <objects>')
+    lines.append('    <configs>')
+    for node_id in range(1, nodes + 1):
+        config = base64.b64encode(os.urandom(config_size)).decode()
+        lines.append(f'      <config id="{node_id}">{config}</config>')
+    lines.append('    </configs>')
+    lines.append('  </objects>')
+    lines.append('</lab>')
+    return "\n".join(lines).encode()
+
+
+def old_path(data) -> bytes:
+    # full document parse and pretty unparse, as the scripts did before LAB_FILE
+    lab_file = xmltodict.parse(data.decode())
+    topology = lab_file["lab"]["topology"]
+    networks = topology["networks"]["network"]
+    networks.append({"@id": "100000", "@type": "bridge", "@name": "bench", "@left": "504", "@top": "289", "@visibility": "0"})
+    for xml_node in topology["nodes"]["node"]:
+        if xml_node["@id"] in ["1", "2"]:
+            interfaces = xml_node["interface"]
+            interfaces = interfaces if isinstance(interfaces, list) else [interfaces]
+            interfaces.append({"@id": "1", "@name": "Gi0/0/0/1", "@type": "ethernet", "@network_id": "100000"})
+            xml_node["interface"] = interfaces
+    return xmltodict.unparse(lab_file, pretty=True).encode()
+
+
+def new_path(data) -> bytes:
+    lab_file = LAB_FILE(data)
+    create_network(lab_file, 100000, "bench")
+    for node_id in ["1", "2"]:
+        node = LAB_NODE({"id": node_id, "name": f"R{node_id}"})
+        node_intf = LAB_INTERFACE(node, {"id": "1", "name": "Gi0/0/0/1", "network_id": "0"}, 0)
+        connect_node_to_network(lab_file, node, node_intf, 100000)
+    return lab_file.tobytes()
+
+
+def measure(function, data, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="lab file edit benchmark")
+    parser.add_argument("--size", type=float, default=10, help="Lab file size in MB (default 10).")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 100, 1000], help="Node counts to test.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, best time is reported.")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>6} {'size MB':>8} {'path':>9} {'time ms':>9} {'peak MB':>8}")
+    for nodes in args.nodes:
+        data = synthetic_lab(nodes, args.size)
+        for name, function in [("xmltodict", old_path), ("LAB_FILE", new_path)]:
+            elapsed, peak = measure(function, data, args.repeat)
+            print(f"{nodes:>6} {len(data) / 1048576:>8.1f} {name:>9} {elapsed * 1000:>9.1f} {peak / 1048576:>8.1f}")
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_eve import MOCK_EVE
+from mock_eve import LABS_DIR
+from mock_eve import write_synthetic_lab
+
+
+# startup time of the scripts and the heavy modules every command loads,
+# measured with "python -X importtime" against a local mock eve-ng server.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["requests", "paramiko", "xmltodict", "rich"]
+
+# command, modules it must not load
+COMMANDS = [
+    (["add_link.py", "--version"], ["requests", "paramiko", "xmltodict", "rich"]),
+    (["add_link.py", "-h"], ["requests", "paramiko", "xmltodict", "rich"]),
+    (["add_link.py", "-U", "-o", "tsv"], ["paramiko", "xmltodict", "rich"]),
+    (["add_link.py", "-U"], ["paramiko", "xmltodict"]),
+    (["add_link.py", "-L", "-o", "tsv"], ["paramiko", "xmltodict", "rich"]),
+    (["add_link.py", "-L"], ["paramiko", "xmltodict"]),
+    (["add_link.py", "-C", "bench", "-A", "-o", "tsv"], ["paramiko", "xmltodict", "rich"]),
+    (["add_link.py", "-C", "bench", "-A"], ["paramiko", "xmltodict"]),
+    (["remove_link.py", "-C", "bench", "-P", "-o", "json"], ["paramiko", "xmltodict", "rich"]),
+]
+
+
+def import_times(stderr):
+    # import time in ms of every heavy package (all its modules that were not
+    # imported by the package itself), and the total of all top level imports
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative) / 1000))
+    modules = {}
+    total = 0.0
+    parents = {}
+    # -X importtime lists a module after the modules it imports, so walk it backwards
+    for depth, name, cumulative in reversed(entries):
+        parents[depth] = name
+        parent = parents.get(depth - 1, "") if depth else ""
+        package = name.split(".")[0]
+        if depth == 0:
+            total += cumulative
+        if package in HEAVY and parent.split(".")[0] != package:
+            modules[package] = modules.get(package, 0.0) + cumulative
+    return modules, total
+
+
+def run(command, env, importtime=False):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable] + (["-X", "importtime"] if importtime else []) + command,
+                             cwd=ROOT, env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    return time.perf_counter() - start, process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="startup time and imports of the scripts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with 1 when a command loads a module it should not.")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="eve-startup-")
+    mock = MOCK_EVE(root=os.path.join(home, "server")).start()
+    write_synthetic_lab(mock.root + LABS_DIR + "/bench.unl", 50)
+    env = dict(os.environ, HOME=home, **mock.env())
+    failed = []
+    try:
+        # first run fills the lab index like a user that ran the scripts before
+        run(["add_link.py", "-L", "-o", "tsv"], env)
+        print(f"{'command':48} {'median ms':>10} {'import ms':>10}  heavy modules loaded")
+        for command, forbidden in COMMANDS:
+            times = []
+            for _ in range(args.repeat):
+                elapsed, process = run(command, env)
+                times.append(elapsed)
+            _, process = run(command, env, importtime=True)
+            if process.returncode != 0:
+                print(process.stdout + process.stderr)
+                print(f"[    Error ] ==> {' '.join(command)} failed with exit status {process.returncode}")
+                sys.exit(1)
+            modules, total = import_times(process.stderr)
+            loaded = [name for name in HEAVY if name in modules]
+            bad = [name for name in loaded if name in forbidden]
+            if bad:
+                failed.append((command, bad))
+            print(f"{' '.join(command):48} {statistics.median(times) * 1000:10.1f} {total:10.1f}  "
+                  f"{', '.join(f'{name} {modules[name]:.0f}ms' for name in loaded)}{'  <- ' + ', '.join(bad) if bad else ''}")
+    finally:
+        mock.stop()
+        shutil.rmtree(home, ignore_errors=True)
+    if failed and args.check:
+        for command, bad in failed:
+            print(f"[    Error ] ==> {' '.join(command)} loads {', '.join(bad)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
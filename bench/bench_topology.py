@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.topology import LAB_TOPOLOGY
+from util.topology import NETWORK_IDS
+
+
+# lookups and memory of the topology model against the plain rest dicts and list scans
+# it replaced, for a synthetic lab with the given number of nodes and 8 interfaces each.
+
+
+def rest_data(nodes, interfaces):
+    node_rows = [{"id": str(node_id), "name": f"R{node_id}", "type": "qemu", "status": "ON",
+                  "ethernet": str(interfaces)} for node_id in range(1, nodes + 1)]
+    interface_rows = {str(node_id): [{"id": str(index), "name": f"e{index}", "network_id": str(node_id),
+                                      "connected": "True"} for index in range(interfaces)]
+                      for node_id in range(1, nodes + 1)}
+    networks = {str(network_id): {"id": network_id, "name": f"Net{network_id}", "type": "bridge",
+                                  "visibility": 0, "count": 2} for network_id in range(1, nodes + 1)}
+    return node_rows, interface_rows, networks
+
+
+def old_free_network_ids(used_ids, count=1):
+    used = {int(item) for item in used_ids}
+    result = []
+    candidate = 1
+    while len(result) < count:
+        if candidate not in used:
+            result.append(candidate)
+        candidate += 1
+    return result
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="topology model lookups and memory")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[100, 2000])
+    parser.add_argument("--interfaces", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for nodes in args.nodes:
+        node_rows, interface_rows, networks = rest_data(nodes, args.interfaces)
+        tracemalloc.start()
+        topology = LAB_TOPOLOGY(0)
+        topology.set_nodes(node_rows)
+        topology.set_networks(networks)
+        for node in topology.nodes.values():
+            topology.set_interfaces(node, interface_rows[node.id])
+        model_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        rest_copy = ([dict(row) for row in node_rows],
+                     {node_id: {"by_id": {intf["id"]: dict(intf) for intf in rows},
+                                "by_name": {intf["name"]: intf for intf in rows}}
+                      for node_id, rows in interface_rows.items()},
+                     {key: dict(value) for key, value in networks.items()})
+        dict_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del rest_copy
+
+        last = f"R{nodes}"
+        used = list(range(1, nodes + 1))
+        rows = [
+            ("node by name, list scan", timed(lambda: next(x for x in node_rows if x["name"] == last), args.repeat)),
+            ("node by name, index", timed(lambda: topology.node(last), args.repeat)),
+            ("network by id, loop", timed(lambda: [networks[x] for x in networks if x == str(nodes)], args.repeat)),
+            ("network by id, index", timed(lambda: topology.network(str(nodes)), args.repeat)),
+            ("free network id, scan", timed(lambda: old_free_network_ids(used), args.repeat)),
+            ("free network id, bisect", timed(lambda: NETWORK_IDS(used).lowest_free(), args.repeat)),
+        ]
+        allocator = NETWORK_IDS(used)
+        rows.append(("free network id, bisect warm", timed(allocator.lowest_free, args.repeat)))
+        print(f"\n{nodes} nodes, {args.interfaces} interfaces each")
+        print(f"{'operation':32} {'us':>10}")
+        for name, micro_seconds in rows:
+            print(f"{name:32} {micro_seconds:10.2f}")
+        print(f"{'memory, model MB':32} {model_memory / 1024 / 1024:10.2f}")
+        print(f"{'memory, dict port map MB':32} {dict_memory / 1024 / 1024:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,675 @@
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import base64
+import socket
+import hashlib
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import paramiko
+
+
+# local stand-in for an eve-ng server: a fake rest api on http and a paramiko
+# ssh/sftp server that serves /opt/unetlab/labs from a temp dir. ip commands are
+# recorded and applied to a small fake kernel link table.
+
+LABS_DIR = "/opt/unetlab/labs"
+
+
+def write_synthetic_lab(path, nodes, tenant=0, config_size=2048, lab_id=None):
+    # lab with a chain of point to point links: node i e0 <-> node i+1 e1
+    lab_id = lab_id or hashlib.md5(path.encode()).hexdigest()
+    lab_id = f"{lab_id[:8]}-{lab_id[8:12]}-{lab_id[12:16]}-{lab_id[16:20]}-{lab_id[20:32]}"
+    name = os.path.splitext(os.path.basename(path))[0]
+    lines = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+             f'<lab name="{name}" id="{lab_id}" version="1" scripttimeout="300" lock="0" author="bench">',
+             '  <topology>', '    <nodes>']
+    for node_id in range(1, nodes + 1):
+        lines.append(f'      <node id="{node_id}" name="R{node_id}" type="qemu" template="vyos" image="vyos" '
+                     f'console="telnet" cpu="1" ram="512" ethernet="4" left="100" top="100">')
+        if node_id < nodes and node_id % 2:
+            lines.append(f'        <interface id="0" name="e0" type="ethernet" network_id="{node_id}"/>')
+        if node_id > 1 and node_id % 2 == 0:
+            lines.append(f'        <interface id="1" name="e1" type="ethernet" network_id="{node_id - 1}"/>')
+        lines.append('      </node>')
+    lines.append('    </nodes>')
+    lines.append('    <networks>')
+    for network_id in range(1, nodes, 2):
+        lines.append(f'      <network id="{network_id}" type="bridge" name="Net{network_id}" left="1" top="1" visibility="0"/>')
+    lines.append(f'      <network id="{nodes + 1}" type="pnet0" name="Cloud0" left="1" top="1" visibility="1"/>')
+    lines.append('    </networks>')
+    lines.append('  </topology>')
+    lines.append('  <objects>')
+    lines.append('    <configs>')
+    for node_id in range(1, nodes + 1):
+        config = base64.b64encode(b"x" * config_size).decode()
+        lines.append(f'      <config id="{node_id}">{config}</config>')
+    lines.append('    </configs>')
+    lines.append('  </objects>')
+    lines.append('</lab>')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    return lab_id
+
+
+def write_synthetic_tree(root, labs, depth, nodes, config_size=2048):
+    # labs spread over a folder tree of the given depth, returns the lab paths
+    paths = []
+    for index in range(labs):
+        folder = "/".join(f"f{level}_{index % (level + 2)}" for level in range(depth))
+        path = f"/{folder}/lab{index}.unl" if folder else f"/lab{index}.unl"
+        write_synthetic_lab(root + LABS_DIR + path, nodes, config_size=config_size)
+        paths.append(path)
+    return paths
+
+
+class FAKE_KERNEL():
+    # link table of the fake host, changed by ip batch commands
+    def __init__(self) -> None:
+        self.links = {}
+        self.lock = threading.Lock()
+        self.commands = []
+        # lab files with taps, their nodes are running for the rest api
+        self.running = set()
+        # device -> ingress filters, changed by tc batch commands
+        self.qdiscs = {}
+        # taps in a bridge or with a cross connect count 1 Mbit/s of 500 byte packets from here on
+        self.started = time.monotonic()
+
+    def add_taps(self, tenant, lab_file):
+        # taps of all nodes in a lab, attached to the bridges of their networks
+        root = ET.parse(lab_file).getroot()
+        self.running.add(os.path.realpath(lab_file))
+        networks = {n.get("id"): n for n in root.iter("network")}
+        for node in root.iter("node"):
+            for intf in node.iter("interface"):
+                tap = f"vunl{tenant}_{node.get('id')}_{intf.get('id')}"
+                network = networks.get(intf.get("network_id"))
+                master = None
+                if network is not None:
+                    master = f"vnet{tenant}_{network.get('id')}" if network.get("type") == "bridge" else network.get("type")
+                    self.links.setdefault(master, {"ifname": master, "kind": "bridge", "master": None})
+                self.links[tap] = {"ifname": tap, "kind": "tun", "master": master}
+            for intf_id in range(4):
+                tap = f"vunl{tenant}_{node.get('id')}_{intf_id}"
+                self.links.setdefault(tap, {"ifname": tap, "kind": "tun", "master": None})
+
+    def run(self, line):
+        # apply one "ip" batch line, returns an error message or None
+        self.commands.append(line)
+        words = line.split()
+        if len(words) < 3 or words[0] != "link":
+            return None
+        words = [word for word in words if word != "dev"]
+        action, name = words[1], words[2]
+        with self.lock:
+            if action == "add":
+                if name in self.links:
+                    return "RTNETLINK answers: File exists"
+                self.links[name] = {"ifname": name, "kind": "bridge" if "bridge" in words else "other", "master": None}
+            elif action in ["del", "delete"]:
+                if name not in self.links:
+                    return f'Cannot find device "{name}"'
+                self.links.pop(name)
+                self.qdiscs.pop(name, None)
+                for link in self.links.values():
+                    if link["master"] == name:
+                        link["master"] = None
+            elif action == "set":
+                if name not in self.links:
+                    return f'Cannot find device "{name}"'
+                if "master" in words:
+                    master = words[words.index("master") + 1]
+                    if master not in self.links:
+                        return f'Cannot find device "{master}"'
+                    self.links[name]["master"] = master
+                if "nomaster" in words:
+                    self.links[name]["master"] = None
+        return None
+
+    def run_tc(self, line):
+        # apply one "tc" batch line for ingress qdiscs and their filters, returns an error message or None
+        self.commands.append(f"tc {line}")
+        words = line.split()
+        if len(words) < 4 or words[2] != "dev":
+            return None
+        kind, action, name = words[0], words[1], words[3]
+        with self.lock:
+            if name not in self.links:
+                return f'Cannot find device "{name}"'
+            if kind == "qdisc" and action == "add":
+                if name in self.qdiscs:
+                    return "Error: Exclusivity flag on, cannot modify."
+                self.qdiscs[name] = []
+            elif kind == "qdisc" and action in ["del", "delete"]:
+                if self.qdiscs.pop(name, None) is None:
+                    return "Error: Cannot find specified qdisc on specified device."
+            elif kind == "filter" and action == "add":
+                if name not in self.qdiscs:
+                    return "Error: Parent Qdisc doesn't exists."
+                target = words[words.index("dev", 4) + 1] if "redirect" in words else None
+                if target is not None and target not in self.links:
+                    return f'Cannot find device "{target}"'
+                self.qdiscs[name].append(target)
+        return None
+
+    def dump_qdiscs(self):
+        with self.lock:
+            return [{"kind": "ingress", "handle": "ffff:", "dev": name, "parent": "ffff:fff1", "options": {}}
+                    for name in self.qdiscs]
+
+    def dump(self, stats=False):
+        result = []
+        with self.lock:
+            for index, link in enumerate(self.links.values(), start=1):
+                item = {"ifindex": index, "ifname": link["ifname"], "flags": ["UP"], "mtu": 9000,
+                        "linkinfo": {"info_kind": link["kind"]}}
+                if link["master"]:
+                    item["master"] = link["master"]
+                if stats:
+                    busy = link["kind"] == "tun" and (link["master"] or link["ifname"] in self.qdiscs)
+                    sent = int((time.monotonic() - self.started) * 125000) if busy else 0
+                    item["stats64"] = {"rx": {"bytes": sent, "packets": sent // 500, "errors": 0, "dropped": 0},
+                                       "tx": {"bytes": sent, "packets": sent // 500, "errors": 0, "dropped": 0}}
+                result.append(item)
+        return result
+
+
+class _HTTP_HANDLER(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, with nagle every response waits for a delayed ack
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, data, status=200, message=""):
+        body = {"code": status, "status": "success" if status == 200 else "fail", "data": data}
+        if message:
+            body = {"code": status, "status": "fail", "message": message}
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.mock.count_http()
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/api/auth/login"):
+            session = self.server.mock.new_session()
+            self.send_response(200)
+            body = json.dumps({"code": 200, "status": "success", "message": "User logged in"}).encode()
+            self.send_header("Set-Cookie", f"unetlab_session={session}; Path=/api/")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._send({}, 404)
+
+    def do_GET(self):
+        mock = self.server.mock
+        mock.count_http()
+        path = re.sub("/+", "/", self.path.split("?")[0])
+        if not path.startswith("/api/"):
+            return self._send({}, 404)
+        path = path[4:]
+        cookie = self.headers.get("Cookie") or ""
+        if not any(f"unetlab_session={session}" in cookie for session in mock.sessions):
+            return self._send({}, 412, "User is not authenticated or session timed out (90032).")
+        fault = mock.http_fault(path)
+        if isinstance(fault, float):
+            time.sleep(fault)
+        elif fault:
+            return self._send({}, fault, "injected fault")
+        if path == "/auth":
+            return self._send({"username": "admin", "tenant": mock.tenant, "role": "admin"})
+        if path.startswith("/users"):
+            return self._send({"admin": {"username": "admin", "name": "Admin", "email": "", "role": "admin",
+                                         "expiration": "-1", "session": "", "pod": 0, "pexpiration": "-1"}})
+        if path.startswith("/folders"):
+            return self._send(mock.folder(path[len("/folders"):] or "/"))
+        if path.startswith("/labs"):
+            rest = path[len("/labs"):]
+            end = rest.find(".unl") + 4
+            if end < 4:
+                return self._send({}, 404)
+            lab_path, rest = rest[:end], rest[end:]
+            data = mock.lab_rest(lab_path, rest)
+            return self._send(data, 200 if data is not None else 404)
+        self._send({}, 404)
+
+
+class _SSH_SERVER(paramiko.ServerInterface):
+    def __init__(self, mock) -> None:
+        self.mock = mock
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self.mock.ssh_user, self.mock.ssh_password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        self.mock.count_channel()
+        threading.Thread(target=self.mock.exec_command, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def check_channel_subsystem_request(self, channel, name):
+        self.mock.count_channel()
+        return super().check_channel_subsystem_request(channel, name)
+
+
+class _SFTP_HANDLE(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class _SFTP_SERVER(paramiko.SFTPServerInterface):
+    # sftp view of the temp dir, as if it was the root of the eve-ng host
+    def __init__(self, server, *args, **kwargs) -> None:
+        super().__init__(server, *args, **kwargs)
+        self.mock = server.mock
+
+    def _path(self, path):
+        self.mock.delay()
+        return self.mock.root + os.path.normpath("/" + path)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def list_folder(self, path):
+        try:
+            real = self._path(path)
+            return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(real, name)), name)
+                    for name in os.listdir(real)]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        real = self._path(path)
+        try:
+            fd = os.open(real, flags, 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        mode = "rb" if not flags & (os.O_WRONLY | os.O_RDWR) else ("ab" if flags & os.O_APPEND else "r+b" if flags & os.O_RDWR else "wb")
+        handle = _SFTP_HANDLE(flags)
+        handle.filename = real
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        return self.posix_rename(oldpath, newpath)
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._path(oldpath), self._path(newpath))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            if attr.st_mode is not None:
+                os.chmod(self._path(path), attr.st_mode & 0o7777)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._path(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class MOCK_EVE():
+    # fake eve-ng server with http rest api and ssh/sftp on local ports
+    def __init__(self, root=None, tenant=0, latency=0.0, ssh_user="root", ssh_password="eve") -> None:
+        self.root = root or tempfile.mkdtemp(prefix="mock-eve-")
+        os.makedirs(self.root + LABS_DIR, exist_ok=True)
+        self.tenant = tenant
+        self.latency = latency
+        self.ssh_user = ssh_user
+        self.ssh_password = ssh_password
+        self.kernel = FAKE_KERNEL()
+        self.http_count = 0
+        self.channel_count = 0
+        self.exec_commands = []
+        self._counter_lock = threading.Lock()
+        self._locks = {}
+        # server helpers uploaded by path
+        self.helpers = {}
+        # valid http sessions, expire_sessions makes the clients log in again
+        self.sessions = set()
+        self.logins = 0
+        # [path prefix, http status or seconds of delay] used once each by the next matching GET
+        self.http_faults = []
+        self._lab_cache = {}
+        self.host_key = paramiko.RSAKey.generate(2048)
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count_http(self):
+        self.delay()
+        with self._counter_lock:
+            self.http_count += 1
+
+    def count_channel(self):
+        with self._counter_lock:
+            self.channel_count += 1
+
+    def new_session(self) -> str:
+        with self._counter_lock:
+            self.logins += 1
+            session = f"bench{self.logins}"
+            self.sessions.add(session)
+        return session
+
+    def expire_sessions(self):
+        with self._counter_lock:
+            self.sessions.clear()
+
+    def http_fault(self, path):
+        with self._counter_lock:
+            for fault in self.http_faults:
+                if path.startswith(fault[0]):
+                    self.http_faults.remove(fault)
+                    return fault[1]
+        return None
+
+    def reset_counters(self):
+        with self._counter_lock:
+            self.http_count = 0
+            self.channel_count = 0
+            self.exec_commands = []
+            self.kernel.commands = []
+
+    def start(self):
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), _HTTP_HANDLER)
+        self.http.daemon_threads = True
+        self.http.mock = self
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.ssh_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.ssh_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.ssh_socket.bind(("127.0.0.1", 0))
+        self.ssh_socket.listen(100)
+        threading.Thread(target=self._accept_ssh, daemon=True).start()
+        self.http_port = self.http.server_address[1]
+        self.ssh_port = self.ssh_socket.getsockname()[1]
+        return self
+
+    def stop(self):
+        self.http.shutdown()
+        self.ssh_socket.close()
+
+    def env_url(self) -> str:
+        return f"http://127.0.0.1:{self.http_port}/api"
+
+    def env(self) -> dict:
+        # environment for the scripts to use this mock server
+        return {"eve_server_ip": "127.0.0.1", "eve_server_http_port": str(self.http_port),
+                "eve_server_ssh_port": str(self.ssh_port), "eve_server_user": self.ssh_user,
+                "eve_server_password": self.ssh_password, "http_user": "admin", "http_password": "eve"}
+
+    def _accept_ssh(self):
+        while True:
+            try:
+                client, _ = self.ssh_socket.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve_ssh, args=(client,), daemon=True).start()
+
+    def _serve_ssh(self, client):
+        transport = paramiko.Transport(client)
+        transport.use_compression(True)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTP_SERVER)
+        try:
+            transport.start_server(server=_SSH_SERVER(self))
+        except (paramiko.SSHException, EOFError):
+            return
+        # accepted channels are kept, paramiko closes a channel when it is garbage collected
+        channels = []
+        while transport.is_active():
+            if channel := transport.accept(1):
+                channels = [item for item in channels if not item.closed] + [channel]
+
+    # rest api
+
+    def _lab(self, lab_path):
+        real = self.root + LABS_DIR + lab_path
+        try:
+            mtime = os.stat(real).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._lab_cache.get(lab_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        root = ET.parse(real).getroot()
+        self._lab_cache[lab_path] = (mtime, root)
+        return root
+
+    def folder(self, path):
+        real = self.root + LABS_DIR + os.path.normpath("/" + path)
+        if not os.path.isdir(real):
+            return None
+        folders = [{"name": "..", "path": os.path.dirname(path.rstrip("/")) or "/"}] if path != "/" else []
+        labs = []
+        for name in sorted(os.listdir(real)):
+            child = os.path.join(path, name)
+            if os.path.isdir(os.path.join(real, name)):
+                folders.append({"name": name, "path": child})
+            elif name.endswith(".unl") and not name.startswith("."):
+                labs.append({"file": name, "path": child, "mtime": str(int(os.stat(os.path.join(real, name)).st_mtime))})
+        return {"folders": folders, "labs": labs}
+
+    def lab_rest(self, lab_path, rest):
+        root = self._lab(lab_path)
+        if root is None:
+            return None
+        if not rest or rest == "/":
+            return {"id": root.get("id"), "name": root.get("name"), "filename": os.path.basename(lab_path),
+                    "author": root.get("author", ""), "lock": 0, "scripttimeout": 300, "version": 1,
+                    "body": "", "description": ""}
+        networks = {n.get("id"): n for n in root.iter("network")}
+        if rest == "/nodes":
+            status = 2 if os.path.realpath(self.root + LABS_DIR + lab_path) in self.kernel.running else 0
+            result = {}
+            for node in root.iter("node"):
+                result[node.get("id")] = {"console": "telnet", "delay": 0, "id": int(node.get("id")),
+                                          "left": 100, "icon": "Router.png", "image": node.get("image"),
+                                          "name": node.get("name"), "ram": 512, "status": status,
+                                          "template": node.get("template"), "type": node.get("type"),
+                                          "top": 100, "url": "telnet://127.0.0.1:32769", "config": "0",
+                                          "cpu": 1, "ethernet": int(node.get("ethernet", 4)), "uuid": ""}
+            return result
+        if rest == "/networks":
+            counts = {}
+            for intf in root.iter("interface"):
+                counts[intf.get("network_id")] = counts.get(intf.get("network_id"), 0) + 1
+            return {network_id: {"id": int(network_id), "name": n.get("name"), "type": n.get("type"),
+                                 "left": 1, "top": 1, "visibility": int(n.get("visibility", 0)),
+                                 "count": counts.get(network_id, 0)}
+                    for network_id, n in networks.items()}
+        if match := re.match(r"^/nodes/(\d+)/interfaces$", rest):
+            for node in root.iter("node"):
+                if node.get("id") != match.group(1):
+                    continue
+                connected = {intf.get("id"): int(intf.get("network_id")) for intf in node.iter("interface")}
+                ethernet = [{"name": f"e{index}", "network_id": connected.get(str(index), 0)}
+                            for index in range(int(node.get("ethernet", 4)))]
+                return {"id": int(node.get("id")), "sort": "qemu", "ethernet": ethernet, "serial": []}
+            return None
+        return None
+
+    # ssh exec
+
+    def exec_command(self, channel, command):
+        self.delay()
+        self.exec_commands.append(command)
+        try:
+            status, output, error = self._run(channel, command)
+        except Exception as e:
+            status, output, error = 1, b"", f"{e}\n".encode()
+        if output:
+            channel.sendall(output)
+        if error:
+            channel.sendall_stderr(error)
+        channel.send_exit_status(status)
+        channel.shutdown_write()
+        # the reply to the exec request is sent after check_channel_exec_request returns,
+        # closing at once could get to the client before it and fail exec_command there
+        threading.Timer(1.0, channel.close).start()
+
+    def _read_stdin(self, channel) -> bytes:
+        data = []
+        while chunk := channel.recv(65536):
+            data.append(chunk)
+        return b"".join(data)
+
+    def _batch(self, tool, text):
+        # "ip -force -batch -" or tc on the fake kernel
+        run = self.kernel.run if tool == "ip" else self.kernel.run_tc
+        errors = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if line.strip() and (error := run(line.strip())):
+                errors.append(f"{error}\nCommand failed -:{number}\n")
+        return (1 if errors else 0), "", "".join(errors)
+
+    def _script(self, text):
+        # the timed kernel script of EVE_SSH.run_timed: ip or tc batches in here documents
+        # between "@@start" and "@@end" time stamps
+        output = []
+        lines = iter(text.splitlines())
+        index = status = "0"
+        for line in lines:
+            if line.startswith('echo "@@start'):
+                index = line.split()[2]
+                output.append(f"@@start {index} {time.time_ns()}\n")
+            elif "-batch" in line:
+                body = []
+                for item in lines:
+                    if item == "EOF":
+                        break
+                    body.append(item)
+                exit_status, _output, error = self._batch(line.split()[0], "\n".join(body))
+                status = str(exit_status)
+                output.append(error)
+            elif line.startswith("s=$?"):
+                output.append(f"@@end {index} {status} {time.time_ns()}\n")
+        return 0, "".join(output).encode(), b""
+
+    def _helper_tool(self, command, data=None):
+        # commands of the server helper on the fake kernel
+        if command[1:] == ["-force", "-batch", "-"]:
+            return self._batch(command[0], data)
+        if command[0] == "tc":
+            return 0, json.dumps(self.kernel.dump_qdiscs()), ""
+        return 0, json.dumps(self.kernel.dump()), ""
+
+    def _run_helper(self, channel, path, digest=None):
+        # the uploaded server helper with the lab files and locks under the mock root,
+        # digest is the hash the client wants it to have
+        if path not in self.helpers or (digest and hashlib.sha1(self.helpers[path]).hexdigest() != digest):
+            return 98, b"", b""
+        namespace = {"__name__": "server_helper"}
+        exec(compile(self.helpers[path], path, "exec"), namespace)
+        plan = json.loads(self._read_stdin(channel))
+        plan["path"] = self.root + plan["path"]
+        plan["lock"] = self.root + plan["lock"].replace("~", "/root", 1)
+        os.makedirs(os.path.dirname(plan["lock"]), exist_ok=True)
+        return 0, namespace["handle"](json.dumps(plan), self._helper_tool).encode(), b""
+
+    def _run(self, channel, command):
+        words = shlex.split(command)
+        if "python3" in words:
+            digests = [word.split()[0] for word in words if word.endswith("  -")]
+            return self._run_helper(channel, words[-1], digests[0] if digests else None)
+        if "cat" in words and ">" in words:
+            self.helpers[words[-1]] = self._read_stdin(channel)
+            return 0, b"", b""
+        if words == ["sh", "-s"]:
+            return self._script(self._read_stdin(channel).decode())
+        if words[:2] in [["ip", "-force"], ["tc", "-force"]] and "-batch" in words:
+            exit_status, output, error = self._batch(words[0], self._read_stdin(channel).decode())
+            return exit_status, output.encode(), error.encode()
+        if words[0] == "tc" and "-json" in words and "qdisc" in words:
+            return 0, json.dumps(self.kernel.dump_qdiscs()).encode(), b""
+        if words[0] == "ip" and ("-json" in words or "--json" in words):
+            return 0, json.dumps(self.kernel.dump(stats="-s" in words)).encode(), b""
+        if words[0] == "cat":
+            with open(self.root + words[1], "rb") as file:
+                return 0, file.read(), b""
+        if "sha1sum" in words:
+            path = words[words.index("sha1sum") + 1]
+            output = f"{int(time.time())}\n" if "date" in words else ""
+            with open(self.root + path, "rb") as file:
+                return 0, f"{output}{hashlib.sha1(file.read()).hexdigest()}  {path}\n".encode(), b""
+        if "flock" in words:
+            lock = self._locks.setdefault(words[-3], threading.Lock())
+            if not lock.acquire(timeout=float(words[words.index("-w") + 1])):
+                return 1, b"", b"flock: timeout\n"
+            try:
+                channel.sendall(b"locked\n")
+                self._read_stdin(channel)
+            finally:
+                lock.release()
+            return 0, b"", b""
+        return 0, b"", b""
+
+
+if __name__ == "__main__":
+    # run a mock server for manual use, prints the .env settings to reach it
+    import argparse
+    parser = argparse.ArgumentParser(description="mock eve-ng server")
+    parser.add_argument("--labs", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    args = parser.parse_args()
+    mock = MOCK_EVE(latency=args.latency)
+    paths = write_synthetic_tree(mock.root, args.labs, args.depth, args.nodes)
+    for path in paths:
+        mock.kernel.add_taps(mock.tenant, mock.root + LABS_DIR + path)
+    mock.start()
+    for key, value in mock.env().items():
+        print(f'{key}="{value}"')
+    print(f"# labs in {mock.root}{LABS_DIR}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
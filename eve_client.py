@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import socket
+import argparse
+
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".cache", "eve-hot-connection", "eve.sock")
+
+
+# thin client for eve_daemon.py, it does not import util so it starts fast
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s OPERATION [OPTIONS]",
+        description="EVE-NG Comminuty tools daemon client",
+    )
+    parser.add_argument("op", choices=["add", "remove", "apply", "reconcile", "profile", "labs", "nodes", "ports", "users"],
+                        help="Operation to run on the daemon.")
+    parser.add_argument("-S", "--socket", required=False, default=DEFAULT_SOCKET,
+                        help=f"Unix socket of the daemon (default {DEFAULT_SOCKET}).")
+    parser.add_argument("-s", "--server", required=False, help="EVE-NG server ip, default is the daemon server.")
+    parser.add_argument("-C", "--current-lab", required=False, help="Lab name or ID.")
+    parser.add_argument("-a", required=False, help="End point A as node:interface or net:network.")
+    parser.add_argument("-b", required=False, help="End point B as node:interface or net:network.")
+    parser.add_argument("-F", "--batch-file", required=False, help="json file with operations for apply or desired links for reconcile.")
+    parser.add_argument("--dry-run", action="store_true", help="reconcile and profile only show the changes.")
+    parser.add_argument("--bridge-profile", required=False, help="Bridge profile for new bridges, or to apply with profile.")
+    args = parser.parse_args()
+
+    request = {"op": args.op, "server": args.server, "lab": args.current_lab, "a": args.a, "b": args.b,
+               "dry_run": args.dry_run, "bridge_profile": args.bridge_profile}
+    if args.batch_file:
+        with open(args.batch_file) as file:
+            request["operations"] = json.load(file)
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(args.socket)
+    except OSError as e:
+        print(f"[    Error ] ==> could not connect to daemon on {args.socket}: {e}")
+        sys.exit(1)
+    client.sendall(json.dumps(request).encode() + b"\n")
+    response = client.makefile("rb").readline()
+    client.close()
+    if not response:
+        print("[    Error ] ==> daemon closed the connection")
+        sys.exit(1)
+    response = json.loads(response)
+    print(json.dumps(response, indent=2))
+    sys.exit(0 if response["ok"] else 1)
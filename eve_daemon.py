@@ -0,0 +1,68 @@
+import argparse
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_INFO
+from util import EVE_DAEMON
+from util import EVE_SERVER
+from util import DEFAULT_SOCKET
+
+from util import handler
+from util import init_server_info
+from util import add_transport_args
+from util import TRANSPORT
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [OPTIONS]",
+        description="EVE-NG Comminuty tools daemon, keeps eve-ng sessions open and serves link operations",
+    )
+    parser.add_argument(
+        "-S",
+        "--socket",
+        required=False,
+        default=DEFAULT_SOCKET,
+        help=f"Unix socket path to listen on (default {DEFAULT_SOCKET}).",
+    )
+    parser.add_argument(
+        "-W",
+        "--workers",
+        required=False,
+        type=int,
+        default=8,
+        help="Number of concurrent http requests used to discover labs (default 8).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        required=False,
+        type=int,
+        default=30,
+        help="Seconds lab nodes and networks are kept in memory (default 30).",
+    )
+    parser.add_argument(
+        "--keepalive",
+        required=False,
+        type=int,
+        default=30,
+        help="Seconds between ssh keepalive packets (default 30).",
+    )
+    add_transport_args(parser)
+    args = parser.parse_args()
+    TRANSPORT.configure(args)
+    TRANSPORT.keepalive = args.keepalive
+
+    eve_server = EVE_SERVER(eve_info, workers=args.workers, cache_ttl=args.cache_ttl, keepalive=args.keepalive)
+    # open sessions now so the first request is fast
+    eve_server.login()
+    eve_server.ssh()
+
+    daemon = EVE_DAEMON(args.socket, {eve_info.ip: eve_server}, default_server=eve_info.ip)
+    print(f"[    Info  ] ==> Listening on {args.socket}")
+    daemon.serve_forever()
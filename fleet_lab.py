@@ -0,0 +1,110 @@
+import sys
+import time
+import fnmatch
+import argparse
+import dotenv
+from signal import signal, SIGINT
+
+from util import FLEET
+from util import load_inventory
+from util import load_batch_file
+from util import handler
+from util import show_rows
+from util import add_transport_args
+from util import TRANSPORT
+from util import EXIT_OK
+from util import EXIT_ERROR
+from util import EXIT_USAGE
+
+
+def summary(result) -> str:
+    # one line for the result of a target in the table
+    if isinstance(result, list) and result and isinstance(result[0], dict) and "action" in result[0]:
+        return "; ".join(" ".join(str(row.get(key, "")) for key in ["action", "network", "bridge"] if row.get(key))
+                         for row in result)
+    if isinstance(result, list):
+        return f"{len(result)} rows"
+    return "" if result is None else str(result)
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+
+    signal(SIGINT, handler)
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s OPERATION -I INVENTORY [OPTIONS]",
+        description="EVE-NG Comminuty tools, run one operation on many labs of many eve-ng servers",
+    )
+    parser.add_argument("op", choices=["labs", "nodes", "ports", "add", "remove", "apply", "reconcile"],
+                        help="labs only lists the selected labs, the others run on every selected lab.")
+    parser.add_argument("-I", "--inventory", required=True, help="json or yaml file with the eve-ng servers.")
+    parser.add_argument("--server", action="append", default=[],
+                        help="Only servers with a name matching this shell pattern, can be given more than once.")
+    parser.add_argument("--lab", action="append", default=[],
+                        help="Labs with a name, file name or path matching this shell pattern, can be given more than once.")
+    parser.add_argument("--folder", action="append", default=[],
+                        help="Labs in this folder or below it, can be given more than once.")
+    parser.add_argument("--tenant", action="append", default=[],
+                        help="Labs of this tenant (eve-ng user id), can be given more than once.")
+    parser.add_argument("-a", required=False, help="End point A as node:interface or net:network.")
+    parser.add_argument("-b", required=False, help="End point B as node:interface or net:network.")
+    parser.add_argument("-F", "--batch-file", required=False,
+                        help="csv, yaml or json file with operations for apply or desired links for reconcile.")
+    parser.add_argument("--dry-run", action="store_true", help="reconcile only shows the changes.")
+    parser.add_argument("--bridge-profile", required=False, help="Bridge profile for new bridges.")
+    parser.add_argument("-W", "--workers", type=int, default=4,
+                        help="Sessions (http and ssh) per server that run at the same time (default 4).")
+    parser.add_argument("--max-workers", type=int, default=16,
+                        help="Targets that run at the same time over all servers (default 16).")
+    parser.add_argument("--cache-ttl", type=int, default=300,
+                        help="Seconds the lab index of a server is trusted (default 300, 0 disables it).")
+    parser.add_argument("-o", "--output", choices=["table", "json", "tsv"], default="table",
+                        help="table (default), json or tsv. json has the full result and log of every target.")
+    add_transport_args(parser)
+    args = parser.parse_args()
+    TRANSPORT.configure(args)
+
+    request = {"op": args.op, "a": args.a, "b": args.b or "", "dry_run": args.dry_run,
+               "bridge_profile": args.bridge_profile}
+    if (args.op in ["add", "remove"] and not args.a) or (args.op == "add" and not args.b):
+        print("[    Error ] ==> add needs -a and -b, remove needs -a")
+        sys.exit(EXIT_USAGE)
+    if args.op in ["apply", "reconcile"]:
+        if not args.batch_file:
+            print(f"[    Error ] ==> {args.op} needs a batch file, use -F")
+            sys.exit(EXIT_USAGE)
+        request["operations"] = load_batch_file(args.batch_file)
+
+    infos = [info for info in load_inventory(args.inventory)
+             if not args.server or any(fnmatch.fnmatch(info.name, pattern) for pattern in args.server)]
+    if not infos:
+        print("[    Error ] ==> no server of the inventory is selected")
+        sys.exit(EXIT_USAGE)
+
+    stream = sys.stdout
+    if args.output != "table":
+        sys.stdout = sys.stderr
+    start = time.perf_counter()
+    fleet = FLEET(infos, workers=args.workers, max_workers=args.max_workers, index_ttl=args.cache_ttl)
+    targets, rows = fleet.discover(args.lab, args.folder, args.tenant)
+    print(f"[    Info  ] ==> {len(targets)} labs selected on {len(infos)} servers")
+    if args.op == "labs":
+        rows.extend({"server": fleet.infos[index].name, "tenant": tenant, "lab": lab["path"], "ok": True,
+                     "time": 0.0, "result": lab["id"], "error": ""} for index, tenant, lab in targets)
+    else:
+        rows.extend(fleet.run(targets, request))
+    fleet.close()
+    failed = [row for row in rows if not row["ok"]]
+    print(f"[    Info  ] ==> {len(rows) - len(failed)} done, {len(failed)} failed "
+          f"in {time.perf_counter() - start:.2f}s")
+    if problems := TRANSPORT.problems():
+        print(f"[    Warrning ] ==> {problems}")
+
+    if args.output == "json":
+        show_rows("Fleet Result", rows, args.output, stream)
+    else:
+        show_rows("Fleet Result", [{"server": row["server"], "tenant": row["tenant"], "lab": row["lab"],
+                                    "ok": str(row["ok"]), "time": f"{row['time']:.3f}",
+                                    "result": summary(row["result"]), "error": row["error"]} for row in rows],
+                  args.output, stream)
+    sys.exit(EXIT_OK if not failed else EXIT_ERROR)
@@ -0,0 +1,79 @@
+import sys
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import EXIT_USAGE
+from util import LINK_MIGRATE
+from util import TRACE
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "--from",
+        dest="migrate_from",
+        required=False,
+        help="Node or node:interface whose links are moved (names or ids).",
+    )
+    parser.add_argument(
+        "--to",
+        dest="migrate_to",
+        required=False,
+        help="Node or node:interface that gets the links, with nodes every link keeps its interface id.",
+    )
+    parser.add_argument(
+        "--swap",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("A", "B"),
+        help="Swap the links of two node:interface ports, can be given many times.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show the moves and the kernel commands without writing the lab file or running them.",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh)
+
+    if bool(args.migrate_from) != bool(args.migrate_to):
+        print("[    Error ] ==> --from and --to are used together")
+        sys.exit(EXIT_USAGE)
+    migrations = [(args.migrate_from, args.migrate_to)] if args.migrate_from else []
+    if not migrations and not args.swap:
+        print("[    Error ] ==> nothing to move, use --from and --to or --swap")
+        sys.exit(EXIT_USAGE)
+
+    link_migrate = LINK_MIGRATE(eve_http, eve_ssh)
+    results = link_migrate.run(migrations, args.swap, dry_run=args.dry_run)
+
+    TRACE.phase("close")
+    print("[    Info  ] ==> Close SSH connection")
+    eve_ssh.client.close()
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()
+    show_rows("Migrate Result", results, args.output, args.stream)
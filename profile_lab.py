@@ -0,0 +1,57 @@
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import TRACE
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only show the bridges and the commands, change nothing.",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh)
+
+    # the bridge profile is applied again to every vnet bridge of the lab and the taps in them
+    TRACE.phase("linux interfaces")
+    linux_interfaces = eve_ssh.get_linux_interfaces()
+    rows, commands = eve_ssh.bridge_profiles.lab_commands(eve_http.topology, linux_interfaces)
+    print(f"[    Info  ] ==> {len(rows)} bridges and {len(commands)} kernel commands")
+    TRACE.phase("kernel commands")
+    if args.dry_run:
+        for command in commands:
+            print(f"[    Info  ] ==> would run: {command}")
+    else:
+        eve_ssh.run_batch(commands)
+
+    TRACE.phase("close")
+    print("[    Info  ] ==> Close SSH connection")
+    eve_ssh.client.close()
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()
+    show_rows("Bridge Profile", rows, args.output, args.stream)
@@ -0,0 +1,64 @@
+import sys
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import EXIT_USAGE
+from util import load_batch_file
+from util import LINK_RECONCILE
+from util import TRACE
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "-F",
+        "--batch-file",
+        required=False,
+        help="csv, yaml or json file with the desired links of the lab.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show the changes without writing the lab file or running kernel commands.",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh)
+
+    if not args.batch_file:
+        print("[    Error ] ==> file with the desired links is needed, use -F")
+        sys.exit(EXIT_USAGE)
+    # an empty file is a valid desired state: a lab without links
+    links = load_batch_file(args.batch_file)
+
+    link_reconcile = LINK_RECONCILE(eve_http, eve_ssh)
+    results = link_reconcile.run(links, dry_run=args.dry_run)
+
+    TRACE.phase("close")
+    print("[    Info  ] ==> Close SSH connection")
+    eve_ssh.client.close()
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()
+    show_rows("Reconcile Result", results, args.output, args.stream)
@@ -10,6 +10,14 @@ from util import init_args
 from util import handler
 from util import init_server_info
 from util import args_check
+from util import remove_network
+from util import disconnect_node_interface
+from util import direct_unlink_commands
+from util import helper_plan
+from util import TRACE
+from util import show_result
+from util import EXIT_USAGE
+from util import EXIT_CONFLICT
 
 
 if __name__ == "__main__":
@@ -22,71 +30,109 @@ if __name__ == "__main__":
     args = init_args().parse_args()
 
     # login to eve api server as admin
-    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass)
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
 
-    args_check(args, eve_http)
+    args_check(args, eve_http, eve_ssh)
 
-
-#  ssh connect to eve-ng
-    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass)
-    eve_ssh.connect()
+    # interfaces of all nodes, used to pick ports and check if they are connected
+    # with the end point given only the interfaces of its node are fetched.
+    TRACE.phase("port map")
+    if not args.node_a:
+        eve_http.get_port_map()
 
 
+    TRACE.phase("select interface")
+    # a broken ssh connection should stop us before the user answers any question
+    if not args.node_a:
+        eve_ssh.wait_connected()
     print("[    Info  ] ==> Insert Information for Node A")
-    node, node_intf, _ = eve_http.select_node_interface(device="A")
+    node, node_intf, node_type = eve_http.select_node_interface(device="A", end_point=args.node_a)
+    if node_type == "net":
+        print("[    Error ] ==> remove needs a node interface, not a network")
+        sys.exit(EXIT_USAGE)
     # check if interface is connected
-    if node_intf["connected"] == "False":
-        print(f"[    Error ] ==> selected Interface {node_intf['name']} on device {node['name']} is not connected.")
-        sys.exit(1)
-    linux_intf = f"vunl{eve_http.user_id}_{node['id']}_{node_intf['id']}"
-
-    # get network_id
-    for item in eve_http.lab_networks:
-        if item == node_intf["network_id"]:
-            network_id = item
-            network = eve_http.lab_networks[item]
-
-    bridge_name = f"vnet{ eve_http.user_id }_{network_id}"
-
-    print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
-
-
-    # read lab file
-    lab_file = eve_ssh.get_lab_file(lab_info=eve_http.lab)
-
-    if "networks" in lab_file["lab"]["topology"]:
-        lab_networks = lab_file["lab"]["topology"]["networks"]
-    else:
-        lab_file["lab"]["topology"]["networks"] = {}
-        lab_networks = lab_file["lab"]["topology"]["networks"]
-    lab_nodes = lab_file["lab"]["topology"]["nodes"]
-
-    
-    for node in lab_nodes["node"]:
-        if node.get("interface", None):
-            if isinstance(node["interface"], list):
-                node["interface"] =  list(filter(lambda x: int(x["@network_id"]) != int(network_id), node["interface"]))
-            elif isinstance(node["interface"], dict):
-                if int(node["interface"]["@network_id"]) == int(network_id):
-                    node.pop("interface")
-
-    if str(network["visibility"]) == "0":
-        if isinstance(lab_networks["network"], dict):
-            lab_networks["network"] = []
-        elif isinstance(lab_networks["network"], list):
-            lab_networks["network"] = list(filter(lambda x: int(x["@id"]) != int(network_id), lab_networks["network"]))
+    if not node_intf.connected:
+        print(f"[    Error ] ==> selected Interface {node_intf.name} on device {node.name} is not connected.")
+        sys.exit(EXIT_CONFLICT)
+    linux_intf = node_intf.linux_name
+
+    network = eve_http.topology.networks[node_intf.network_id]
+    network_id = network.id
+    bridge_name = network.bridge_name(eve_http.user_id)
+
+    # a hidden network can be a direct link without bridge, that is known from the kernel later
+    if not network.hidden:
+        print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
+
+
+    # taps of the link, a direct link has no bridge but an ingress qdisc on each of them
+    member_taps = [linux_intf]
+    direct_taps = []
+
+    def remove_interface(lab_file):
+        # hidden networks are point to point links and are removed with all their interfaces,
+        # for visible networks only the interface of this node is removed
+        if network.hidden:
+            member_taps[:] = [f"vunl{eve_http.user_id}_{node_id}_{intf_id}"
+                              for node_id, intf_id, item in lab_file.interfaces() if item == network_id]
+            remove_network(lab_file, network_id)
+        else:
+            disconnect_node_interface(lab_file, node.id, node_intf.id)
 
     print("[    Info  ] ==> Update lab file")
-    eve_ssh.update_lab_file(lab_info=eve_http.lab, file_data=lab_file)
-
-    print("[    Info  ] ==> delete bridge interface")
-    if str(network["visibility"]) == "0":
-        eve_ssh.send_command(f"ip link del {bridge_name}")
+    helper = None
+    if eve_ssh.server_helper:
+        # bridge, tap and tc mirred are only changed when they are on the host, the helper checks that
+        TRACE.phase("server helper")
+        if network.hidden:
+            edits = [{"op": "remove_network", "network": network_id}]
+            kernel = [{"tool": "ip", "if_present": bridge_name, "commands": [f"ip link del {bridge_name}"]},
+                      {"tool": "tc", "unlink_direct": True}]
+        else:
+            edits = [{"op": "disconnect", "node": node.id, "interface": node_intf.id}]
+            kernel = [{"tool": "ip", "if_present": linux_intf, "commands": [f"ip link set dev {linux_intf} nomaster"]}]
+        helper = eve_ssh.run_helper(helper_plan(eve_http.lab, eve_http.user_id, edits, kernel))
+    if helper:
+        member_taps = helper["taps"] or member_taps
+        for step in helper["kernel"]:
+            if step["tool"] == "tc":
+                direct_taps = [command.split()[4] for command in step["commands"]]
+                print("[    Info  ] ==> deleted tc mirred cross connect")
+            elif network.hidden:
+                print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
+                print("[    Info  ] ==> deleted bridge interface")
+            else:
+                print(f"[    Info  ] ==> removed {linux_intf} from bridge")
     else:
-        eve_ssh.send_command(f"ip link set dev {linux_intf} nomaster")
-
+        TRACE.phase("update lab file")
+        eve_ssh.edit_lab_file(lab_info=eve_http.lab, edit=remove_interface)
+
+        TRACE.phase("kernel commands")
+        # bridge and tap exist on linux only while a connected node is running
+        linux_interfaces = [intf["ifname"] for intf in eve_ssh.get_linux_interfaces()]
+        if network.hidden:
+            if bridge_name in linux_interfaces:
+                print(f"[    Info  ] ==> Bridge name on Linux = {bridge_name}")
+                print("[    Info  ] ==> delete bridge interface")
+                eve_ssh.run_batch([f"ip link del {bridge_name}"])
+            ingress = eve_ssh.get_ingress_qdiscs()
+            direct_taps = [tap for tap in member_taps if tap in ingress]
+            if direct_taps:
+                print("[    Info  ] ==> delete tc mirred cross connect")
+                eve_ssh.run_batch(direct_unlink_commands(direct_taps), tool="tc")
+        elif linux_intf in linux_interfaces:
+            print(f"[    Info  ] ==> remove {linux_intf} from bridge")
+            eve_ssh.run_batch([f"ip link set dev {linux_intf} nomaster"])
+
+    TRACE.phase("close")
     print("[    Info  ] ==> Close SSH connection")
     eve_ssh.client.close()
     print("[    Info  ] ==> Close HTTP connection")
     eve_http.session.close()
-
+    show_result({"action": "remove", "lab": eve_http.lab["path"], "network_id": network_id,
+                 "bridge": "" if direct_taps else bridge_name, "network removed": network.hidden,
+                 "interfaces": member_taps}, args.output, args.stream)
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import dotenv
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_SSH
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import make_table
+from util import LINK_STATS
+from util import METRICS_SERVER
+from util import TRACE
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between sweeps (default 2).",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=0,
+        help="Number of sweeps with rates to show, 0 (default) runs until CTRL-C.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="Show only the busiest ports, 0 (default) shows all.",
+    )
+    parser.add_argument(
+        "--prometheus",
+        type=int,
+        required=False,
+        help="Serve the counters in the prometheus text format on http://0.0.0.0:<port>/metrics.",
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        required=False,
+        help="Write the counters in the prometheus text format to this file after every sweep "
+             "(for the node_exporter textfile collector).",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+    #  ssh connect to eve-ng, done in the background by args_check
+    eve_ssh = EVE_SSH(ip=eve_info.ip, user=eve_info.server_user, password=eve_info.server_pass,
+                      compress=args.compress, port=eve_info.ssh_port)
+
+    args_check(args, eve_http, eve_ssh)
+
+    # bridges and taps of every network in the lab file, then one counter dump per sweep
+    TRACE.phase("map links")
+    link_stats = LINK_STATS(eve_http, eve_ssh)
+    ports = link_stats.map_links(eve_ssh.get_lab_file(eve_http.lab))
+    print(f"[    Info  ] ==> {len(ports)} bridges and taps in the lab, sweep every {args.interval}s")
+    metrics = None
+    if args.prometheus:
+        metrics = METRICS_SERVER(args.prometheus)
+        metrics.start()
+        print(f"[    Info  ] ==> Prometheus metrics on http://0.0.0.0:{args.prometheus}/metrics")
+
+    def export():
+        if metrics:
+            metrics.text = link_stats.prometheus()
+        if args.prometheus_file:
+            # written next to the file and renamed, so the collector never reads half a file
+            with open(f"{args.prometheus_file}.tmp", "w") as file:
+                file.write(link_stats.prometheus())
+            os.replace(f"{args.prometheus_file}.tmp", args.prometheus_file)
+
+    TRACE.phase("sweeps")
+    link_stats.sweep()
+    export()
+    live = None
+    if args.output == "table" and sys.stdout.isatty():
+        from rich.live import Live
+        live = Live(auto_refresh=False)
+        live.start()
+    sweeps = 0
+    try:
+        while not args.count or sweeps < args.count:
+            time.sleep(args.interval)
+            link_stats.sweep()
+            sweeps += 1
+            export()
+            title = f"Link Stats {eve_http.lab['path']} {time.strftime('%H:%M:%S')}"
+            if live:
+                rows = link_stats.table_rows(args.top)
+                if rows:
+                    live.update(make_table({title: rows}), refresh=True)
+            elif args.output == "table":
+                show_rows(title, link_stats.table_rows(args.top), args.output, args.stream)
+            else:
+                show_rows(title, link_stats.rows(args.top), args.output, args.stream)
+    finally:
+        if live:
+            live.stop()
+
+    TRACE.phase("close")
+    print("[    Info  ] ==> Close SSH connection")
+    eve_ssh.client.close()
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()
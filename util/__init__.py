@@ -1,16 +1,21 @@
 import os
+import atexit
+from urllib.parse import urlparse
 from .util import *
+from .lab_index import LAB_INDEX
+from .topology import LAB_TOPOLOGY, NETWORK_IDS
+from .profiles import BRIDGE_PROFILES, BUILTIN_PROFILES
+from .trace import TRACE
+from .transport import TRANSPORT
+from .batch import LINK_BATCH, load_batch_file, normalize_operations
+from .reconcile import LINK_RECONCILE
+from .migrate import LINK_MIGRATE
+from .watch import LAB_WATCH
+from .audit import LAB_AUDIT
+from .stats import LINK_STATS, METRICS_SERVER
+from .daemon import EVE_DAEMON, EVE_SERVER, DEFAULT_SOCKET
+from .fleet import FLEET, load_inventory
 from dotenv import load_dotenv
-from dataclasses import dataclass
-
-@dataclass
-class EVE_INFO():
-    ip: str = ""
-    server_user: str = ""
-    server_pass: str = ""
-    http_user: str = ""
-    http_pass: str = ""
-    url: str = ""
 
 
 def init_server_info(eve_info: EVE_INFO):
@@ -19,40 +24,101 @@ def init_server_info(eve_info: EVE_INFO):
     eve_info.server_pass= os.environ.get("eve_server_password")
     eve_info.http_user = os.environ.get("http_user")
     eve_info.http_pass = os.environ.get("http_password")
-    eve_info.url = f"http://{eve_info.ip}/api"
+    eve_info.ssh_port = int(os.environ.get("eve_server_ssh_port") or 22)
+    http_port = os.environ.get("eve_server_http_port")
+    eve_info.url = server_url(eve_info.ip, http_port)
+
+def init_trace(args):
+    # record spans for --profile and --trace-file, the report is written when the script exits
+    if not (args.profile or args.trace_file):
+        return
+    TRACE.enable()
+    atexit.register(finish_trace, args)
+
+def finish_trace(args):
+    TRACE.finish()
+    if args.profile:
+        show_table({"Profile": TRACE.report_rows()})
+        show_table({"Transport": TRANSPORT.report_rows()})
+    if args.trace_file:
+        TRACE.write(args.trace_file)
+        print(f"[    Info  ] ==> Trace written to {args.trace_file}")
+
+def init_output(args):
+    # with json or tsv output stdout only carries results, messages and prompts go to stderr
+    args.stream = sys.stdout
+    if args.output != "table":
+        sys.stdout = sys.stderr
 
-def args_check(args, eve_http: EVE_HTTP):
+def needs_ssh(args) -> bool:
+    # listings are answered from the http api, only link changes use ssh
+    return not (args.users_list or args.lab_list or args.all_nodes or args.port_map or args.node_id)
 
-    if response:= eve_http.connect() != True:
+def args_check(args, eve_http: EVE_HTTP, eve_ssh: EVE_SSH = None, need_lab=True):
+
+    init_output(args)
+    init_trace(args)
+    TRANSPORT.configure(args)
+    if eve_ssh:
+        eve_ssh.server_helper = args.server_helper or os.environ.get("eve_server_helper", "") in ["1", "true", "yes"]
+        eve_ssh.bridge_profiles.run_profile = args.bridge_profile
+        if unknown := eve_ssh.bridge_profiles.unknown():
+            print(f"[    Error ] ==> bridge profile {', '.join(unknown)} is not defined")
+            sys.exit(EXIT_USAGE)
+    # the ssh handshake runs in the background while we log in and look up the lab
+    TRACE.phase("login")
+    if eve_ssh and needs_ssh(args):
+        eve_ssh.connect_background()
+    if (response := eve_http.connect()) != True:
         print("[    Error ] ==> could not connect to EVE http server.")
         print(response.text)
-        sys.exit(1)
-
-    eve_http.get_lab_lists()
-    # show all labs using -L
-    if args.lab_list:
-        show_table({"List of Labs": eve_http.lab_lists})
-        sys.exit(0)
+        sys.exit(EXIT_CONNECT)
 
     # show all users using -U
     if args.users_list:
         eve_users = eve_http.get_users()
-        show_table({"Users List": eve_users})
-        sys.exit()
+        show_rows("Users List", eve_users, args.output, args.stream)
+        sys.exit(EXIT_OK)
+
+    # use the local lab index, labs are discovered again only when it is stale
+    TRACE.phase("lab discovery")
+    eve_http.lab_index = LAB_INDEX(urlparse(eve_http.url).netloc.replace(":", "_"), eve_http.user_id,
+                                   ttl=args.cache_ttl)
+    if not args.refresh:
+        eve_http.lab_index.load()
+    if args.lab_list or not eve_http.lab_index.is_fresh():
+        eve_http.get_lab_lists()
+    else:
+        eve_http.lab_lists = eve_http.lab_index.lab_list()
+
+    # show all labs using -L
+    if args.lab_list:
+        show_rows("List of Labs", eve_http.lab_lists, args.output, args.stream)
+        sys.exit(EXIT_OK)
+
+    # scripts that work on every lab of the tenant stop after lab discovery
+    if not need_lab:
+        return
 
     if args.current_lab:
         eve_http.lab_name = args.current_lab
     else:
-        eve_http.lab_name = input("Please insert lab id: ")
+        eve_http.lab_name = ask("Please insert lab id: ")
 
     # find lab in question
+    TRACE.phase("find lab")
     if current_lab := eve_http.find_lab_name():
         pass
     else:
         print(f"[    Error ] ==> Lab {eve_http.lab_name} is not exist.")
-        sys.exit(1)
+        sys.exit(EXIT_NOT_FOUND)
+
+    # lab file download overlaps with reading nodes and picking interfaces
+    if eve_ssh:
+        eve_ssh.prefetch_lab_file(eve_http.lab)
 
     # get all nodes in current lab
+    TRACE.phase("lab nodes")
     eve_http.get_lab_nodes()
 
     # get list of lab networks
@@ -62,22 +128,27 @@ def args_check(args, eve_http: EVE_HTTP):
 #     # show all all nodes table
     if not eve_http.lab_nodes:
         print("[    Info  ] ==> there is no node in the LAB")
-        sys.exit(1)
+        sys.exit(EXIT_NOT_FOUND)
     
     if args.all_nodes:
-        show_table({"Nodes List": eve_http.lab_nodes})
-        sys.exit(0)
+        show_rows("Nodes List", eve_http.lab_nodes, args.output, args.stream)
+        sys.exit(EXIT_OK)
+
+    # show interfaces of all nodes using -P
+    if args.port_map:
+        TRACE.phase("port map")
+        show_rows("Port Map", eve_http.port_map_rows(), args.output, args.stream)
+        sys.exit(EXIT_OK)
 
 
     if args.node_id:
+        if args.node_id.startswith("net") and eve_http.topology.network(args.node_id):
+            print("[    Warrning ] ==> cannot print list of interfaces for Bridge and cloud node")
+            sys.exit(EXIT_USAGE)
         if node:= eve_http.is_node_id(args.node_id):
-            if node["status"] == "passive":
-                print("[    Warrning ] ==> cannot print list of interfaces for Bridge and cloud node")
-                sys.exit()
-            else:
-                node_interfaces = eve_http.get_node_interfaces(node)
-                show_table({f"List of interfaces for {node['name']}": node_interfaces})
-                sys.exit()
+            node_interfaces = eve_http.get_node_interfaces(node)
+            show_rows(f"List of interfaces for {node.name}", node_interfaces, args.output, args.stream)
+            sys.exit(EXIT_OK)
         else:
             print("[    Error ] ==> Selected Node ID is not exists in the lab")
-            sys.exit(1)
+            sys.exit(EXIT_NOT_FOUND)
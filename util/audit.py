@@ -0,0 +1,160 @@
+import re
+
+from .util import as_list
+from .util import disconnect_node_interface
+from .util import remove_network
+from .util import direct_unlink_commands
+from .trace import TRACE
+
+
+class LAB_AUDIT():
+    # find drift between the lab files of a tenant and the bridges on the eve-ng host:
+    # every lab file is read once and the host links are dumped once, then the expected
+    # tap -> bridge membership of the running nodes is compared with the actual one.
+    # with repair the lab files are fixed under the lab lock and the kernel with one command batch.
+    def __init__(self, eve_http, eve_ssh) -> None:
+        self.eve_http = eve_http
+        self.eve_ssh = eve_ssh
+        self.rows = []
+        self.commands = []
+        self.tc_commands = []
+        # bridges of visible networks, they get the bridge profile of visible networks
+        self.visible_bridges = set()
+
+    def check_lab_file(self, lab, lab_file) -> list:
+        # lab file drift, fixed in lab_file in memory: interfaces on a network that is not
+        # in the lab and hidden (point to point) networks left with less than two interfaces
+        rows = []
+        network_ids = {str(network_id) for network_id in lab_file.network_ids()}
+        members = {}
+        for node_id, intf_id, network_id in lab_file.interfaces():
+            if network_id == "0":
+                continue
+            if network_id not in network_ids:
+                disconnect_node_interface(lab_file, node_id, intf_id)
+                rows.append({"lab": lab["path"], "drift": "interface without network",
+                             "object": f"node {node_id} interface {intf_id}", "expected": "",
+                             "actual": f"network {network_id}", "repair": "lab file"})
+                continue
+            members.setdefault(network_id, []).append((node_id, intf_id))
+        for network in as_list(lab_file.networks.get("network")):
+            network_id = str(network["@id"])
+            if str(network.get("@visibility", "0")) == "0" and len(members.get(network_id, [])) < 2:
+                remove_network(lab_file, network_id)
+                rows.append({"lab": lab["path"], "drift": "unused network", "object": f"network {network_id}",
+                             "expected": "2 interfaces", "actual": f"{len(members.get(network_id, []))} interfaces",
+                             "repair": "lab file"})
+        return rows
+
+    def expected_masters(self, lab_file, running):
+        # tap -> bridge of the connected interfaces of running nodes,
+        # and the bridges of all networks when the lab is running
+        tenant = self.eve_http.user_id
+        bridges = {}
+        for network in as_list(lab_file.networks.get("network")):
+            network_id = str(network["@id"])
+            bridges[network_id] = f"vnet{tenant}_{network_id}" if network["@type"] == "bridge" else network["@type"]
+            if str(network.get("@visibility", "0")) != "0":
+                self.visible_bridges.add(bridges[network_id])
+        taps = {}
+        for node_id, intf_id, network_id in lab_file.interfaces():
+            if node_id in running and network_id in bridges:
+                taps[f"vunl{tenant}_{node_id}_{intf_id}"] = bridges[network_id]
+        return taps, set(bridges.values()) if running else set()
+
+    def check_kernel(self, linux_interfaces, expected, owners, used_bridges, orphans=True, ingress=()) -> list:
+        # kernel drift of the taps in expected and of the tenant bridges no running lab uses.
+        # owners is running node id -> labs it runs in, a node in two labs is reported but not touched.
+        # ingress are the interfaces with an ingress qdisc, a tap of a direct (tc mirred) link has
+        # one and no bridge
+        tenant = self.eve_http.user_id
+        tap_re = re.compile(rf"vunl{tenant}_(\d+)_(\d+)$")
+        bridge_re = re.compile(rf"vnet{tenant}_(\d+)$")
+        masters = {intf["ifname"]: intf.get("master") for intf in linux_interfaces}
+        rows = []
+        for ifname, master in masters.items():
+            if not (match := tap_re.match(ifname)) or match.group(1) not in owners:
+                continue
+            lab = ", ".join(sorted(owners[match.group(1)]))
+            if len(owners[match.group(1)]) > 1:
+                rows.append({"lab": lab, "drift": "node in more than one running lab", "object": ifname,
+                             "expected": "", "actual": master or "", "repair": ""})
+                continue
+            bridge = expected.get(ifname)
+            if bridge and master is None and ifname in ingress and bridge_re.match(bridge):
+                continue
+            if bridge is None and ifname in ingress:
+                self.tc_commands.extend(direct_unlink_commands([ifname]))
+                rows.append({"lab": lab, "drift": "cross connect of unconnected interface", "object": ifname,
+                             "expected": "", "actual": "tc mirred", "repair": self.tc_commands[-1]})
+            if master == bridge:
+                continue
+            if bridge is None:
+                if not master or not bridge_re.match(master):
+                    continue
+                repair = [f"ip link set dev {ifname} nomaster"]
+                self.commands.extend(repair)
+                drift = "tap of unconnected interface"
+            else:
+                hidden = bridge not in self.visible_bridges
+                if bridge not in masters:
+                    self.commands.extend(self.eve_ssh.bridge_profiles.create_commands(bridge, hidden))
+                    masters[bridge] = None
+                repair = self.eve_ssh.bridge_profiles.attach_commands(ifname, bridge, hidden)
+                self.commands.extend(repair)
+                drift = "tap without bridge" if master is None else "tap on wrong bridge"
+            rows.append({"lab": lab, "drift": drift, "object": ifname, "expected": bridge or "",
+                         "actual": master or "", "repair": "; ".join(repair)})
+        if orphans:
+            for ifname in list(masters):
+                if bridge_re.match(ifname) and ifname not in used_bridges:
+                    self.commands.append(f"ip link del {ifname}")
+                    rows.append({"lab": "", "drift": "bridge of no running lab", "object": ifname,
+                                 "expected": "", "actual": "", "repair": self.commands[-1]})
+        return rows
+
+    def run(self, labs, running=None, orphans=True, repair=False) -> list:
+        # running is lab path -> ids of running nodes, fetched from eve-ng when not given.
+        # orphans reports tenant bridges of no running audited lab, only right when every running lab is audited
+        if running is None:
+            TRACE.phase("running nodes")
+            running = self.eve_http.get_running_nodes(labs)
+        TRACE.phase("linux interfaces")
+        linux_interfaces = self.eve_ssh.get_linux_interfaces()
+        ingress = self.eve_ssh.get_ingress_qdiscs()
+        TRACE.phase("lab files")
+        self.rows = []
+        self.commands = []
+        self.tc_commands = []
+        self.visible_bridges = set()
+        expected = {}
+        owners = {}
+        used_bridges = set()
+        changed = []
+        for lab in labs:
+            lab_file = self.eve_ssh.get_lab_file(lab)
+            rows = self.check_lab_file(lab, lab_file)
+            if rows:
+                changed.append(lab)
+            self.rows.extend(rows)
+            # the kernel is compared with the lab file as it is after the repair
+            taps, bridges = self.expected_masters(lab_file, running.get(lab["path"], set()))
+            expected.update(taps)
+            used_bridges |= bridges
+            for node_id in running.get(lab["path"], set()):
+                owners.setdefault(node_id, set()).add(lab["path"])
+        TRACE.phase("compare")
+        self.rows.extend(self.check_kernel(linux_interfaces, expected, owners, used_bridges, orphans, ingress))
+        print(f"[    Info  ] ==> Audited {len(labs)} labs, {len([x for x in running.values() if x])} running, "
+              f"{len(self.rows)} drifts found")
+        if not repair:
+            return self.rows
+        TRACE.phase("update lab file")
+        for lab in changed:
+            print(f"[    Info  ] ==> Repair lab file {lab['path']}")
+            self.eve_ssh.edit_lab_file(lab, lambda lab_file, lab=lab: self.check_lab_file(lab, lab_file))
+        TRACE.phase("kernel commands")
+        if self.commands or self.tc_commands:
+            print(f"[    Info  ] ==> Send {len(self.commands) + len(self.tc_commands)} kernel commands")
+            self.eve_ssh.run_steps([("ip", self.commands), ("tc", self.tc_commands)])
+        return self.rows
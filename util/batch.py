@@ -0,0 +1,255 @@
+import os
+import sys
+import csv
+import json
+
+from .util import create_network
+from .util import connect_node_to_network
+from .util import disconnect_node_interface
+from .util import remove_network
+from .util import is_interface_connected
+from .util import direct_unlink_commands
+from .util import EXIT_ERROR
+from .util import EXIT_USAGE
+from .util import EXIT_NOT_FOUND
+from .util import EXIT_CONFLICT
+from .trace import TRACE
+from .topology import NETWORK_IDS
+
+
+def load_batch_file(path) -> list:
+    # read add/remove operations from a csv, yaml or json file.
+    # every operation has "action" (add or remove), "a" and for add "b".
+    # an end point is "node:interface" or "net:network" with names or ids.
+    ext = os.path.splitext(path)[1].lower()
+    with open(path) as file:
+        if ext == ".csv":
+            operations = list(csv.DictReader(file))
+        elif ext in [".yaml", ".yml"]:
+            try:
+                import yaml
+            except ImportError:
+                print("[    Error ] ==> PyYAML is needed to read yaml batch files (pip install pyyaml)")
+                sys.exit(EXIT_ERROR)
+            operations = yaml.safe_load(file)
+        else:
+            operations = json.load(file)
+    return normalize_operations(operations)
+
+
+def normalize_operations(operations) -> list:
+    # operations of a batch file or a daemon request as {"action", "a", "b"} with clean strings
+    if isinstance(operations, dict):
+        operations = operations.get("links", [])
+    result = []
+    for item in operations:
+        action = str(item.get("action", "add")).strip().lower()
+        if action not in ["add", "remove"]:
+            print(f"[    Error ] ==> unknown batch action {action}")
+            sys.exit(EXIT_USAGE)
+        if not item.get("a"):
+            print(f"[    Error ] ==> batch operation {item} has no end point a")
+            sys.exit(EXIT_USAGE)
+        result.append({"action": action, "a": str(item["a"]).strip(),
+                       "b": str(item.get("b") or "").strip()})
+    return result
+
+
+class LINK_BATCH():
+    # apply many add/remove link operations against one lab snapshot:
+    # one lab file read, one lab file write and one kernel command round trip.
+    def __init__(self, eve_http, eve_ssh) -> None:
+        self.eve_http = eve_http
+        self.eve_ssh = eve_ssh
+        self.topology = eve_http.topology
+        self.results = []
+        self.tc_commands = []
+        # interfaces with an ingress qdisc, asked only when a link may be a direct one
+        self.ingress = None
+
+    def load_interfaces(self):
+        # only the nodes named in the operations are asked for their interfaces
+        names = {end[1] for operation, ends in self.parsed for end in ends if end[0] == "node"}
+        nodes = [self.find_node(name) for name in sorted(names)]
+        self.eve_http.get_interfaces(nodes)
+
+    def find_node(self, name):
+        if node := self.topology.node(name):
+            return node
+        print(f"[    Error ] ==> Node {name} is not exist in the lab")
+        sys.exit(EXIT_NOT_FOUND)
+
+    def find_network(self, name):
+        if network := self.topology.network(name):
+            return network
+        print(f"[    Error ] ==> Network {name} is not exist in the lab")
+        sys.exit(EXIT_NOT_FOUND)
+
+    def find_interface(self, node, name):
+        if node_intf := self.topology.interface(node, name):
+            return node_intf
+        print(f"[    Error ] ==> Interface {name} is not exist on {node.name}")
+        sys.exit(EXIT_NOT_FOUND)
+
+    def parse_end_point(self, end_point):
+        if end_point.startswith("net:"):
+            return "net", end_point[4:], None
+        if ":" not in end_point:
+            print(f"[    Error ] ==> End point {end_point} should be node:interface or net:network")
+            sys.exit(EXIT_USAGE)
+        node, intf = end_point.rsplit(":", 1)
+        return "node", node, intf
+
+    def resolve(self, operations):
+        # resolve every end point against the lab nodes, networks and interfaces
+        self.parsed = []
+        for operation in operations:
+            ends = [self.parse_end_point(operation["a"])]
+            if operation["action"] == "add":
+                if not operation["b"]:
+                    print(f"[    Error ] ==> add operation for {operation['a']} has no end point b")
+                    sys.exit(EXIT_USAGE)
+                ends.append(self.parse_end_point(operation["b"]))
+            self.parsed.append((operation, ends))
+        self.load_interfaces()
+
+        self.plan = []
+        for operation, ends in self.parsed:
+            resolved = []
+            for kind, name, intf in ends:
+                if kind == "net":
+                    resolved.append(("net", self.find_network(name)))
+                    continue
+                node = self.find_node(name)
+                node_intf = self.find_interface(node, intf)
+                resolved.append(("node", node, node_intf))
+            self.plan.append((operation, resolved))
+
+        # interfaces freed by remove operations can be used by add operations of the same batch
+        freed_networks = set()
+        freed = set()
+        for operation, resolved in self.plan:
+            if operation["action"] == "remove" and resolved[0][0] == "node":
+                _, node, node_intf = resolved[0]
+                freed.add((node.id, node_intf.id))
+                network = self.topology.networks.get(node_intf.network_id)
+                if network and network.hidden:
+                    freed_networks.add(node_intf.network_id)
+
+        used = set()
+        for operation, resolved in self.plan:
+            for end in resolved:
+                if end[0] != "node":
+                    continue
+                _, node, node_intf = end
+                key = (operation["action"], node.id, node_intf.id)
+                if key in used:
+                    print(f"[    Error ] ==> Interface {node_intf.name} on {node.name} is used twice in the batch")
+                    sys.exit(EXIT_USAGE)
+                used.add(key)
+                is_freed = key[1:] in freed or node_intf.network_id in freed_networks
+                if operation["action"] == "add" and node_intf.connected and not is_freed:
+                    print(f"[    Error ] ==> Interface {node_intf.name} on device {node.name} is connected already.")
+                    sys.exit(EXIT_CONFLICT)
+                if operation["action"] == "remove" and not node_intf.connected:
+                    print(f"[    Error ] ==> Interface {node_intf.name} on device {node.name} is not connected.")
+                    sys.exit(EXIT_CONFLICT)
+            if operation["action"] == "remove" and resolved[0][0] != "node":
+                print(f"[    Error ] ==> remove operation needs a node interface, not {operation['a']}")
+                sys.exit(EXIT_USAGE)
+            if operation["action"] == "add" and resolved[0][0] == "net" and resolved[1][0] == "net":
+                print("[    Error ] ==> cannot connect Bridge to Bridge")
+                sys.exit(EXIT_USAGE)
+        return self.plan
+
+    def direct_taps(self, taps, masters) -> list:
+        # taps of a direct (tc mirred) link: they exist, have no bridge and have an ingress qdisc
+        loose = [tap for tap in taps if tap in masters and masters[tap] is None]
+        if not loose:
+            return []
+        if self.ingress is None:
+            self.ingress = self.eve_ssh.get_ingress_qdiscs()
+        return [tap for tap in loose if tap in self.ingress]
+
+    def apply(self, lab_file, linux_interfaces):
+        # edit the lab file in memory and return the kernel commands for all operations,
+        # tc commands that remove direct links are kept in self.tc_commands
+        tenant = self.eve_http.user_id
+        profiles = self.eve_ssh.bridge_profiles
+        self.results = []
+        self.tc_commands = []
+        commands = []
+        ifnames = {intf["ifname"] for intf in linux_interfaces}
+        masters = {intf["ifname"]: intf.get("master") for intf in linux_interfaces}
+        network_taps = {}
+        for node_id, intf_id, network_id in lab_file.interfaces():
+            network_taps.setdefault(network_id, []).append(f"vunl{tenant}_{node_id}_{intf_id}")
+
+        # removals first, so their network ids can be used again
+        removed = set()
+        for operation, resolved in self.plan:
+            if operation["action"] != "remove":
+                continue
+            _, node, node_intf = resolved[0]
+            network = self.topology.networks.get(node_intf.network_id)
+            if network is None or network.id in removed:
+                continue
+            if network.hidden:
+                remove_network(lab_file, network.id)
+                direct = self.direct_taps(network_taps.get(network.id, []), masters)
+                self.tc_commands.extend(direct_unlink_commands(direct))
+                if network.bridge_name(tenant) in ifnames:
+                    commands.append(f"ip link del {network.bridge_name(tenant)}")
+                    ifnames.discard(network.bridge_name(tenant))
+                removed.add(network.id)
+            else:
+                disconnect_node_interface(lab_file, node.id, node_intf.id)
+                if node_intf.linux_name in ifnames:
+                    commands.append(f"ip link set dev {node_intf.linux_name} nomaster")
+            self.results.append({"action": "remove", "a": operation["a"], "b": "",
+                                 "network": network.id, "bridge": network.bridge_name(tenant)})
+        # network ids come from the lab file read under the lab lock, not from the rest snapshot
+        adds = [item for item in self.plan if item[0]["action"] == "add"]
+        network_ids = NETWORK_IDS(lab_file.network_ids())
+        for operation, resolved in adds:
+            if resolved[0][0] == "node" and resolved[1][0] == "node":
+                (_, node_a, intf_a), (_, node_b, intf_b) = resolved
+                network_id = network_ids.allocate()
+                bridge_name = f"vnet{tenant}_{network_id}"
+                hidden = True
+                create_network(lab_file, network_id, f'Net-{node_a.name}iface_{intf_a.id}')
+                ends = [(node_a, intf_a), (node_b, intf_b)]
+            else:
+                (_, network), end = (resolved[0], resolved[1]) if resolved[0][0] == "net" else (resolved[1], resolved[0])
+                network_id = network.id
+                bridge_name = network.bridge_name(tenant)
+                hidden = network.hidden
+                ends = [(end[1], end[2])]
+            for node, node_intf in ends:
+                if is_interface_connected(lab_file, node.id, node_intf.id):
+                    print(f"[    Error ] ==> Interface {node_intf.name} on device {node.name} is connected already.")
+                    sys.exit(EXIT_CONFLICT)
+                connect_node_to_network(lab_file, node, node_intf, network_id)
+            running = [(node, node_intf) for node, node_intf in ends if node.running]
+            if running and bridge_name not in ifnames:
+                commands.extend(profiles.create_commands(bridge_name, hidden))
+                ifnames.add(bridge_name)
+            for node, node_intf in running:
+                commands.extend(profiles.attach_commands(node_intf.linux_name, bridge_name, hidden))
+            self.results.append({"action": "add", "a": operation["a"], "b": operation["b"],
+                                 "network": str(network_id), "bridge": bridge_name})
+        return commands
+
+    def run(self, operations):
+        TRACE.phase("resolve")
+        self.resolve(operations)
+        print(f"[    Info  ] ==> Resolved {len(self.plan)} operations")
+        TRACE.phase("linux interfaces")
+        linux_interfaces = self.eve_ssh.get_linux_interfaces()
+        print("[    Info  ] ==> Update lab file")
+        TRACE.phase("update lab file")
+        commands = self.eve_ssh.edit_lab_file(self.eve_http.lab, lambda lab_file: self.apply(lab_file, linux_interfaces))
+        print(f"[    Info  ] ==> Send {len(commands) + len(self.tc_commands)} kernel commands")
+        TRACE.phase("kernel commands")
+        self.eve_ssh.run_steps([("ip", commands), ("tc", self.tc_commands)])
+        return self.results
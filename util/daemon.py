@@ -0,0 +1,227 @@
+import os
+import io
+import sys
+import json
+import time
+import threading
+import socketserver
+from urllib.parse import urlparse
+
+from .util import EVE_HTTP
+from .util import EVE_SSH
+from .lab_index import LAB_INDEX
+from .lab_index import CACHE_DIR
+from .batch import LINK_BATCH
+from .batch import normalize_operations
+from .reconcile import LINK_RECONCILE
+
+
+DEFAULT_SOCKET = os.path.join(CACHE_DIR, "eve.sock")
+# requests that only read, the only ones sent again after a login
+READ_ONLY_OPS = ["labs", "users", "nodes", "ports"]
+
+
+class _THREAD_OUTPUT(io.TextIOBase):
+    # stdout replacement that sends prints of a request thread to its own buffer
+    def __init__(self, stream) -> None:
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class EVE_SERVER():
+    # authenticated http session, ssh transport and lab caches for one eve-ng server
+    def __init__(self, eve_info, workers=8, cache_ttl=30, keepalive=30, index_ttl=300) -> None:
+        self.info = eve_info
+        self.workers = workers
+        # seconds lab nodes and networks are kept in memory, and the lab index is trusted
+        self.cache_ttl = cache_ttl
+        self.index_ttl = index_ttl
+        self.keepalive = keepalive
+        self.lock = threading.Lock()
+        # lab path -> (time, lab nodes, lab networks, topology)
+        self.labs = {}
+        self.eve_http = None
+        self.eve_ssh = None
+
+    def login(self):
+        eve_http = EVE_HTTP(eve_url=self.info.url, http_user=self.info.http_user,
+                            http_password=self.info.http_pass, workers=self.workers)
+        if eve_http.connect() != True:
+            raise RuntimeError(f"could not connect to EVE http server {self.info.ip}")
+        eve_http.lab_index = LAB_INDEX(urlparse(eve_http.url).netloc.replace(":", "_"), eve_http.user_id,
+                                       ttl=self.index_ttl)
+        eve_http.lab_index.load()
+        self.eve_http = eve_http
+        self.labs = {}
+
+    def http(self) -> EVE_HTTP:
+        if self.eve_http is None:
+            self.login()
+        return self.eve_http
+
+    def ssh(self) -> EVE_SSH:
+        transport = self.eve_ssh.client.get_transport() if self.eve_ssh else None
+        if transport is None or not transport.is_active():
+            self.eve_ssh = EVE_SSH(ip=self.info.ip, user=self.info.server_user, password=self.info.server_pass,
+                                   port=self.info.ssh_port)
+            self.eve_ssh.connect()
+            self.eve_ssh.client.get_transport().set_keepalive(self.keepalive)
+        return self.eve_ssh
+
+    def link_ssh(self, request) -> EVE_SSH:
+        # ssh of the server with the bridge profile asked for in the request
+        eve_ssh = self.ssh()
+        eve_ssh.bridge_profiles.run_profile = request.get("bridge_profile")
+        if unknown := eve_ssh.bridge_profiles.unknown():
+            raise RuntimeError(f"bridge profile {', '.join(unknown)} is not defined")
+        return eve_ssh
+
+    def session_alive(self) -> bool:
+        if self.eve_http is None:
+            return False
+        try:
+            return self.eve_http._request("get", "/auth").ok
+        except (Exception, SystemExit):
+            return False
+
+    def check_session(self):
+        # keep the http session alive and log in again when it expired
+        with self.lock:
+            if self.eve_http is not None and not self.session_alive():
+                self.login()
+
+    def select_lab(self, name):
+        eve_http = self.http()
+        if not eve_http.lab_index.is_fresh():
+            eve_http.get_lab_lists()
+        eve_http.lab_name = name
+        if not eve_http.find_lab_name():
+            raise RuntimeError(f"lab {name} is not exist")
+        cached = self.labs.get(eve_http.lab["path"])
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            eve_http.lab_nodes, eve_http.lab_networks, eve_http.topology = cached[1], cached[2], cached[3]
+        else:
+            eve_http.get_lab_nodes()
+            eve_http.get_lab_networks()
+            self.labs[eve_http.lab["path"]] = (time.time(), eve_http.lab_nodes, eve_http.lab_networks,
+                                               eve_http.topology)
+        return eve_http.lab
+
+    def run(self, request):
+        # run one request, log in again when the session is broken and retry it once if it only reads.
+        # a request that changes the lab may have done a part of it and is never sent twice
+        with self.lock:
+            try:
+                return self._run(request)
+            except (RuntimeError, SystemExit):
+                raise
+            except Exception:
+                if self.session_alive():
+                    raise
+                self.login()
+                if request.get("op") not in READ_ONLY_OPS:
+                    raise
+                return self._run(request)
+
+    def _run(self, request):
+        op = request.get("op")
+        if op == "labs":
+            eve_http = self.http()
+            if not eve_http.lab_index.is_fresh():
+                eve_http.get_lab_lists()
+            return eve_http.lab_index.lab_list()
+        if op == "users":
+            return self.http().get_users()
+        if op == "nodes":
+            self.select_lab(request["lab"])
+            return self.eve_http.lab_nodes
+        if op == "ports":
+            self.select_lab(request["lab"])
+            return self.eve_http.port_map_rows()
+        if op == "reconcile":
+            links = normalize_operations(request.get("operations") or [])
+            lab = self.select_lab(request["lab"])
+            link_reconcile = LINK_RECONCILE(self.eve_http, self.link_ssh(request))
+            try:
+                return link_reconcile.run(links, dry_run=bool(request.get("dry_run")))
+            finally:
+                self.labs.pop(lab["path"], None)
+        if op == "profile":
+            self.select_lab(request["lab"])
+            eve_ssh = self.link_ssh(request)
+            rows, commands = eve_ssh.bridge_profiles.lab_commands(self.eve_http.topology,
+                                                                  eve_ssh.get_linux_interfaces())
+            if not request.get("dry_run"):
+                eve_ssh.run_batch(commands)
+            return rows
+        if op in ["add", "remove", "apply"]:
+            lab = self.select_lab(request["lab"])
+            if op == "apply":
+                operations = request.get("operations") or []
+            else:
+                operations = [{"action": op, "a": request.get("a"), "b": request.get("b")}]
+            operations = normalize_operations(operations)
+            link_batch = LINK_BATCH(self.eve_http, self.link_ssh(request))
+            try:
+                return link_batch.run(operations)
+            finally:
+                # our own change makes the cached lab state old
+                self.labs.pop(lab["path"], None)
+        raise RuntimeError(f"unknown operation {op}")
+
+
+class _REQUEST_HANDLER(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            output = io.StringIO()
+            sys.stdout.local.buffer = output
+            try:
+                request = json.loads(line)
+                server = self.server.eve_servers[request.get("server") or self.server.default_server]
+                response = {"ok": True, "result": server.run(request)}
+            except SystemExit:
+                lines = output.getvalue().splitlines()
+                response = {"ok": False, "error": lines[-1] if lines else "operation failed"}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            finally:
+                sys.stdout.local.buffer = None
+            response["log"] = output.getvalue().splitlines()
+            response["time"] = round(time.perf_counter() - start, 4)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class EVE_DAEMON(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # resident daemon that serves link operations over a unix domain socket.
+    # one json request per line, one json response per line.
+    daemon_threads = True
+
+    def __init__(self, socket_path, eve_servers, default_server, session_check=60) -> None:
+        self.eve_servers = eve_servers
+        self.default_server = default_server
+        self.session_check = session_check
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        super().__init__(socket_path, _REQUEST_HANDLER)
+        os.chmod(socket_path, 0o600)
+        if not isinstance(sys.stdout, _THREAD_OUTPUT):
+            sys.stdout = _THREAD_OUTPUT(sys.stdout)
+        threading.Thread(target=self._keepalive, daemon=True).start()
+
+    def _keepalive(self):
+        while True:
+            time.sleep(self.session_check)
+            for server in self.eve_servers.values():
+                server.check_session()
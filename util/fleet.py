@@ -0,0 +1,174 @@
+import io
+import os
+import sys
+import json
+import time
+import queue
+import fnmatch
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .util import EVE_INFO
+from .util import server_url
+from .util import EXIT_ERROR
+from .daemon import EVE_SERVER
+from .daemon import _THREAD_OUTPUT
+
+
+def load_inventory(path) -> list:
+    # eve-ng servers of a json or yaml inventory, one EVE_INFO per server and http user (tenant):
+    #   servers:
+    #     - name: eve1
+    #       ip: 10.0.0.1
+    #       server_user: root
+    #       server_password: eve
+    #       http_user: admin               # or users: [{http_user: .., http_password: ..}, ..]
+    #       http_password: eve
+    #       ssh_port: 22                   # optional
+    #       http_port: 80                  # optional
+    # values that start with $ are read from the environment, so passwords can stay out of the file
+    with open(path) as file:
+        if os.path.splitext(path)[1].lower() in [".yaml", ".yml"]:
+            try:
+                import yaml
+            except ImportError:
+                print("[    Error ] ==> PyYAML is needed to read yaml inventory files (pip install pyyaml)")
+                sys.exit(EXIT_ERROR)
+            data = yaml.safe_load(file)
+        else:
+            data = json.load(file)
+    servers = data.get("servers", []) if isinstance(data, dict) else data
+
+    def value(item, key, default=""):
+        text = str(item.get(key) or default)
+        return os.environ.get(text[1:], "") if text.startswith("$") else text
+
+    result = []
+    for server in servers:
+        users = server.get("users") or [server]
+        for user in users:
+            result.append(EVE_INFO(ip=value(server, "ip"), server_user=value(server, "server_user", "root"),
+                                   server_pass=value(server, "server_password"),
+                                   http_user=value(user, "http_user"), http_pass=value(user, "http_password"),
+                                   url=server_url(value(server, "ip"), server.get("http_port")),
+                                   ssh_port=int(server.get("ssh_port") or 22),
+                                   name=str(server.get("name") or server["ip"])))
+    return result
+
+
+def lab_selected(lab, names=(), folders=()) -> bool:
+    # names are shell patterns on the lab name, file name or path, folders are path prefixes
+    if names and not any(fnmatch.fnmatch(lab.get(key) or "", pattern)
+                         for pattern in names for key in ["name", "filename", "path"]):
+        return False
+    if folders and not any(lab["path"].startswith(folder.rstrip("/") + "/") for folder in folders):
+        return False
+    return True
+
+
+class FLEET():
+    # one operation on many labs of many eve-ng servers at the same time.
+    # every server (and http user) gets its own pool of up to workers sessions, an EVE_SERVER
+    # each with an http session and an ssh connection, and max_workers caps the targets that
+    # run at the same time over all servers. prints of a target go to its own log.
+    def __init__(self, infos, workers=4, max_workers=16, index_ttl=300) -> None:
+        self.infos = infos
+        self.workers = workers
+        self.max_workers = max_workers
+        self.index_ttl = index_ttl
+        self.lock = threading.Lock()
+        # info index -> idle sessions and number of sessions made
+        self.idle = {index: queue.Queue() for index in range(len(infos))}
+        self.made = {index: 0 for index in range(len(infos))}
+        self.sessions = []
+        if not isinstance(sys.stdout, _THREAD_OUTPUT):
+            sys.stdout = _THREAD_OUTPUT(sys.stdout)
+
+    @contextmanager
+    def session(self, index):
+        # an idle session of the server, a new one while the server has less than workers,
+        # else wait for one to be free
+        with self.lock:
+            new = self.idle[index].empty() and self.made[index] < self.workers
+            if new:
+                self.made[index] += 1
+        if new:
+            server = EVE_SERVER(self.infos[index], workers=4, index_ttl=self.index_ttl)
+            self.sessions.append(server)
+        else:
+            server = self.idle[index].get()
+        try:
+            yield server
+        finally:
+            self.idle[index].put(server)
+
+    def _call(self, index, function):
+        # run function(session) with its prints kept, returns (ok, result, error, log, seconds)
+        start = time.perf_counter()
+        output = io.StringIO()
+        sys.stdout.local.buffer = output
+        try:
+            with self.session(index) as server:
+                result, ok, error = function(server), True, ""
+        except SystemExit:
+            lines = output.getvalue().splitlines()
+            result, ok, error = None, False, lines[-1] if lines else "operation failed"
+        except Exception as e:
+            result, ok, error = None, False, str(e) or type(e).__name__
+        finally:
+            sys.stdout.local.buffer = None
+        return ok, result, error, output.getvalue().splitlines(), time.perf_counter() - start
+
+    def discover(self, names=(), folders=(), tenants=()):
+        # labs of every server that match the selectors, servers are asked at the same time.
+        # returns the targets (info index, lab) and a row for every server that failed
+        def labs(server):
+            eve_http = server.http()
+            if not eve_http.lab_index.is_fresh():
+                eve_http.get_lab_lists()
+            return str(eve_http.user_id), eve_http.lab_index.lab_list()
+
+        targets = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.infos)) or 1) as pool:
+            results = list(pool.map(lambda index: self._call(index, labs), range(len(self.infos))))
+        for index, (ok, result, error, _log, seconds) in enumerate(results):
+            info = self.infos[index]
+            if not ok:
+                failed.append({"server": info.name, "tenant": info.http_user, "lab": "", "ok": False,
+                               "time": round(seconds, 3), "result": "", "error": error})
+                continue
+            tenant, lab_list = result
+            if tenants and tenant not in tenants:
+                continue
+            targets.extend((index, tenant, lab) for lab in lab_list if lab_selected(lab, names, folders))
+        return targets, failed
+
+    def run(self, targets, request) -> list:
+        # run the request on every target, the targets of the servers are interleaved
+        # so that a busy server does not hold all the workers
+        by_server = {}
+        for target in targets:
+            by_server.setdefault(target[0], []).append(target)
+        order = []
+        while any(by_server.values()):
+            for items in by_server.values():
+                if items:
+                    order.append(items.pop(0))
+
+        def run_target(target):
+            index, tenant, lab = target
+            ok, result, error, log, seconds = self._call(index, lambda server: server.run({**request, "lab": lab["id"]}))
+            return {"server": self.infos[index].name, "tenant": tenant, "lab": lab["path"], "ok": ok,
+                    "time": round(seconds, 3), "result": result, "error": error, "log": log}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run_target, order))
+
+    def close(self):
+        for server in self.sessions:
+            if server.eve_ssh:
+                server.eve_ssh.client.close()
+            if server.eve_http:
+                server.eve_http.session.close()
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import bisect
+import hashlib
+import threading
+
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "eve-hot-connection")
+
+
+def listing_signature(*items) -> str:
+    # hash of a folder listing or of one lab entry, used to detect changes
+    data = json.dumps(items, sort_keys=True).encode()
+    return hashlib.sha1(data).hexdigest()
+
+
+class LAB_INDEX():
+    # local lab index for one eve-ng server and tenant.
+    # labs are kept by path and indexed by id, name and filename so that
+    # a lab can be resolved without walking the eve-ng folder tree.
+    def __init__(self, server, tenant, ttl=300, cache_dir=CACHE_DIR) -> None:
+        self.server = server
+        self.tenant = tenant
+        self.ttl = ttl
+        self.file = os.path.join(cache_dir, f"labs_{server}_{tenant}.json")
+        # lab path -> {"id", "name", "filename", "path"}
+        self.labs = {}
+        # folder path -> {"signature", "labs": {lab path: entry signature}}
+        self.folders = {}
+        self.updated = 0.0
+        # true once the index is refreshed from eve-ng in this run
+        self.refreshed = False
+        self._build_index()
+
+    def load(self) -> bool:
+        if self.ttl <= 0 or not os.path.exists(self.file):
+            return False
+        try:
+            with open(self.file) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        self.labs = data.get("labs", {})
+        self.folders = data.get("folders", {})
+        self.updated = data.get("updated", 0.0)
+        self._build_index()
+        return True
+
+    def save(self):
+        if self.ttl <= 0:
+            return
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        # sessions of a fleet run save the index of the same server from several threads
+        tmp_file = f"{self.file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump({"updated": self.updated, "labs": self.labs, "folders": self.folders}, file)
+        os.replace(tmp_file, self.file)
+
+    def is_fresh(self) -> bool:
+        return bool(self.labs) and time.time() - self.updated < self.ttl
+
+    def update(self, labs, folders):
+        # replace index content with a new folder walk result
+        self.labs = {lab["path"]: lab for lab in labs}
+        self.folders = folders
+        self.updated = time.time()
+        self.refreshed = True
+        self._build_index()
+        self.save()
+
+    def folder_labs(self, path, signature):
+        # return cached labs of a folder if its listing did not change
+        folder = self.folders.get(path)
+        if not folder or folder["signature"] != signature:
+            return None
+        labs = [self.labs.get(lab_path) for lab_path in folder["labs"]]
+        if None in labs:
+            return None
+        return labs
+
+    def cached_lab(self, folder_path, lab_path, entry_signature):
+        # return a cached lab if its entry in a changed folder listing is the same
+        folder = self.folders.get(folder_path)
+        if folder and folder["labs"].get(lab_path) == entry_signature:
+            return self.labs.get(lab_path)
+        return None
+
+    def lab_list(self) -> list:
+        return [self.labs[path] for path in sorted(self.labs)]
+
+    def _build_index(self):
+        self.by_id = {}
+        self.by_name = {}
+        for lab in self.labs.values():
+            self.by_id[lab["id"]] = lab
+            self.by_name.setdefault(lab["name"], []).append(lab)
+            if lab.get("filename") and lab["filename"] != lab["name"]:
+                self.by_name.setdefault(lab["filename"], []).append(lab)
+        self.sorted_ids = sorted(self.by_id)
+
+    def find(self, text) -> list:
+        # find labs by exact id, exact name or file name, then id prefix.
+        # a substring match on name or id is the last resort.
+        if lab := self.by_id.get(text):
+            return [lab]
+        if labs := self.by_name.get(text):
+            return labs
+        start = bisect.bisect_left(self.sorted_ids, text)
+        labs = []
+        for lab_id in self.sorted_ids[start:]:
+            if not lab_id.startswith(text):
+                break
+            labs.append(self.by_id[lab_id])
+        if labs:
+            return labs
+        return [lab for lab in self.labs.values() if text in lab["name"] or text in lab["id"]]
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+from .lab_index import CACHE_DIR
+from .trace import TRACE
+from .topology import as_list
+
+
+NODE_RE = re.compile(rb"<node\b[^>]*?(?:/>|>.*?</node>)", re.S)
+NODE_ID_RE = re.compile(rb"""\bid=["'](\d+)["']""")
+NETWORKS_RE = re.compile(rb"<networks\b[^>]*?(?:/>|>.*?</networks>)", re.S)
+INTERFACE_RE = re.compile(rb"<interface\b[^>]*>")
+ATTRIBUTE_RE = re.compile(rb"""\b(id|name|network_id)=["']([^"']*)["']""")
+
+
+class LAB_FILE():
+    # editor for eve-ng .unl lab files that works on byte spans.
+    # only the <networks> element and the <node> elements that are changed get
+    # parsed and written again, everything else (startup configs, text objects,
+    # formatting) is copied as it is.
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        start = data.find(b"<topology")
+        end = data.find(b"</topology>", start)
+        if start < 0 or end < 0:
+            raise ValueError("lab file has no <topology> element")
+        self.topology_end = end
+        nodes_start = data.find(b"<nodes", start, end)
+        # node id -> (start, end) of its <node> element
+        self.node_spans = {}
+        for match in NODE_RE.finditer(data, nodes_start if nodes_start >= 0 else start, end):
+            start_tag = match.group()[:match.group().find(b">") + 1]
+            if node_id := NODE_ID_RE.search(start_tag):
+                self.node_spans[node_id.group(1).decode()] = match.span()
+        match = NETWORKS_RE.search(data, start, end)
+        self.networks_span = match.span() if match else None
+        self.indent = self._indent_unit(start, nodes_start)
+        # parsed elements, changed elements are written back by tobytes
+        self._nodes = {}
+        self._networks = None
+        self._parsed = {}
+
+    def _line_prefix(self, position) -> bytes:
+        # white space in front of an element on its line
+        line_start = self.data.rfind(b"\n", 0, position) + 1
+        prefix = self.data[line_start:position]
+        return prefix if not prefix.strip() else b""
+
+    def _indent_unit(self, topology_start, nodes_start) -> bytes:
+        if nodes_start >= 0:
+            unit = self._line_prefix(nodes_start)[len(self._line_prefix(topology_start)):]
+            if unit:
+                return unit
+        return b"  "
+
+    def node(self, node_id):
+        # parsed <node> element of one node, or None if the node is not in the lab file
+        node_id = str(node_id)
+        if node_id not in self._nodes:
+            if node_id not in self.node_spans:
+                return None
+            start, end = self.node_spans[node_id]
+            import xmltodict
+            with TRACE.span(f"parse node {node_id}", "xml", bytes=end - start):
+                self._nodes[node_id] = xmltodict.parse(self.data[start:end])["node"]
+            self._parsed[("node", node_id)] = json.dumps(self._nodes[node_id])
+        return self._nodes[node_id]
+
+    def nodes_on_network(self, network_id) -> list:
+        # ids of nodes with an interface on a network, found without parsing other nodes
+        pattern = re.compile(rb"""\bnetwork_id=["']%d["']""" % int(network_id))
+        result = []
+        for node_id, (start, end) in self.node_spans.items():
+            if node_id in self._nodes:
+                interfaces = as_list(self._nodes[node_id].get("interface"))
+                if any(int(x["@network_id"]) == int(network_id) for x in interfaces):
+                    result.append(node_id)
+            elif pattern.search(self.data, start, end):
+                result.append(node_id)
+        return result
+
+    def interfaces(self, names=False) -> list:
+        # (node id, interface id, network id) of every connected interface in the lab,
+        # with names (node id, interface id, interface name, network id).
+        # nodes that are not parsed yet are scanned without parsing them
+        result = []
+        for node_id, (start, end) in self.node_spans.items():
+            if node_id in self._nodes:
+                for x in as_list(self._nodes[node_id].get("interface")):
+                    result.append((node_id, x["@id"], x.get("@name", ""), x["@network_id"]) if names
+                                  else (node_id, x["@id"], x["@network_id"]))
+                continue
+            for match in INTERFACE_RE.finditer(self.data, start, end):
+                attributes = {name.decode(): value.decode() for name, value in ATTRIBUTE_RE.findall(match.group())}
+                if "id" in attributes and "network_id" in attributes:
+                    result.append((node_id, attributes["id"], attributes.get("name", ""), attributes["network_id"])
+                                  if names else (node_id, attributes["id"], attributes["network_id"]))
+        return result
+
+    @property
+    def networks(self) -> dict:
+        # parsed content of <networks>, created empty if the lab has no networks
+        if self._networks is None:
+            if self.networks_span:
+                start, end = self.networks_span
+                import xmltodict
+                with TRACE.span("parse networks", "xml", bytes=end - start):
+                    self._networks = xmltodict.parse(self.data[start:end])["networks"] or {}
+            else:
+                self._networks = {}
+            self._parsed["networks"] = json.dumps(self._networks)
+        return self._networks
+
+    def network_ids(self) -> list:
+        networks = as_list(self.networks.get("network"))
+        return [int(network["@id"]) for network in networks]
+
+    def changed(self) -> bool:
+        # true when a parsed element was changed and tobytes has something to write
+        for node_id, element in self._nodes.items():
+            if json.dumps(element) != self._parsed[("node", node_id)]:
+                return True
+        return self._networks is not None and json.dumps(self._networks) != self._parsed["networks"]
+
+    def _render(self, name, element, prefix) -> bytes:
+        import xmltodict
+        with TRACE.span(f"render {name}", "xml"):
+            text = xmltodict.unparse({name: element or None}, full_document=False,
+                                     pretty=True, indent=self.indent.decode(), short_empty_elements=True)
+        return text.encode().replace(b"\n", b"\n" + prefix)
+
+    def tobytes(self) -> bytes:
+        # splice changed elements into the original bytes
+        patches = []
+        for node_id, element in self._nodes.items():
+            if json.dumps(element) == self._parsed[("node", node_id)]:
+                continue
+            start, end = self.node_spans[node_id]
+            patches.append((start, end, self._render("node", element, self._line_prefix(start))))
+        if self._networks is not None and json.dumps(self._networks) != self._parsed["networks"]:
+            if self.networks_span:
+                start, end = self.networks_span
+                patches.append((start, end, self._render("networks", self._networks, self._line_prefix(start))))
+            else:
+                prefix = self._line_prefix(self.topology_end) + self.indent
+                text = self._render("networks", self._networks, prefix)
+                patches.append((self.topology_end, self.topology_end, self.indent + text + b"\n" + self._line_prefix(self.topology_end)))
+        patches.sort()
+        # memoryview slices avoid a copy of the untouched parts before the join
+        data = memoryview(self.data)
+        result = []
+        position = 0
+        for start, end, text in patches:
+            result.append(data[position:start])
+            result.append(text)
+            position = end
+        result.append(data[position:])
+        return b"".join(result)
+
+
+class LAB_FILE_CACHE():
+    # local copy of lab files keyed by server and path, valid while the remote
+    # size and mtime are the same as when the copy was taken
+    def __init__(self, server, cache_dir=os.path.join(CACHE_DIR, "labfiles")) -> None:
+        self.server = server
+        self.cache_dir = cache_dir
+
+    def _file(self, path) -> str:
+        name = hashlib.sha1(f"{self.server}:{path}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, path, size, mtime):
+        # (cached bytes, settled), or (None, False) when the remote file changed.
+        # sftp mtime has a resolution of one second, the file may change again in the
+        # second of its mtime without a new size or mtime. a copy is settled once the
+        # server clock was seen past that second with the same content, until then
+        # the caller checks it against the hash on the server.
+        try:
+            with open(self._file(path) + ".json") as file:
+                meta = json.load(file)
+            if meta["size"] != size or meta["mtime"] != mtime:
+                return None, False
+            with open(self._file(path), "rb") as file:
+                data = file.read()
+        except (OSError, ValueError, KeyError):
+            return None, False
+        return (data, bool(meta.get("settled"))) if len(data) == size else (None, False)
+
+    def put(self, path, data, size, mtime, settled=False):
+        # lab files carry the node configs, only the user can read the cache
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        os.chmod(self.cache_dir, 0o700)
+        # data None keeps the cached bytes and only writes their state
+        files = [(self._file(path) + ".json",
+                  json.dumps({"path": path, "size": size, "mtime": mtime, "settled": settled}).encode())]
+        if data is not None:
+            files.insert(0, (self._file(path), data))
+        for name, content in files:
+            tmp_file = f"{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, "wb") as file:
+                file.write(content)
+            os.replace(tmp_file, name)
@@ -0,0 +1,223 @@
+import sys
+
+from .util import as_list
+from .util import connect_node_to_network
+from .util import disconnect_node_interface
+from .util import direct_link_commands
+from .util import direct_unlink_commands
+from .util import EXIT_USAGE
+from .util import EXIT_NOT_FOUND
+from .util import EXIT_CONFLICT
+from .batch import LINK_BATCH
+from .trace import TRACE
+
+
+class LINK_MIGRATE(LINK_BATCH):
+    # move links between node ports without taking them down and up again:
+    # every link of a node (or of one interface) to another node, or the links of two ports swapped.
+    # the networks stay as they are, only the <interface> elements move from one node to the other,
+    # all of it in one lab file write. taps are moved from bridge to bridge in place, the new port is
+    # put in the bridge before the old one leaves it, and the kernel commands of every link run between
+    # two time stamps on the server so the cut-over time of every link is measured where it happens.
+    def parse_port(self, end_point):
+        # node or node:interface
+        if end_point.startswith("net:"):
+            print(f"[    Error ] ==> {end_point} is a network, links are moved between node ports")
+            sys.exit(EXIT_USAGE)
+        if ":" not in end_point:
+            return end_point, None
+        return tuple(end_point.rsplit(":", 1))
+
+    def resolve(self, migrations, swaps):
+        # migrations are (from, to) of nodes or node:interface, swaps are (a, b) of node:interface.
+        # self.requests gets (action, node a, interface a, node b, interface b), interfaces are None
+        # when all links of node a move to the interfaces with the same id on node b
+        parsed = []
+        for action, items in [("migrate", migrations), ("swap", swaps)]:
+            for item in items:
+                (name_a, intf_a), (name_b, intf_b) = [self.parse_port(end_point) for end_point in item]
+                if (intf_a is None) != (intf_b is None) or (action == "swap" and intf_a is None):
+                    print(f"[    Error ] ==> {action} {item[0]} {item[1]} needs two nodes or two node:interface ports")
+                    sys.exit(EXIT_USAGE)
+                parsed.append((action, name_a, intf_a, name_b, intf_b))
+        nodes = {name: self.find_node(name) for request in parsed for name in (request[1], request[3])}
+        self.eve_http.get_interfaces(sorted(set(nodes.values()), key=lambda node: int(node.id)))
+
+        self.requests = []
+        for action, name_a, intf_a, name_b, intf_b in parsed:
+            node_a, node_b = nodes[name_a], nodes[name_b]
+            if intf_a is None:
+                if node_a is node_b:
+                    print(f"[    Error ] ==> cannot migrate {node_a.name} to itself")
+                    sys.exit(EXIT_USAGE)
+                self.requests.append((action, node_a, None, node_b, None))
+                continue
+            self.requests.append((action, node_a, self.find_interface(node_a, intf_a),
+                                  node_b, self.find_interface(node_b, intf_b)))
+        return self.requests
+
+    def port_name(self, member):
+        node = self.topology.nodes[member[0]]
+        node_intf = node.interfaces.get(member[1]) if node.interfaces else None
+        return f"{node.name}:{node_intf.name if node_intf else member[1]}"
+
+    def plan_moves(self, ports):
+        # (action, [(from port, to port, network id)]) for every link that is moved, from the lab file.
+        # a node migrate is one change per network, a swap is one change for both ports
+        changes = []
+        for action, node_a, intf_a, node_b, intf_b in self.requests:
+            if action == "swap":
+                a, b = (node_a.id, intf_a.id), (node_b.id, intf_b.id)
+                if ports.get(a) == ports.get(b):
+                    print(f"[    Info  ] ==> {self.port_name(a)} and {self.port_name(b)} are on the same network, nothing to swap")
+                    continue
+                if moves := [(src, dst, ports[src]) for src, dst in [(a, b), (b, a)] if src in ports]:
+                    changes.append((action, moves))
+                continue
+            if intf_a is not None:
+                pairs = [(intf_a.id, intf_b.id)]
+                if (node_a.id, intf_a.id) not in ports:
+                    print(f"[    Error ] ==> Interface {intf_a.name} on device {node_a.name} is not connected.")
+                    sys.exit(EXIT_CONFLICT)
+            else:
+                pairs = sorted(((intf_id, intf_id) for node_id, intf_id in ports if node_id == node_a.id),
+                               key=lambda pair: int(pair[0]))
+                if not pairs:
+                    print(f"[    Info  ] ==> {node_a.name} has no connected interface")
+            by_network = {}
+            for src_id, dst_id in pairs:
+                if dst_id not in node_b.interfaces:
+                    print(f"[    Error ] ==> Interface {dst_id} of {self.port_name((node_a.id, src_id))} is not exist on {node_b.name}")
+                    sys.exit(EXIT_NOT_FOUND)
+                network_id = ports[(node_a.id, src_id)]
+                by_network.setdefault(network_id, []).append(((node_a.id, src_id), (node_b.id, dst_id), network_id))
+            changes.extend((action, moves) for moves in by_network.values())
+
+        # a port leaves and joins one network at most, and joins only when it is free or left
+        sources = set()
+        targets = set()
+        for _action, moves in changes:
+            for src, dst, _network_id in moves:
+                for member, used in [(src, sources), (dst, targets)]:
+                    if member in used:
+                        print(f"[    Error ] ==> Interface {self.port_name(member)} is used twice in the migration")
+                        sys.exit(EXIT_USAGE)
+                    used.add(member)
+        for dst in targets:
+            if dst in ports and dst not in sources:
+                print(f"[    Error ] ==> Interface {self.port_name(dst)} is connected already.")
+                sys.exit(EXIT_CONFLICT)
+        return changes
+
+    def apply(self, lab_file, linux_interfaces):
+        # move the interfaces in the lab file in memory, return the kernel steps of every change
+        # as a list of [(tool, commands)], and keep a row per moved link in self.results
+        tenant = self.eve_http.user_id
+        profiles = self.eve_ssh.bridge_profiles
+        self.results = []
+        # asked again when the lab file changed and the edit runs again, the last try changed it
+        self.ingress = None
+        masters = {intf["ifname"]: intf.get("master") for intf in linux_interfaces}
+        networks = {str(network["@id"]): network for network in as_list(lab_file.networks.get("network"))}
+        ports = {}
+        members = {}
+        for node_id, intf_id, network_id in lab_file.interfaces():
+            ports[(node_id, intf_id)] = network_id
+            members.setdefault(network_id, []).append((node_id, intf_id))
+        changes = self.plan_moves(ports)
+
+        # lab file: every port leaves its network first, so two ports can swap
+        for _action, moves in changes:
+            for src, _dst, _network_id in moves:
+                disconnect_node_interface(lab_file, *src)
+        for _action, moves in changes:
+            for _src, dst, network_id in moves:
+                node = self.topology.nodes[dst[0]]
+                connect_node_to_network(lab_file, node, node.interfaces[dst[1]], network_id)
+
+        def bridge(network_id):
+            if networks[network_id]["@type"] == "bridge":
+                return f"vnet{tenant}_{network_id}"
+            return networks[network_id]["@type"]
+
+        def tap(member):
+            return f"vunl{tenant}_{member[0]}_{member[1]}"
+
+        # the kernel: taps of running nodes exist, their bridge (or tc cross connect) follows the lab file
+        units = []
+        for action, moves in changes:
+            attach = []
+            tc_commands = []
+            attached = set()
+            left = []
+            for network_id in dict.fromkeys(network_id for _src, _dst, network_id in moves):
+                bridge_name = bridge(network_id)
+                hidden = str(networks[network_id].get("@visibility", "0")) == "0"
+                moved = [(src, dst) for src, dst, item in moves if item == network_id]
+                sources = [src for src, _dst in moved]
+                before = [tap(member) for member in members[network_id]]
+                members[network_id] = [member for member in members[network_id] if member not in sources]
+                members[network_id] += [dst for _src, dst in moved]
+                running = [tap(member) for member in members[network_id] if tap(member) in masters]
+                if hidden and bridge_name not in masters and (direct := self.direct_taps(before, masters)):
+                    # a direct link: the cross connect is made again between the new pair of taps
+                    tc_commands.extend(direct_unlink_commands(direct))
+                    self.ingress.difference_update(direct)
+                    if len(running) == 2:
+                        tc_commands.extend(direct_link_commands(*running))
+                        self.ingress.update(running)
+                        continue
+                    new = running
+                else:
+                    new = [tap(dst) for _src, dst in moved if tap(dst) in masters]
+                for name in new:
+                    if bridge_name not in masters:
+                        attach.extend(profiles.create_commands(bridge_name, hidden))
+                        masters[bridge_name] = None
+                    attach.extend(profiles.attach_commands(name, bridge_name, hidden))
+                    masters[name] = bridge_name
+                    attached.add(name)
+                left.extend(tap(src) for src in sources if masters.get(tap(src)) == bridge_name)
+            # old taps leave their bridge after the new ones are in, a tap that went to
+            # another bridge in this change (a swap) left the old one with the attach
+            detach = []
+            for name in left:
+                if name not in attached:
+                    detach.append(f"ip link set dev {name} nomaster")
+                    masters[name] = None
+            units.append([(tool, commands) for tool, commands in [("ip", attach + detach), ("tc", tc_commands)]
+                          if commands])
+            for src, dst, network_id in moves:
+                self.results.append({"action": action, "from": self.port_name(src), "to": self.port_name(dst),
+                                     "network": network_id, "bridge": bridge(network_id), "cut-over ms": "",
+                                     "unit": len(units) - 1})
+        return units
+
+    def run(self, migrations, swaps, dry_run=False):
+        TRACE.phase("resolve")
+        self.resolve(migrations, swaps)
+        TRACE.phase("linux interfaces")
+        linux_interfaces = self.eve_ssh.get_linux_interfaces()
+        TRACE.phase("update lab file")
+        if dry_run:
+            units = self.apply(self.eve_ssh.get_lab_file(self.eve_http.lab), linux_interfaces)
+        else:
+            units = self.eve_ssh.edit_lab_file(self.eve_http.lab, lambda lab_file: self.apply(lab_file, linux_interfaces))
+        if not self.results:
+            print("[    Info  ] ==> there is no link to move")
+            return self.results
+        commands = [command for steps in units for _tool, items in steps for command in items]
+        print(f"[    Info  ] ==> Moved {len(self.results)} links in the lab file, {len(commands)} kernel commands")
+        TRACE.phase("cut-over")
+        if dry_run:
+            for command in commands:
+                print(f"[    Info  ] ==> would run: {command}")
+            timings = [None] * len(units)
+        else:
+            timings = self.eve_ssh.run_timed(units)
+        for row in self.results:
+            seconds = timings[row.pop("unit")]
+            row["cut-over ms"] = f"{seconds * 1000:.2f}" if seconds is not None else ""
+        if measured := [seconds for seconds in timings if seconds is not None]:
+            print(f"[    Info  ] ==> Cut-over of {len(measured)} changes, longest {max(measured) * 1000:.2f} ms")
+        return self.results
@@ -0,0 +1,100 @@
+import os
+import json
+
+
+# settings of the linux bridges made for lab networks and of the taps put in them.
+# forward_delay and ageing_time are in centiseconds like "ip link ... type bridge" takes them.
+# port_group_fwd_mask is set on the taps, the kernel allows lacp (bit 2) only there.
+
+BRIDGE_OPTIONS = ["stp_state", "forward_delay", "ageing_time", "mcast_snooping", "group_fwd_mask"]
+
+BUILTIN_PROFILES = {
+    # what the scripts always did: kernel defaults apart from the mtu
+    "default": {"mtu": 9000},
+    # a wire between two nodes: no stp and no forward delay, multicast flooded, short fdb ageing
+    "fast": {"mtu": 9000, "stp_state": 0, "forward_delay": 0, "ageing_time": 3000, "mcast_snooping": 0,
+             "txqueuelen": 10000},
+    # fast and link local control frames passed too: 802.1x and lldp by the bridge, lacp by the taps
+    "transparent": {"mtu": 9000, "stp_state": 0, "forward_delay": 0, "ageing_time": 3000, "mcast_snooping": 0,
+                    "group_fwd_mask": "0x4008", "port_group_fwd_mask": "0x4", "txqueuelen": 10000},
+}
+
+# values a bridge has when a profile does not set them, used when a profile is applied again
+KERNEL_DEFAULTS = {"mtu": 1500, "stp_state": 0, "forward_delay": 1500, "ageing_time": 30000, "mcast_snooping": 1,
+                   "group_fwd_mask": "0", "port_group_fwd_mask": "0"}
+
+
+class BRIDGE_PROFILES():
+    # bridge profiles by name: the built in ones and those of the json file in bridge_profiles_file.
+    # the profile is the one given for the run (--bridge-profile), else the one for the kind of
+    # network from .env: bridge_profile_p2p for hidden (point to point) networks and
+    # bridge_profile_network for visible ones, both fall back to bridge_profile and then to default.
+    def __init__(self, run_profile=None) -> None:
+        self.profiles = dict(BUILTIN_PROFILES)
+        if path := os.environ.get("bridge_profiles_file"):
+            with open(os.path.expanduser(path)) as file:
+                self.profiles.update(json.load(file))
+        self.run_profile = run_profile
+        default = os.environ.get("bridge_profile") or "default"
+        self.by_kind = {True: os.environ.get("bridge_profile_p2p") or default,
+                        False: os.environ.get("bridge_profile_network") or default}
+
+    def unknown(self) -> list:
+        # profile names that are asked for but not defined
+        names = {self.run_profile, *self.by_kind.values()} - {None}
+        return sorted(name for name in names if name not in self.profiles)
+
+    def select(self, hidden=True) -> str:
+        return self.run_profile or self.by_kind[hidden]
+
+    def profile(self, hidden=True) -> dict:
+        return self.profiles[self.select(hidden)]
+
+    def create_commands(self, bridge_name, hidden=True) -> list:
+        # new bridge with the settings of the profile, the kernel defaults apply for the rest
+        profile = self.profile(hidden)
+        options = "".join(f" {key} {profile[key]}" for key in BRIDGE_OPTIONS if key in profile)
+        mtu = f" mtu {profile['mtu']}" if "mtu" in profile else ""
+        return [f"ip link add {bridge_name}{mtu} type bridge{options}",
+                f"ip link set {bridge_name} up"]
+
+    def attach_commands(self, tap, bridge_name, hidden=True) -> list:
+        # tap into its bridge with the tap settings of the profile
+        profile = self.profile(hidden)
+        txqueuelen = f" txqueuelen {profile['txqueuelen']}" if "txqueuelen" in profile else ""
+        commands = [f"ip link set {tap} master {bridge_name}{txqueuelen}"]
+        if "port_group_fwd_mask" in profile:
+            commands.append(f"ip link set dev {tap} type bridge_slave group_fwd_mask {profile['port_group_fwd_mask']}")
+        return commands
+
+    def apply_commands(self, bridge_name, taps, hidden=True) -> list:
+        # settings of the profile for a bridge that exists and its taps,
+        # what the profile does not set goes back to the kernel default
+        profile = {**KERNEL_DEFAULTS, **self.profile(hidden)}
+        options = "".join(f" {key} {profile[key]}" for key in BRIDGE_OPTIONS)
+        commands = [f"ip link set {bridge_name} mtu {profile['mtu']} type bridge{options}"]
+        for tap in taps:
+            if "txqueuelen" in profile:
+                commands.append(f"ip link set dev {tap} txqueuelen {profile['txqueuelen']}")
+            commands.append(f"ip link set dev {tap} type bridge_slave group_fwd_mask {profile['port_group_fwd_mask']}")
+        return commands
+
+    def lab_commands(self, topology, linux_interfaces):
+        # apply commands for every vnet bridge of a lab that exists on the host, and a row per bridge.
+        # direct links and networks of stopped nodes have no bridge and are left out
+        ifnames = {intf["ifname"] for intf in linux_interfaces}
+        ports = {}
+        for intf in linux_interfaces:
+            if intf.get("master"):
+                ports.setdefault(intf["master"], []).append(intf["ifname"])
+        rows = []
+        commands = []
+        for network in topology.networks.values():
+            bridge_name = network.bridge_name(topology.tenant)
+            if network.type != "bridge" or bridge_name not in ifnames:
+                continue
+            taps = sorted(ports.get(bridge_name, []))
+            commands.extend(self.apply_commands(bridge_name, taps, network.hidden))
+            rows.append({"network": network.id, "name": network.name, "bridge": bridge_name,
+                         "profile": self.select(network.hidden), "taps": str(len(taps))})
+        return rows, commands
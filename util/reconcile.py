@@ -0,0 +1,198 @@
+import sys
+
+from .util import as_list
+from .util import create_network
+from .util import connect_node_to_network
+from .util import disconnect_node_interface
+from .util import remove_network
+from .util import direct_unlink_commands
+from .util import EXIT_USAGE
+from .batch import LINK_BATCH
+from .trace import TRACE
+from .topology import NETWORK_IDS
+
+
+class LINK_RECONCILE(LINK_BATCH):
+    # bring the links of a lab in line with a list of desired links.
+    # the lab file (read under the lab lock) and the kernel bridge membership are
+    # compared with the desired links and only the difference is applied:
+    # one lab file write and one kernel command batch, nothing when there is no difference.
+    # node to node links are hidden bridge networks with two interfaces,
+    # node to network links are interfaces on a visible network.
+    def resolve(self, links):
+        # desired links -> self.p2p {frozenset of two (node id, intf id)} and self.on_network {(node id, intf id): network id}
+        self.parsed = []
+        for link in links:
+            if link.get("action", "add") != "add":
+                print(f"[    Error ] ==> desired links cannot have a {link['action']} action")
+                sys.exit(EXIT_USAGE)
+            if not link.get("b"):
+                print(f"[    Error ] ==> link {link['a']} has no end point b")
+                sys.exit(EXIT_USAGE)
+            self.parsed.append((link, [self.parse_end_point(link["a"]), self.parse_end_point(link["b"])]))
+        self.load_interfaces()
+
+        self.p2p = {}
+        self.on_network = {}
+        self.members = {}
+        for link, ends in self.parsed:
+            resolved = []
+            for kind, name, intf in ends:
+                if kind == "net":
+                    resolved.append(("net", self.find_network(name)))
+                    continue
+                node = self.find_node(name)
+                node_intf = self.find_interface(node, intf)
+                member = (node.id, node_intf.id)
+                if member in self.members:
+                    print(f"[    Error ] ==> Interface {node_intf.name} on {node.name} is used twice in the desired links")
+                    sys.exit(EXIT_USAGE)
+                self.members[member] = (node, node_intf)
+                resolved.append(("node", node, node_intf))
+            if resolved[0][0] == "net" and resolved[1][0] == "net":
+                print("[    Error ] ==> cannot connect Bridge to Bridge")
+                sys.exit(EXIT_USAGE)
+            if resolved[0][0] == "node" and resolved[1][0] == "node":
+                key = frozenset((end[1].id, end[2].id) for end in resolved)
+                self.p2p[key] = link
+            else:
+                net, end = (resolved[0], resolved[1]) if resolved[0][0] == "net" else (resolved[1], resolved[0])
+                self.on_network[(end[1].id, end[2].id)] = net[1].id
+        return self.p2p, self.on_network
+
+    def apply(self, lab_file, linux_interfaces):
+        # change the lab file in memory, return the kernel commands and keep the changes in self.results
+        tenant = self.eve_http.user_id
+        profiles = self.eve_ssh.bridge_profiles
+        self.results = []
+        self.tc_commands = []
+        commands = []
+        masters = {intf["ifname"]: intf.get("master") for intf in linux_interfaces}
+        networks = {str(network["@id"]): network for network in as_list(lab_file.networks.get("network"))}
+        members = {}
+        for node_id, intf_id, network_id in lab_file.interfaces():
+            members.setdefault(network_id, []).append((node_id, intf_id))
+
+        def bridge(network_id):
+            if networks[network_id]["@type"] == "bridge":
+                return f"vnet{tenant}_{network_id}"
+            return networks[network_id]["@type"]
+
+        def tap(member):
+            return f"vunl{tenant}_{member[0]}_{member[1]}"
+
+        def names(items):
+            return " ".join(self.interface_name(node_id, intf_id) for node_id, intf_id in sorted(items))
+
+        def attach(member, network_id, repair=False):
+            # tap of a running node into its bridge, the bridge is created when it is missing.
+            # repair is a link that is in the lab file but not in the kernel,
+            # a point to point link cross connected with tc mirred is in the kernel without a bridge
+            bridge_name = bridge(network_id)
+            if tap(member) not in masters or masters[tap(member)] == bridge_name:
+                return
+            hidden = str(networks[network_id].get("@visibility", "0")) == "0"
+            if repair and hidden and self.direct_taps([tap(member)], masters):
+                return
+            if repair:
+                self.results.append({"action": "repair", "network": network_id,
+                                     "bridge": bridge_name, "interfaces": names([member])})
+            if bridge_name not in masters:
+                commands.extend(profiles.create_commands(bridge_name, hidden))
+                masters[bridge_name] = None
+            commands.extend(profiles.attach_commands(tap(member), bridge_name, hidden))
+            masters[tap(member)] = bridge_name
+
+        # drop what is not desired, keep what is
+        p2p_done = set()
+        network_done = set()
+        for network_id, network in list(networks.items()):
+            items = members.get(network_id, [])
+            if str(network.get("@visibility", "0")) == "0":
+                if frozenset(items) in self.p2p and len(items) == 2:
+                    p2p_done.add(frozenset(items))
+                    for member in items:
+                        attach(member, network_id, repair=True)
+                    continue
+                name = bridge(network_id)
+                remove_network(lab_file, network_id)
+                direct = self.direct_taps([tap(member) for member in items], masters)
+                self.tc_commands.extend(direct_unlink_commands(direct))
+                if name in masters:
+                    commands.append(f"ip link del {name}")
+                    masters.pop(name)
+                self.results.append({"action": "delete", "network": network_id, "bridge": name,
+                                     "interfaces": names(items)})
+                networks.pop(network_id)
+                continue
+            for member in items:
+                if self.on_network.get(member) == network_id:
+                    network_done.add(member)
+                    attach(member, network_id, repair=True)
+                    continue
+                disconnect_node_interface(lab_file, member[0], member[1])
+                if masters.get(tap(member)) == bridge(network_id):
+                    commands.append(f"ip link set dev {tap(member)} nomaster")
+                    masters[tap(member)] = None
+                self.results.append({"action": "detach", "network": network_id, "bridge": bridge(network_id),
+                                     "interfaces": names([member])})
+
+        # create what is missing
+        missing = [key for key in self.p2p if key not in p2p_done]
+        network_ids = NETWORK_IDS(lab_file.network_ids())
+        for key in sorted(missing, key=sorted):
+            network_id = str(network_ids.allocate())
+            (node_a, intf_a), (node_b, intf_b) = [self.members[member] for member in sorted(key)]
+            create_network(lab_file, network_id, f'Net-{node_a.name}iface_{intf_a.id}')
+            networks[network_id] = {"@id": network_id, "@type": "bridge", "@visibility": "0"}
+            for node, node_intf in [(node_a, intf_a), (node_b, intf_b)]:
+                connect_node_to_network(lab_file, node, node_intf, network_id)
+                attach((node.id, node_intf.id), network_id)
+            self.results.append({"action": "create", "network": network_id, "bridge": bridge(network_id),
+                                 "interfaces": names(key)})
+        for member, network_id in sorted(self.on_network.items()):
+            if member in network_done:
+                continue
+            if network_id not in networks:
+                print(f"[    Error ] ==> Network {network_id} is not in the lab file")
+                sys.exit(EXIT_USAGE)
+            node, node_intf = self.members[member]
+            connect_node_to_network(lab_file, node, node_intf, network_id)
+            attach(member, network_id)
+            self.results.append({"action": "attach", "network": network_id, "bridge": bridge(network_id),
+                                 "interfaces": names([member])})
+        return commands
+
+    def interface_name(self, node_id, intf_id):
+        # node:interface by name when the node is known, ids for nodes that are not in the desired links
+        if (node_id, intf_id) in self.members:
+            node, node_intf = self.members[(node_id, intf_id)]
+            return f"{node.name}:{node_intf.name}"
+        if node := self.topology.nodes.get(node_id):
+            return f"{node.name}:{intf_id}"
+        return f"{node_id}:{intf_id}"
+
+    def run(self, links, dry_run=False):
+        TRACE.phase("resolve")
+        self.resolve(links)
+        print(f"[    Info  ] ==> Resolved {len(self.p2p)} links and {len(self.on_network)} network interfaces")
+        TRACE.phase("linux interfaces")
+        linux_interfaces = self.eve_ssh.get_linux_interfaces()
+        TRACE.phase("update lab file")
+        if dry_run:
+            commands = self.apply(self.eve_ssh.get_lab_file(self.eve_http.lab), linux_interfaces)
+        else:
+            commands = self.eve_ssh.edit_lab_file(self.eve_http.lab,
+                                                  lambda lab_file: self.apply(lab_file, linux_interfaces))
+        self.commands = commands + self.tc_commands
+        if not self.results and not self.commands:
+            print("[    Info  ] ==> lab is in line with the desired links, nothing to do")
+            return self.results
+        print(f"[    Info  ] ==> {len(self.results)} changes and {len(self.commands)} kernel commands")
+        TRACE.phase("kernel commands")
+        if dry_run:
+            for command in self.commands:
+                print(f"[    Info  ] ==> would run: {command}")
+        else:
+            self.eve_ssh.run_steps([("ip", commands), ("tc", self.tc_commands)])
+        return self.results
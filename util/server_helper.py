@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import subprocess
+from xml.sax.saxutils import escape
+
+
+# runs on the eve-ng server: one link change from a json plan on stdin, the lab file is
+# edited in place on the server and the bridges and taps programmed there, the result is
+# one json line on stdout. it is uploaded by EVE_SSH.run_helper and runs with the python3
+# of the eve-ng host, so it keeps to python 3.5 and the standard library.
+#
+# plan:
+#   path       lab file
+#   lock       lock file, the same flock as EVE_SSH.lock_lab, ~ is the home of the ssh user
+#   tenant     tenant of the vunl taps
+#   allocate   true to take the lowest free network id, "{network_id}" in edits and commands is set to it
+#   edits      [{"op": "check_free", "node", "interface", "error"},
+#               {"op": "create_network", "network": {"@id": .., ..}},
+#               {"op": "connect", "node", "interface": {"@id": .., "@network_id": .., ..}},
+#               {"op": "disconnect", "node", "interface"},
+#               {"op": "remove_network", "network"}]
+#   kernel     [{"tool": "ip" or "tc", "commands": [..], "if_missing": ifname, "if_present": ifname},
+#               {"tool": "tc", "unlink_direct": true}]   ingress qdiscs of the taps of removed networks
+
+NODE_RE = re.compile(rb"<node\b[^>]*?(?:/>|>.*?</node>)", re.S)
+NETWORK_RE = re.compile(rb"<network\b[^>]*?(?:/>|>.*?</network>)", re.S)
+INTERFACE_RE = re.compile(rb"<interface\b[^>]*?(?:/>|>.*?</interface>)", re.S)
+
+
+class HELPER_ERROR(Exception):
+    # code is conflict, not_found or lab_file, the client exits with the matching EXIT_ code
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def attribute(element, name):
+    match = re.search(rb"""\b%s=["']([^"']*)["']""" % name, element[:element.find(b">") + 1])
+    return match.group(1).decode() if match else None
+
+
+def render(tag, attributes):
+    # element like xmltodict writes it for the client side path
+    return ("<%s %s/>" % (tag, " ".join('%s="%s"' % (key.lstrip("@"), escape(str(value), {'"': "&quot;"}))
+                                        for key, value in attributes.items()))).encode()
+
+
+class LAB_TEXT():
+    # lab file as bytes, edits splice elements in and out and keep the rest as it is
+    def __init__(self, data):
+        self.data = data
+        self.changed = False
+
+    def line_prefix(self, position):
+        start = self.data.rfind(b"\n", 0, position) + 1
+        prefix = self.data[start:position]
+        return prefix if not prefix.strip() else b""
+
+    def indent(self):
+        topology = self.data.find(b"<topology")
+        nodes = self.data.find(b"<nodes", topology)
+        if topology >= 0 and nodes >= 0:
+            unit = self.line_prefix(nodes)[len(self.line_prefix(topology)):]
+            if unit:
+                return unit
+        return b"  "
+
+    def span(self, tag):
+        # (start, end) of the first <tag> element in <topology>
+        start = self.data.find(b"<topology")
+        end = self.data.find(b"</topology>", start)
+        if start < 0 or end < 0:
+            raise HELPER_ERROR("lab_file", "lab file has no <topology> element")
+        match = re.compile(rb"<%s\b[^>]*?(?:/>|>.*?</%s>)" % (tag, tag), re.S).search(self.data, start, end)
+        return match.span() if match else None
+
+    def node(self, node_id):
+        span = self.span(b"nodes")
+        if span:
+            for match in NODE_RE.finditer(self.data, *span):
+                if attribute(match.group(), b"id") == str(node_id):
+                    return match.span()
+        return None
+
+    def splice(self, start, end, text):
+        self.data = self.data[:start] + text + self.data[end:]
+        self.changed = True
+
+    def insert_child(self, span, tag, child, last_re):
+        # child after the last element that last_re finds in the element, else at its end
+        start, end = span
+        element = self.data[start:end]
+        prefix = self.line_prefix(start)
+        if element.endswith(b"/>"):
+            child_prefix = prefix + self.indent()
+            self.splice(start, end, element[:-2].rstrip() + b">\n" + child_prefix
+                        + child.replace(b"\n", b"\n" + child_prefix) + b"\n" + prefix + b"</" + tag + b">")
+            return
+        last = None
+        for last in last_re.finditer(self.data, start, end):
+            pass
+        if last:
+            child_prefix = self.line_prefix(last.start())
+            self.splice(last.end(), last.end(), b"\n" + child_prefix + child.replace(b"\n", b"\n" + child_prefix))
+            return
+        close = self.data.rfind(b"</" + tag, start, end)
+        child_prefix = prefix + self.indent()
+        if self.line_prefix(close) or self.data[close - 1:close] == b"\n":
+            line = self.data.rfind(b"\n", 0, close) + 1
+            self.splice(line, line, child_prefix + child.replace(b"\n", b"\n" + child_prefix) + b"\n")
+        else:
+            self.splice(close, close, child)
+
+    def remove(self, start, end):
+        # element and its line when it is alone on it
+        line = self.data.rfind(b"\n", 0, start) + 1
+        if not self.data[line:start].strip() and self.data[end:end + 1] == b"\n":
+            start, end = line, end + 1
+        self.splice(start, end, b"")
+
+    def interfaces(self):
+        # (node id, interface id, network id) of every connected interface
+        result = []
+        span = self.span(b"nodes")
+        if span:
+            for node in NODE_RE.finditer(self.data, *span):
+                node_id = attribute(node.group(), b"id")
+                for intf in INTERFACE_RE.finditer(node.group()):
+                    if attribute(intf.group(), b"network_id") is not None:
+                        result.append((node_id, attribute(intf.group(), b"id"), attribute(intf.group(), b"network_id")))
+        return result
+
+    def network_ids(self):
+        span = self.span(b"networks")
+        if not span:
+            return []
+        return [int(attribute(match.group(), b"id")) for match in NETWORK_RE.finditer(self.data, *span)]
+
+    def node_interface(self, node_id, intf_id):
+        span = self.node(node_id)
+        if not span:
+            return None
+        for match in INTERFACE_RE.finditer(self.data, *span):
+            if attribute(match.group(), b"id") == str(intf_id):
+                return match.span()
+        return None
+
+    def create_network(self, attributes):
+        child = render("network", attributes)
+        span = self.span(b"networks")
+        if span:
+            self.insert_child(span, b"networks", child, NETWORK_RE)
+            return
+        # no <networks> yet, it goes after <nodes>
+        topology = (self.data.find(b"<topology"), self.data.find(b"</topology>") + len(b"</topology>"))
+        self.insert_child(topology, b"topology", b"<networks>\n" + self.indent() + child + b"\n</networks>",
+                          re.compile(rb"<nodes\b[^>]*?(?:/>|>.*?</nodes>)", re.S))
+
+    def connect(self, node_id, attributes):
+        span = self.node(node_id)
+        if not span:
+            raise HELPER_ERROR("not_found", "Node %s is not in the lab file" % node_id)
+        self.insert_child(span, b"node", render("interface", attributes), INTERFACE_RE)
+
+    def disconnect(self, node_id, intf_id):
+        span = self.node_interface(node_id, intf_id)
+        if span:
+            self.remove(*span)
+
+    def remove_network(self, network_id):
+        # every interface on the network and the network, returns (node id, interface id) of the interfaces
+        members = [(node_id, intf_id) for node_id, intf_id, item in self.interfaces() if item == str(network_id)]
+        for node_id, intf_id in members:
+            self.disconnect(node_id, intf_id)
+        span = self.span(b"networks")
+        if span:
+            for match in NETWORK_RE.finditer(self.data, *span):
+                if attribute(match.group(), b"id") == str(network_id):
+                    self.remove(*match.span())
+                    break
+        return members
+
+
+def lowest_free(used):
+    used = set(used)
+    network_id = 1
+    while network_id in used:
+        network_id += 1
+    return network_id
+
+
+def fill(value, network_id):
+    # "{network_id}" in the strings of a plan part
+    if isinstance(value, str):
+        return value.replace("{network_id}", str(network_id))
+    if isinstance(value, list):
+        return [fill(item, network_id) for item in value]
+    if isinstance(value, dict):
+        return dict((key, fill(item, network_id)) for key, item in value.items())
+    return value
+
+
+def run_tool(command, data=None):
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, error = process.communicate(data.encode() if data is not None else None)
+    return process.returncode, output.decode(), error.decode()
+
+
+def lock(path, timeout):
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    file = open(path, "a")
+    end = time.time() + timeout
+    while True:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return file
+        except OSError:
+            if time.time() > end:
+                file.close()
+                raise HELPER_ERROR("lab_file", "could not lock lab file: timeout")
+            time.sleep(0.05)
+
+
+def edit_lab(plan, retries=5):
+    # edits under the lab lock, written with a rename. the file is read again when it changed
+    # while it was edited (eve-ng web ui), like EVE_SSH.edit_lab_file does
+    path = plan["path"]
+    lock_file = lock(plan["lock"], plan.get("timeout", 30))
+    try:
+        for _ in range(retries):
+            stat = os.stat(path)
+            with open(path, "rb") as file:
+                lab = LAB_TEXT(file.read())
+            result = {"network_id": "", "taps": []}
+            network_id = lowest_free(lab.network_ids()) if plan.get("allocate") else ""
+            result["network_id"] = str(network_id)
+            for edit in fill(plan.get("edits", []), network_id):
+                if edit["op"] == "check_free":
+                    if lab.node_interface(edit["node"], edit["interface"]):
+                        raise HELPER_ERROR("conflict", edit["error"])
+                elif edit["op"] == "create_network":
+                    lab.create_network(edit["network"])
+                elif edit["op"] == "connect":
+                    lab.connect(edit["node"], edit["interface"])
+                elif edit["op"] == "disconnect":
+                    lab.disconnect(edit["node"], edit["interface"])
+                elif edit["op"] == "remove_network":
+                    result["taps"].extend("vunl%s_%s_%s" % (plan["tenant"], node_id, intf_id)
+                                          for node_id, intf_id in lab.remove_network(edit["network"]))
+            if not lab.changed:
+                result["written"] = False
+                return result, network_id
+            tmp_path = "%s/.%s.%d.tmp" % (os.path.dirname(path), os.path.basename(path), os.getpid())
+            with open(tmp_path, "wb") as file:
+                file.write(lab.data)
+            os.chmod(tmp_path, stat.st_mode & 0o7777)
+            os.chown(tmp_path, stat.st_uid, stat.st_gid)
+            now = os.stat(path)
+            if (now.st_size, now.st_mtime) != (stat.st_size, stat.st_mtime):
+                os.remove(tmp_path)
+                continue
+            os.rename(tmp_path, path)
+            result["written"] = True
+            return result, network_id
+    finally:
+        lock_file.close()
+    raise HELPER_ERROR("lab_file", "lab file %s kept changing, giving up after %d tries" % (path, retries))
+
+
+def apply_plan(plan, run=run_tool):
+    result, network_id = edit_lab(plan)
+    steps = fill(plan.get("kernel", []), network_id)
+    ifnames = None
+    if any("if_missing" in step or "if_present" in step for step in steps):
+        ifnames = set(intf["ifname"] for intf in json.loads(run(["ip", "-json", "link"])[1] or "[]"))
+    result["kernel"] = []
+    for step in steps:
+        commands = step.get("commands", [])
+        if step.get("if_missing") and step["if_missing"] in ifnames:
+            continue
+        if step.get("if_present") and step["if_present"] not in ifnames:
+            continue
+        if step.get("unlink_direct"):
+            qdiscs = json.loads(run(["tc", "-json", "qdisc", "show"])[1] or "[]")
+            ingress = set(qdisc["dev"] for qdisc in qdiscs if qdisc.get("kind") == "ingress")
+            commands = ["tc qdisc del dev %s ingress" % tap for tap in result["taps"] if tap in ingress]
+        if not commands:
+            continue
+        tool = step["tool"]
+        lines = [command[len(tool) + 1:] if command.startswith(tool + " ") else command for command in commands]
+        exit_status, _output, error = run([tool, "-force", "-batch", "-"], "\n".join(lines) + "\n")
+        # the client reads the errors like EVE_SSH.run_batch does
+        result["kernel"].append({"tool": tool, "commands": commands, "exit status": exit_status, "error": error})
+    return result
+
+
+def handle(text, run=run_tool):
+    # json plan in, json result out
+    try:
+        result = apply_plan(json.loads(text), run)
+        result["ok"] = True
+    except HELPER_ERROR as e:
+        result = {"ok": False, "code": e.code, "error": str(e)}
+    except (OSError, ValueError, KeyError) as e:
+        result = {"ok": False, "code": "lab_file", "error": "%s: %s" % (type(e).__name__, e)}
+    return json.dumps(result) + "\n"
+
+
+def main():
+    sys.stdout.write(handle(sys.stdin.read()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import time
+import threading
+
+from .util import as_list
+from .trace import TRACE
+
+
+# counters of "ip -s -json link" (stats64) kept for every link port, rx and tx as the host sees them:
+# rx of a tap is what its node sends, tx of a tap is what its node gets
+COUNTERS = [("rx", "bytes"), ("rx", "packets"), ("rx", "dropped"), ("rx", "errors"),
+            ("tx", "bytes"), ("tx", "packets"), ("tx", "dropped"), ("tx", "errors")]
+
+
+def human(value) -> str:
+    # 1234567 -> 1.2M for the table
+    for unit in ["", "k", "M", "G", "T"]:
+        if abs(value) < 1000:
+            return f"{value:.0f}{unit}" if unit == "" else f"{value:.1f}{unit}"
+        value /= 1000
+    return f"{value:.1f}P"
+
+
+def label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LINK_STATS():
+    # traffic of the links of a lab: every network of the lab file with its bridge (vnet or the
+    # cloud bridge) and the taps of its interfaces. one "ip -s -json link" per sweep gives the
+    # counters of all of them, rates come from the difference of two sweeps.
+    def __init__(self, eve_http, eve_ssh) -> None:
+        self.eve_http = eve_http
+        self.eve_ssh = eve_ssh
+        self.ports = []
+        self.previous = None
+        self.current = None
+
+    def map_links(self, lab_file) -> list:
+        # one port per bridge and per tap, a direct link has taps and no bridge on the host
+        tenant = self.eve_http.user_id
+        topology = self.eve_http.topology
+        networks = {str(network["@id"]): network for network in as_list(lab_file.networks.get("network"))}
+        bridges = {}
+        self.ports = []
+        for network_id, network in networks.items():
+            bridge = f"vnet{tenant}_{network_id}" if network["@type"] == "bridge" else network["@type"]
+            bridges[network_id] = bridge
+            self.ports.append({"network": network_id, "network name": network.get("@name", ""), "bridge": bridge,
+                               "interface": bridge, "node": "", "port": ""})
+        for node_id, intf_id, intf_name, network_id in lab_file.interfaces(names=True):
+            if network_id not in networks:
+                continue
+            node = topology.nodes.get(node_id)
+            self.ports.append({"network": network_id, "network name": networks[network_id].get("@name", ""),
+                               "bridge": bridges[network_id],
+                               "interface": f"vunl{tenant}_{node_id}_{intf_id}",
+                               "node": node.name if node else node_id, "port": intf_name or intf_id})
+        return self.ports
+
+    def sweep(self):
+        # counters of every host interface, one ssh command for the whole lab
+        with TRACE.span("stats sweep", "stats") as span:
+            counters = {}
+            for intf in self.eve_ssh.get_link_stats():
+                stats = intf.get("stats64") or intf.get("stats") or {}
+                counters[intf["ifname"]] = {f"{way} {name}": stats.get(way, {}).get(name, 0) for way, name in COUNTERS}
+            span["interfaces"] = len(counters)
+        self.previous, self.current = self.current, (time.monotonic(), counters)
+        return self.current
+
+    def rows(self, top=0) -> list:
+        # a row per port that is on the host with counters and the rates since the sweep before,
+        # busiest ports first, then the ones with most drops and errors
+        now, counters = self.current
+        before, old = self.previous if self.previous else (now, {})
+        seconds = now - before
+        rows = []
+        for port in self.ports:
+            if port["interface"] not in counters:
+                continue
+            current = counters[port["interface"]]
+            last = old.get(port["interface"], current)
+
+            def rate(key):
+                return round(max(current[key] - last[key], 0) / seconds, 1) if seconds > 0 else 0.0
+
+            rows.append({**port,
+                         "rx bps": rate("rx bytes") * 8, "tx bps": rate("tx bytes") * 8,
+                         "rx pps": rate("rx packets"), "tx pps": rate("tx packets"),
+                         "rx dropped": current["rx dropped"], "tx dropped": current["tx dropped"],
+                         "errors": current["rx errors"] + current["tx errors"],
+                         "new drops": (current["rx dropped"] + current["tx dropped"]
+                                       - last["rx dropped"] - last["tx dropped"])})
+        rows.sort(key=lambda row: (row["rx bps"] + row["tx bps"], row["new drops"], row["errors"]), reverse=True)
+        return rows[:top] if top else rows
+
+    def table_rows(self, top=0) -> list:
+        # rows as text for the table
+        rows = []
+        for row in self.rows(top):
+            rows.append({key: human(value) if isinstance(value, float) else str(value) for key, value in row.items()
+                         if key not in ["network name", "bridge"]})
+        return rows
+
+    def prometheus(self) -> str:
+        # counters of the last sweep in the prometheus text format
+        lab = self.eve_http.lab["path"]
+        _, counters = self.current
+        lines = []
+        for way, name in COUNTERS:
+            metric = f"eve_link_{'receive' if way == 'rx' else 'transmit'}_{name}_total"
+            lines.append(f"# HELP {metric} {way} {name} of the bridges and taps of eve-ng links, as the host sees them")
+            lines.append(f"# TYPE {metric} counter")
+            for port in self.ports:
+                if port["interface"] not in counters:
+                    continue
+                labels = ",".join(f'{key.replace(" ", "_")}="{label_value(value)}"'
+                                  for key, value in [("lab", lab), *port.items()])
+                lines.append(f"{metric}{{{labels}}} {counters[port['interface']][f'{way} {name}']}")
+        return "\n".join(lines) + "\n"
+
+
+class METRICS_SERVER(threading.Thread):
+    # serves the text of the last sweep on http://<address>:<port>/metrics for prometheus
+    def __init__(self, port, address="") -> None:
+        super().__init__(daemon=True)
+        from http.server import BaseHTTPRequestHandler
+        from http.server import ThreadingHTTPServer
+        self.text = ""
+        server = self
+
+        class _HANDLER(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server.text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.http = ThreadingHTTPServer((address, port), _HANDLER)
+
+    def run(self):
+        self.http.serve_forever()
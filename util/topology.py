@@ -0,0 +1,161 @@
+# lab state shared by the scripts: nodes, interfaces and networks of one lab
+# with hash indexes by id and name.
+# the rest api gives the data, row() gives it back as a row for tables and json output.
+
+
+def as_list(item) -> list:
+    # xmltodict gives a dict for one child element and a list for many
+    if not item:
+        return []
+    return item if isinstance(item, list) else [item]
+
+
+def xml_interface(node_intf, network_id) -> dict:
+    # <interface> element of a lab file for an interface of the rest api
+    return {"@id": node_intf.id, "@name": node_intf.name, "@type": "ethernet", "@network_id": str(network_id)}
+
+
+def xml_network(network_id, name) -> dict:
+    # <network> element of a lab file for a new hidden (point to point) network
+    return {"@id": str(network_id), "@type": "bridge", "@name": name, "@left": "504", "@top": "289",
+            "@visibility": "0"}
+
+
+class NETWORK_IDS():
+    # used network ids of a lab, kept sorted. ids start at 1, so below the lowest
+    # free id every used id is at index id - 1 and the free id is found by binary search.
+    __slots__ = ("used",)
+
+    def __init__(self, used_ids=()) -> None:
+        self.used = sorted({int(item) for item in used_ids if int(item) > 0})
+
+    def lowest_free(self) -> int:
+        low, high = 0, len(self.used)
+        while low < high:
+            middle = (low + high) // 2
+            if self.used[middle] == middle + 1:
+                low = middle + 1
+            else:
+                high = middle
+        return low + 1
+
+    def allocate(self) -> int:
+        network_id = self.lowest_free()
+        self.used.insert(network_id - 1, network_id)
+        return network_id
+
+
+class LAB_INTERFACE():
+    __slots__ = ("node", "id", "name", "network_id", "linux_name")
+
+    def __init__(self, node, data, tenant) -> None:
+        self.node = node
+        self.id = str(data["id"])
+        self.name = data["name"]
+        self.network_id = str(data["network_id"])
+        # tap of the interface on the eve-ng host, it exists while the node runs
+        self.linux_name = f"vunl{tenant}_{node.id}_{self.id}"
+
+    @property
+    def connected(self) -> bool:
+        return self.network_id != "0"
+
+    def row(self) -> dict:
+        return {"id": self.id, "name": self.name, "network_id": self.network_id,
+                "connected": str(self.connected)}
+
+
+class LAB_NODE():
+    __slots__ = ("id", "name", "type", "status", "ethernet", "interfaces", "interfaces_by_name")
+
+    def __init__(self, data) -> None:
+        self.id = str(data["id"])
+        self.name = data["name"]
+        self.type = data.get("type", "")
+        self.status = data.get("status", "")
+        self.ethernet = str(data.get("ethernet", ""))
+        # interface id -> LAB_INTERFACE, None until the interfaces are loaded
+        self.interfaces = None
+        self.interfaces_by_name = {}
+
+    @property
+    def running(self) -> bool:
+        return self.status == "ON"
+
+
+class LAB_NETWORK():
+    __slots__ = ("id", "name", "type", "visibility", "count")
+
+    def __init__(self, network_id, data) -> None:
+        self.id = str(network_id)
+        self.name = data.get("name", "")
+        self.type = data.get("type", "bridge")
+        self.visibility = int(data.get("visibility", 0))
+        self.count = int(data.get("count", 0))
+
+    @property
+    def hidden(self) -> bool:
+        # hidden networks are the point to point links between two nodes
+        return self.visibility == 0
+
+    def bridge_name(self, tenant) -> str:
+        # linux bridge of the network, pnet networks use the host bridge of the same name
+        return f"vnet{tenant}_{self.id}" if self.type == "bridge" else self.type
+
+    def node_row(self) -> dict:
+        # visible network as a row of the nodes table, its id is net<network id>
+        return {"id": f"net{self.id}", "name": self.name, "status": "passive", "type": self.type,
+                "ethernet": str(self.count)}
+
+
+class LAB_TOPOLOGY():
+    __slots__ = ("tenant", "nodes", "nodes_by_name", "networks", "networks_by_name", "port_map_loaded")
+
+    def __init__(self, tenant=0) -> None:
+        self.tenant = tenant
+        self.nodes = {}
+        self.nodes_by_name = {}
+        self.networks = {}
+        self.networks_by_name = {}
+        # true when the interfaces of every node are loaded
+        self.port_map_loaded = False
+
+    def set_nodes(self, rows):
+        for row in rows:
+            node = LAB_NODE(row)
+            self.nodes[node.id] = node
+            self.nodes_by_name.setdefault(node.name, node)
+
+    def set_networks(self, data):
+        # networks of the rest api, network id -> network
+        self.networks = {}
+        self.networks_by_name = {}
+        for network_id, item in (data or {}).items():
+            network = LAB_NETWORK(network_id, item)
+            self.networks[network.id] = network
+            self.networks_by_name.setdefault(network.name, network)
+
+    def set_interfaces(self, node, rows):
+        node.interfaces = {}
+        node.interfaces_by_name = {}
+        for row in rows:
+            node_intf = LAB_INTERFACE(node, row, self.tenant)
+            node.interfaces[node_intf.id] = node_intf
+            node.interfaces_by_name.setdefault(node_intf.name, node_intf)
+
+    def node(self, key):
+        # node by id or name
+        return self.nodes.get(key) or self.nodes_by_name.get(key)
+
+    def network(self, key):
+        # network by id, net<id> or name
+        if key.startswith("net") and key[3:] in self.networks:
+            return self.networks[key[3:]]
+        return self.networks.get(key) or self.networks_by_name.get(key)
+
+    def interface(self, node, key):
+        # interface of a loaded node by id or name
+        return node.interfaces.get(key) or node.interfaces_by_name.get(key)
+
+    def visible_networks(self) -> list:
+        return [network for network in self.networks.values() if not network.hidden]
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class EVE_TRACE():
+    # timed spans of http requests, ssh commands, sftp calls and lab file parsing.
+    # phases are sequential labels of the script flow (connect, lab discovery, ...),
+    # every span is counted to the phase that was running when it started.
+    # nothing is recorded until enable is called.
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events = []
+        self.phases = []
+        self.current = None
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.start = time.perf_counter()
+
+    def _now(self) -> float:
+        # micro seconds since enable, the time unit of the chrome trace format
+        return (time.perf_counter() - self.start) * 1e6
+
+    def phase(self, name):
+        # end the running phase and start the next one
+        if not self.enabled:
+            return
+        now = self._now()
+        with self.lock:
+            if self.current:
+                self.current["dur"] = now - self.current["ts"]
+            self.current = {"name": name, "ts": now}
+            self.phases.append(self.current)
+
+    @contextmanager
+    def span(self, name, category, **args):
+        # time the block, the caller can add details like bytes to the yielded dict
+        if not self.enabled:
+            yield args
+            return
+        phase = self.current["name"] if self.current else ""
+        start = self._now()
+        try:
+            yield args
+        finally:
+            event = {"name": name, "cat": category, "ph": "X", "ts": start, "dur": self._now() - start,
+                     "pid": os.getpid(), "tid": threading.get_native_id(), "args": dict(args, phase=phase)}
+            with self.lock:
+                self.events.append(event)
+
+    def finish(self):
+        self.phase(None)
+        with self.lock:
+            if self.phases and self.phases[-1]["name"] is None:
+                self.phases.pop()
+            self.current = None
+
+    def report_rows(self) -> list:
+        # one row per phase name with time, count and bytes of its http, ssh and sftp spans
+        phases = {}
+        for phase in self.phases:
+            phases[phase["name"]] = phases.get(phase["name"], 0) + phase.get("dur", 0)
+        phases["total"] = self._now()
+        rows = []
+        for name, duration in phases.items():
+            events = [x for x in self.events if name == "total" or x["args"]["phase"] == name]
+            row = {"phase": name, "time ms": f"{duration / 1000:.1f}"}
+            for category in ["http", "ssh", "sftp", "xml"]:
+                items = [x for x in events if x["cat"] == category]
+                row[category] = (f"{len(items)} / {sum(x['dur'] for x in items) / 1000:.1f} ms"
+                                 if items else "")
+            size = sum(x["args"].get("bytes", 0) for x in events if x["cat"] != "xml")
+            row["bytes"] = str(size) if size else ""
+            rows.append(row)
+        return rows
+
+    def write(self, path):
+        # chrome trace format, open it in chrome://tracing or https://ui.perfetto.dev
+        events = [{"name": phase["name"], "cat": "phase", "ph": "X", "ts": phase["ts"],
+                   "dur": phase.get("dur", 0), "pid": os.getpid(), "tid": 0, "args": {}}
+                  for phase in self.phases]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events + self.events, "displayTimeUnit": "ms"}, file)
+
+
+TRACE = EVE_TRACE()
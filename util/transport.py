@@ -0,0 +1,144 @@
+import os
+import time
+import random
+import threading
+
+
+# timeouts, retries and keepalive of the http and ssh connections to eve-ng, and counters of
+# what went wrong on them. values come from .env and can be changed by the command line:
+#   eve_connect_timeout   seconds to open an http or ssh connection (default 10)
+#   eve_read_timeout      seconds to wait for an http response (default 60)
+#   eve_retries           tries again for GET requests and ssh connects (default 3)
+#   eve_ssh_keepalive     seconds between ssh keepalive packets, 0 disables them (default 30)
+# requests and paramiko are imported where they are used, listings must not load paramiko.
+
+# http status of a GET that is tried again, eve-ng answers 412 when the session expired
+RETRY_STATUS = {429, 502, 503, 504}
+LOGIN_STATUS = {401, 412}
+
+COUNTERS = ["http requests", "http retries", "http timeouts", "http errors", "http relogins",
+            "ssh connects", "ssh retries", "ssh timeouts", "ssh reconnects"]
+
+
+def env_number(name, default, kind=float):
+    value = os.environ.get(name)
+    try:
+        return kind(value) if value not in [None, ""] else default
+    except ValueError:
+        return default
+
+
+class EVE_TRANSPORT():
+    def __init__(self) -> None:
+        self.connect_timeout = 10.0
+        self.read_timeout = 60.0
+        self.retries = 3
+        self.keepalive = 30
+        # first wait before a retry and the longest wait, the wait is random up to
+        # backoff * 2 ** try so parallel workers do not come back at the same time
+        self.backoff = 0.5
+        self.backoff_max = 8.0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lock = threading.Lock()
+
+    def configure(self, args=None):
+        # .env values, then the command line options that are given
+        self.connect_timeout = env_number("eve_connect_timeout", self.connect_timeout)
+        self.read_timeout = env_number("eve_read_timeout", self.read_timeout)
+        self.retries = env_number("eve_retries", self.retries, int)
+        self.keepalive = env_number("eve_ssh_keepalive", self.keepalive, int)
+        for name in ["connect_timeout", "read_timeout", "retries"]:
+            if getattr(args, name, None) is not None:
+                setattr(self, name, getattr(args, name))
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def wait(self, attempt):
+        # jittered exponential backoff before try number attempt (1 for the first retry)
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+
+    def report_rows(self) -> list:
+        with self.lock:
+            return [{"counter": name, "value": str(value)} for name, value in self.counters.items()]
+
+    def problems(self) -> str:
+        # retries, timeouts and relogins as one line, empty when there were none
+        with self.lock:
+            return ", ".join(f"{value} {name}" for name, value in self.counters.items()
+                             if value and name not in ["http requests", "ssh connects"])
+
+
+TRANSPORT = EVE_TRANSPORT()
+
+
+def never_sent(error) -> bool:
+    # true when the connection to the server was not made, so it did not get the request
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HTTP_TRANSPORT():
+    # requests session of one eve-ng api with timeouts on every call, retries with backoff for
+    # GET (and the login) on connection errors, timeouts and 429/5xx, and a login again when the
+    # session expired. login is called with the transport lock held, once for all workers that
+    # saw the expired session at the same time.
+    def __init__(self, url, workers=8, login=None) -> None:
+        import requests
+        self.url = url
+        self.login = login
+        self.session = requests.session()
+        # one connection pool for all workers, workers wait for a free connection
+        # instead of opening connections that are thrown away after the request
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers), pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        # number of logins done, a worker logs in again only when nobody did since it sent its request
+        self.generation = 0
+
+    def request(self, method, path, retry=None, relogin=True, **kwargs):
+        # retry: send again after errors, GET by default. relogin: log in again on 401/412,
+        # not for the login request itself
+        import requests
+        retry = method.lower() == "get" if retry is None else retry
+        kwargs.setdefault("timeout", (TRANSPORT.connect_timeout, TRANSPORT.read_timeout))
+        attempt = 0
+        relogin = relogin and self.login is not None
+        while True:
+            generation = self.generation
+            TRANSPORT.count("http requests")
+            try:
+                response = self.session.request(method, f"{self.url}{path}", **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                timeout = isinstance(e, requests.Timeout)
+                if timeout:
+                    TRANSPORT.count("http timeouts")
+                # only a request that never reached the server is sent again when it is not idempotent,
+                # after a read timeout or a reset the server may have done it
+                if attempt >= TRANSPORT.retries or (not retry and not never_sent(e)):
+                    raise
+            else:
+                if response.status_code in LOGIN_STATUS and relogin:
+                    relogin = False
+                    with self.lock:
+                        if generation == self.generation:
+                            TRANSPORT.count("http relogins")
+                            self.login()
+                            self.generation += 1
+                    continue
+                if not (retry and response.status_code in RETRY_STATUS and attempt < TRANSPORT.retries):
+                    if response.status_code >= 500:
+                        TRANSPORT.count("http errors")
+                    return response
+            attempt += 1
+            TRANSPORT.count("http retries")
+            TRANSPORT.wait(attempt)
+
+    def close(self):
+        self.session.close()
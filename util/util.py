@@ -1,67 +1,204 @@
 
+import os
+import re
 import sys
+import time
+import hashlib
 import argparse
 import json
-import requests
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-import paramiko
+from .lab_index import listing_signature
+from .labfile import LAB_FILE
+from .labfile import LAB_FILE_CACHE
+from .topology import as_list
+from .topology import xml_interface
+from .topology import xml_network
+from .topology import LAB_TOPOLOGY
+from .profiles import BRIDGE_PROFILES
+from .trace import TRACE
+from .transport import TRANSPORT
+from .transport import HTTP_TRANSPORT
 
-import xmltodict
-from rich.console import Console
-from rich.table import Table
+# requests, paramiko and rich are imported where they are used, so listing labs
+# does not load the ssh crypto stack and json/tsv output does not load rich.
+
+
+# exit codes of the scripts
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_CONNECT = 3
+EXIT_NOT_FOUND = 4
+EXIT_CONFLICT = 5
+EXIT_COMMAND = 6
+EXIT_LAB_FILE = 7
+
+# exit code for the error codes of util/server_helper.py
+HELPER_EXIT = {"conflict": EXIT_CONFLICT, "not_found": EXIT_NOT_FOUND, "lab_file": EXIT_LAB_FILE}
+# the helper is uploaded next to the lab locks, one file per version of its content
+SERVER_HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_helper.py")
+# directory of the helper and the lab locks on the eve-ng server, in the home of the ssh user and
+# only readable and writable by it: a file another user put in /tmp first would run as that user
+SERVER_DIR = "~/.cache/eve-hot-connection"
+SERVER_DIR_MAKE = f"umask 077 && mkdir -p {SERVER_DIR} && chmod 700 {SERVER_DIR}"
+
+
+@dataclass
+class EVE_INFO():
+    ip: str = ""
+    server_user: str = ""
+    server_pass: str = ""
+    http_user: str = ""
+    http_pass: str = ""
+    url: str = ""
+    ssh_port: int = 22
+    # name of the server in a fleet inventory
+    name: str = ""
+
+
+def server_url(ip, http_port=None) -> str:
+    # url of the eve-ng rest api
+    return f"http://{ip}:{http_port}/api" if http_port else f"http://{ip}/api"
 
 
 class EVE_HTTP():
-    def __init__(self, eve_url, http_user, http_password) -> None:
+    def __init__(self, eve_url, http_user, http_password, workers=8) -> None:
         self.url = eve_url
         self.user = http_user
         self.password = http_password
         self.lab_name = ""
+        self.lab_lists = []
+        # optional LAB_INDEX used to resolve labs without a folder walk
+        self.lab_index = None
+        # nodes, interfaces and networks of the selected lab
+        self.topology = LAB_TOPOLOGY()
+        # number of concurrent requests used for lab discovery
+        self.workers = max(1, int(workers))
+        self.request_count = 0
+        self.request_time = 0.0
+        self._stats_lock = threading.Lock()
 
     def connect(self):
-        self.session = requests.session()
-        data = {"username":self.user,"password":self.password}
-        response = self.session.post(f"{self.url}/auth/login", data=json.dumps(data))
+        # one shared connection pool, big enough for all discovery workers.
+        # timeouts, retries and the login again after the session expired are in util/transport.py
+        self.transport = HTTP_TRANSPORT(self.url, workers=self.workers, login=self.login)
+        self.session = self.transport.session
+        response = self.login()
         if not response.ok:
             return response
         else:
-            response = self.session.get(f"{self.url}/auth")
-            self.user_id = response.json()["data"]["tenant"]
+            self.user_id = self._get_data("/auth")["tenant"]
             return True
 
+    def login(self):
+        data = {"username":self.user,"password":self.password}
+        return self._request("post", "/auth/login", data=json.dumps(data), retry=True, relogin=False)
+
+    def _request(self, method, path, **kwargs):
+        # send a request to eve api and keep count of requests and time spent
+        import requests
+        start = time.perf_counter()
+        with TRACE.span(f"{method.upper()} {path}", "http") as span:
+            try:
+                response = self.transport.request(method, path, **kwargs)
+            except requests.RequestException as e:
+                print(f"[    Error ] ==> {method.upper()} {path} to EVE http server failed: {e}")
+                sys.exit(EXIT_CONNECT)
+            span["status"] = response.status_code
+            span["bytes"] = len(kwargs.get("data") or "") + len(response.content)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.request_count += 1
+            self.request_time += elapsed
+        return response
+
+    def _get_data(self, path):
+        # "data" of a GET answer, an error answer stops here instead of failing on its json
+        return self._answer_data(path, self._request("get", path))
+
+    def get_changed(self, path, digests):
+        # "data" of a GET answer, or None when the answer is the same as the last one,
+        # digests keeps a hash of the last answer of every path. pollers skip the json
+        # parsing and the compare of what did not change
+        response = self._request("get", path)
+        digest = hashlib.sha1(response.content).hexdigest()
+        if response.ok and digests.get(path) == digest:
+            return None
+        data = self._answer_data(path, response)
+        digests[path] = digest
+        return data
+
+    def _answer_data(self, path, response):
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if not response.ok or "data" not in data:
+            message = data.get("message") or response.reason or f"status {response.status_code}"
+            print(f"[    Error ] ==> GET {path} failed: {response.status_code} {message}")
+            sys.exit(EXIT_NOT_FOUND if response.status_code == 404 else EXIT_CONNECT)
+        return data["data"]
+
+    def _get_folder(self, path):
+        data = self._get_data(f"/folders{path}")
+        return "folder", (path, data["folders"], data["labs"])
+
+    def _get_lab_info(self, path):
+        data = self._get_data(f"/labs{path}")
+        data["path"] = path
+        for item in ["author", "lock", "scripttimeout",
+                    "version","body","description"]:
+            data.pop(item, None)
+        return "lab", data
+
     def get_lab_lists(self):
-        # get all files and folder from eve-ng api
-        def get_folder_data(folder):
-            path = folder["path"]
-            response = self.session.get(f"{self.url}/folders{path}")
-            return response.json()["data"]["folders"], response.json()["data"]["labs"]
-        response = self.session.get(f"{self.url}/folders/")
-        list_of_files = response.json()["data"]
-        labs= list_of_files["labs"]
-        folders: list = list_of_files["folders"]
-        while folders:
-            folder = folders.pop()
-            if folder["name"] == "..":
-                continue
-            dir, lab = get_folder_data(folder)
-            labs = labs + lab
-            folders = folders + dir
+        # walk all folders and fetch lab details from eve-ng api concurrently.
+        # every folder listing queues its sub folders and labs as soon as it arrives.
+        # with a lab index, labs of unchanged folder listings are not fetched again.
+        start = time.perf_counter()
+        count_before = self.request_count
+        index = self.lab_index
         result = []
-        for lab in labs:
-            path = lab["path"]
-            response = self.session.get(f"{self.url}/labs{path}")
-            data = response.json()["data"]
-            data["path"] = path
-            for item in ["author", "lock", "scripttimeout",
-                        "version","body","description"]:
-                data.pop(item)
-            result.append(data)
+        folder_state = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self._get_folder, "/")}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, data = future.result()
+                    if kind == "lab":
+                        result.append(data)
+                        continue
+                    path, folders, labs = data
+                    folders = [folder for folder in folders if folder["name"] != ".."]
+                    for folder in folders:
+                        pending.add(pool.submit(self._get_folder, folder["path"]))
+                    signature = listing_signature(folders, labs)
+                    folder_state[path] = {"signature": signature,
+                                          "labs": {lab["path"]: listing_signature(lab) for lab in labs}}
+                    if index and (cached := index.folder_labs(path, signature)) is not None:
+                        result.extend(cached)
+                        continue
+                    for lab in labs:
+                        entry = folder_state[path]["labs"][lab["path"]]
+                        if index and (cached := index.cached_lab(path, lab["path"], entry)):
+                            result.append(cached)
+                        else:
+                            pending.add(pool.submit(self._get_lab_info, lab["path"]))
+        result.sort(key=lambda x: x["path"])
         self.lab_lists = result
+        if index:
+            index.update(result, folder_state)
+        print(f"[    Info  ] ==> Lab discovery: {self.request_count - count_before} requests "
+              f"in {time.perf_counter() - start:.2f}s with {self.workers} workers")
 
     def get_users(self):
         # show all eve-ng users
-        response = self.session.get(f"{self.url}/users/")
-        data = response.json()["data"]
+        data = self._get_data("/users/")
         result = []
         for _, user in data.items():
             for item in ["expiration", "session", "pod", "pexpiration"]:
@@ -71,7 +208,14 @@ class EVE_HTTP():
 
     def find_lab_name(self):
         # find lab base on name or ID
-        lab = list(filter(lambda x: self.lab_name in x["name"] or self.lab_name in x['id'], self.lab_lists))
+        if self.lab_index:
+            lab = self.lab_index.find(self.lab_name)
+            # cached index may be out of date, walk the folders once and try again
+            if not lab and not self.lab_index.refreshed:
+                self.get_lab_lists()
+                lab = self.lab_index.find(self.lab_name)
+        else:
+            lab = list(filter(lambda x: self.lab_name in x["name"] or self.lab_name in x['id'], self.lab_lists))
         if len(lab) > 1:
             print(f"[    Error ] ==> We found more than one lab with same {self.lab_name} information.\n")
             return False
@@ -84,13 +228,12 @@ class EVE_HTTP():
         return self.lab
 
     def get_lab_networks(self):
-        response = self.session.get(f"{self.url}/labs/{self.lab_path}/networks")
-        self.lab_networks = response.json()["data"]
+        self.lab_networks = self._get_data(f"/labs/{self.lab_path}/networks")
+        self.topology.set_networks(self.lab_networks)
 
     def get_lab_nodes(self):
-        # get lab nodes
-        response = self.session.get(f"{self.url}/labs{self.lab_path}/nodes")
-        nodes = response.json()["data"]
+        # get lab nodes, the rows are kept for tables and indexed in a new topology
+        nodes = self._get_data(f"/labs{self.lab_path}/nodes")
         result = []
         if nodes:
             for _, node in nodes.items():
@@ -103,109 +246,560 @@ class EVE_HTTP():
                 node["status"] = "OFF" if node["status"] == 0 else "ON"
                 result.append(node)
         self.lab_nodes = result
+        self.topology = LAB_TOPOLOGY(self.user_id)
+        self.topology.set_nodes(result)
 
     def is_node_id(self, node_id):
-        if node := list(filter(lambda x: x["id"] == node_id, self.lab_nodes)):
-            return node[0]
-        else:
-            return False
+        return self.topology.nodes.get(node_id) or False
 
     def get_node_interfaces(self, node):
-        response = self.session.get(f"{self.url}/labs/{self.lab_path}/nodes/{node["id"]}/interfaces")
-        data = response.json()["data"]
-        if data["sort"] in ["qemu", "vpcs"]:
-            for id, link in enumerate(data["ethernet"]):
-                link["network_id"] = str(link["network_id"])
-                link["connected"] = "True" if int(link["network_id"]) != 0 else "False"
-                link["id"] = str(id)
-        elif data["sort"] == "iol":
-            tmp = []
-            for id, link in data["ethernet"].items():
-                link["network_id"] = str(link["network_id"])
-                link["connected"] = "True" if int(link["network_id"]) != 0 else "False"
-                link["id"] = str(id)
-                tmp.append(link)
-            data["ethernet"] = tmp
-        return data["ethernet"]
-
-    def select_node_interface(self, device= ""):
-        # ask user to select a node fro a lab
+        return normalize_interfaces(self._get_data(f"/labs/{self.lab_path}/nodes/{node.id}/interfaces"))
+
+    def get_port_map(self) -> LAB_TOPOLOGY:
+        # fetch interfaces of every node in the lab concurrently into the topology
+        if not self.topology.port_map_loaded:
+            self.get_interfaces(list(self.topology.nodes.values()))
+            self.topology.port_map_loaded = True
+        return self.topology
+
+    def get_interfaces(self, nodes):
+        # interfaces of the nodes that are not loaded yet, fetched concurrently
+        nodes = [node for node in nodes if node.interfaces is None]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            interfaces = list(pool.map(self.get_node_interfaces, nodes))
+        for node, node_interfaces in zip(nodes, interfaces):
+            self.topology.set_interfaces(node, node_interfaces)
+
+    def get_running_nodes(self, labs) -> dict:
+        # ids of the running nodes of many labs fetched concurrently, lab path -> set of node ids
+        def running(lab):
+            nodes = self._get_data(f"/labs{lab['path'].replace(' ', '%20')}/nodes") or {}
+            return {str(node["id"]) for node in nodes.values() if node["status"] != 0}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip([lab["path"] for lab in labs], pool.map(running, labs)))
+
+    def port_map_rows(self) -> list:
+        # flat rows of the port map with the connected network, used for the port map table
+        topology = self.get_port_map()
+        rows = []
+        for node in topology.nodes.values():
+            for intf in node.interfaces.values():
+                network = topology.networks.get(intf.network_id)
+                rows.append({"node id": node.id, "node": node.name, "status": node.status,
+                             "port id": intf.id, "port": intf.name,
+                             "network id": intf.network_id if intf.connected else "",
+                             "network": network.name if network else "", "connected": str(intf.connected)})
+        return rows
+
+    def node_interfaces(self, node) -> list:
+        # interfaces of one node, fetched from eve-ng on first use
+        if node.interfaces is None:
+            self.topology.set_interfaces(node, self.get_node_interfaces(node))
+        return list(node.interfaces.values())
+
+    def select_node_interface(self, device= "", end_point=None):
+        # ask user to select a node fro a lab, or resolve end_point without asking.
+        # returns (node, interface, "node") or (network, None, "net")
+        if end_point:
+            return self.find_end_point(end_point)
         show_table({"Nodes List": self.lab_nodes})
-        node = input(f"Please Insert Node {device} id from above table: ")
+        node = ask(f"Please Insert Node {device} id from above table: ")
+        if node.startswith("net") and (network := self.topology.network(node)):
+            return network, None, "net"
         node = self.is_node_id(node)
         if node == False:
             print("[    Error ] ==> Input ID is not correct")
-            sys.exit(1)
-
-        if node["id"].startswith("net"):
-            return node, None, "net"
+            sys.exit(EXIT_NOT_FOUND)
 
-        node_interfaces = self.get_node_interfaces(node)
+        node_interfaces = self.node_interfaces(node)
         if len(node_interfaces) == 1:
             return node, node_interfaces[0], "node"
 
-        show_table({f"Interfaces for {node['name']}": node_interfaces})
-        node_intf = input("Please Insert port name or id from above Table: ")
-        node_intf = list(filter(lambda x: x["id"] == node_intf or x["name"] == node_intf, node_interfaces))
-        if node_intf:
-            return node, node_intf[0], "node"
+        show_table({f"Interfaces for {node.name}": [intf.row() for intf in node_interfaces]})
+        node_intf = ask("Please Insert port name or id from above Table: ")
+        if node_intf := self.topology.interface(node, node_intf):
+            return node, node_intf, "node"
         else:
             print("[    Error ] ==> selected Interface is not exist")
-            sys.exit(1)
+            sys.exit(EXIT_NOT_FOUND)
+
+    def find_end_point(self, end_point):
+        # "node:interface" or "net:network" with names or ids, same result as select_node_interface
+        if end_point.startswith("net:"):
+            name = end_point[4:]
+            if (network := self.topology.network(name)) and not network.hidden:
+                return network, None, "net"
+            print(f"[    Error ] ==> Network {name} is not exist in the lab")
+            sys.exit(EXIT_NOT_FOUND)
+        if ":" not in end_point:
+            print(f"[    Error ] ==> End point {end_point} should be node:interface or net:network")
+            sys.exit(EXIT_USAGE)
+        name, intf = end_point.rsplit(":", 1)
+        if not (node := self.topology.node(name)):
+            print(f"[    Error ] ==> Node {name} is not exist in the lab")
+            sys.exit(EXIT_NOT_FOUND)
+        self.node_interfaces(node)
+        if node_intf := self.topology.interface(node, intf):
+            return node, node_intf, "node"
+        print(f"[    Error ] ==> Interface {intf} is not exist on {node.name}")
+        sys.exit(EXIT_NOT_FOUND)
 
 class EVE_SSH():
-    def __init__(self, ip, user, password) -> None:
+    def __init__(self, ip, user, password, compress=False, port=22) -> None:
         self.ip = ip
+        self.port = port
         self.user = user
         self.password = password
-    
+        # zlib compression of the ssh transport, useful for big labs on slow links
+        self.compress = compress
+        # number of ssh channels opened for commands
+        self.channel_count = 0
+        self.sftp = None
+        # servers behind one address on other ssh ports get their own copies
+        self.lab_file_cache = LAB_FILE_CACHE(ip if int(port) == 22 else f"{ip}:{port}")
+        # settings of the bridges and taps of new links, see util/profiles.py
+        self.bridge_profiles = BRIDGE_PROFILES()
+        # link changes done on the server by util/server_helper.py, see run_helper
+        self.server_helper = False
+        # lab locks held on this connection, see lock_lab and ensure_connected
+        self.locks_held = 0
+        # background connect and lab file prefetch, see connect_background
+        self._background = None
+        self._background_tasks = []
+        self._background_ident = None
+        self._connect_task = None
+
     def connect(self):
-        self.client =  paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # a busy server (nodes booting) can be slow to answer, connects that time out or fail
+        # are tried again with backoff, a wrong password is not
+        import socket
+        import paramiko
+        attempt = 0
+        while True:
+            self.client =  paramiko.SSHClient()
+            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            TRANSPORT.count("ssh connects")
+            try:
+                with TRACE.span("ssh connect", "ssh", host=self.ip):
+                    self.client.connect(self.ip, port=self.port, username=self.user, password=self.password,
+                                        timeout=TRANSPORT.connect_timeout, banner_timeout=TRANSPORT.connect_timeout,
+                                        auth_timeout=TRANSPORT.connect_timeout, compress=self.compress)
+                break
+            except paramiko.AuthenticationException as e:
+                print(f"[    Error ]==> {e}")
+                sys.exit(EXIT_CONNECT)
+            except (OSError, paramiko.SSHException) as e:
+                if isinstance(e, socket.timeout) or "timeout" in str(e).lower():
+                    TRANSPORT.count("ssh timeouts")
+                if attempt >= TRANSPORT.retries:
+                    print(f"[    Error ]==> Could not open ssh connection to eve-ng server {self.ip}: {e}")
+                    sys.exit(EXIT_CONNECT)
+            attempt += 1
+            TRANSPORT.count("ssh retries")
+            TRANSPORT.wait(attempt)
+        if TRANSPORT.keepalive:
+            self.client.get_transport().set_keepalive(TRANSPORT.keepalive)
+
+    def reconnect(self):
+        # new ssh connection after the old one dropped, the sftp session goes with it
+        TRANSPORT.count("ssh reconnects")
+        print(f"[    Warrning ] ==> ssh connection to {self.ip} dropped, connect again")
+        self.client.close()
+        self.sftp = None
+        self.connect()
+
+    def ensure_connected(self):
+        # connect again before a command when the connection dropped, but not while a
+        # lab lock is held: the lock went with the old connection
+        transport = self.client.get_transport()
+        if transport is not None and transport.is_active():
+            return
+        if self.locks_held:
+            print(f"[    Error ] ==> ssh connection to {self.ip} dropped while the lab was locked")
+            sys.exit(EXIT_CONNECT)
+        self.reconnect()
+
+    def connect_background(self):
+        # connect and open sftp in a background thread, so the ssh handshake runs
+        # while the http login and the lab lookup are going on.
+        # the first use of the connection waits for it and raises its errors.
+        self._background = ThreadPoolExecutor(max_workers=1)
+        self._connect_task = self._background.submit(self._run_background, self._connect_sftp)
+        self._background_tasks.append(self._connect_task)
+
+    def prefetch_lab_file(self, lab_info):
+        # download the lab file into the local cache in the background,
+        # edit_lab_file then only has to check that it did not change
+        if self._background is None or self.server_helper:
+            return
+        self._background_tasks.append(self._background.submit(self._run_background, self._prefetch, lab_info))
+
+    def _run_background(self, task, *args):
+        self._background_ident = threading.get_ident()
+        return task(*args)
+
+    def _connect_sftp(self):
+        self.connect()
+        # the server helper works without sftp, it is opened when the client side path needs it
+        if not self.server_helper:
+            self.open_sftp()
+
+    def _prefetch(self, lab_info):
+        if self._connect_task.exception():
+            return
         try:
-            self.client.connect(self.ip, username=self.user, password=self.password, timeout=1.0)
-        except paramiko.AuthenticationException as e:
-            print(f"[    Error ]==> {e}")
-            sys.exit(1)
-        except:
-            print(f"[    Error ]==> Could not open ssh connection to eve-ng server {self.ip}")
-            sys.exit(1)
-
-    def send_command(self, cmd):
-         _stdin, _stdout, _stderr = self.client.exec_command(cmd)
-
-
-    def get_lab_file(self, lab_info) -> xmltodict.parse:
-        # read the lab file and convert it to dict
-        path = lab_info["path"]
-        _stdin, _stdout,_stderr = self.client.exec_command(f"cat '/opt/unetlab/labs/{path}'")
-        lab_file = _stdout.read().decode()
-        return xmltodict.parse(lab_file)
-
-    def update_lab_file(self, lab_info, file_data):
-        path = lab_info["path"]
-        new_unl = xmltodict.unparse(file_data, pretty=True)
-        ftp = self.client.open_sftp()
-        file = ftp.file(f"/opt/unetlab/labs/{path}","w")
-        file.write(new_unl)
-        file.flush()
-        file.close()
-        ftp.close()
+            self.get_lab_file(lab_info)
+        except Exception:
+            # only a cache fill, the lab file is read again when it is edited
+            pass
+
+    def wait_connected(self):
+        # wait for the background connect only, not for the lab file prefetch
+        if self._connect_task and threading.get_ident() != self._background_ident:
+            self._connect_task.result()
+
+    def wait(self):
+        # wait for background tasks, a failed connect exits here like connect would
+        if not self._background_tasks or threading.get_ident() == self._background_ident:
+            return
+        tasks, self._background_tasks = self._background_tasks, []
+        for task in tasks:
+            task.result()
+
+    def _exec(self, cmd, data=None, binary=False):
+        # run one command on a new exec channel and wait for its exit status
+        self.wait()
+        self.ensure_connected()
+        with TRACE.span(cmd, "ssh") as span:
+            _stdin, _stdout, _stderr = self.client.exec_command(cmd)
+            self.channel_count += 1
+            if data is not None:
+                _stdin.write(data)
+                _stdin.channel.shutdown_write()
+            output = _stdout.read()
+            error = _stderr.read().decode()
+            exit_status = _stdout.channel.recv_exit_status()
+            span["exit status"] = exit_status
+            span["bytes"] = len(data or "") + len(output) + len(error)
+        return exit_status, output if binary else output.decode(), error
+
+    def send_command(self, cmd, check=True):
+        exit_status, output, error = self._exec(cmd)
+        if check and exit_status != 0:
+            print(f"[    Error ] ==> command '{cmd}' failed with exit status {exit_status}: {error.strip()}")
+            sys.exit(EXIT_COMMAND)
+        return exit_status, output, error
+
+    def run_batch(self, commands, tool="ip", check=True) -> list:
+        # send all commands to one "ip -force -batch -" (or tc) process over a single channel
+        if not commands:
+            return []
+        lines = [cmd[len(tool) + 1:] if cmd.startswith(f"{tool} ") else cmd for cmd in commands]
+        exit_status, _output, error = self._exec(f"{tool} -force -batch -", data="\n".join(lines) + "\n")
+        return batch_results(commands, exit_status, error, check)
+
+    def run_steps(self, steps, check=True):
+        # [(tool, commands)] in one round trip: one batch process when only one tool has commands,
+        # else one "sh -s" with a batch process per tool
+        steps = [(tool, commands) for tool, commands in steps if commands]
+        if len(steps) == 1:
+            tool, commands = steps[0]
+            self.run_batch(commands, tool=tool, check=check)
+        elif steps:
+            self.run_timed([steps], check=check)
+
+    def run_timed(self, units, check=True) -> list:
+        # kernel commands of many changes in one "sh -s" on one channel. every change is a list of
+        # (tool, commands), each runs in its own ip (or tc) batch process between two time stamps
+        # taken on the server. returns the seconds from the first to the last command of every change,
+        # None for a change without commands
+        script = []
+        steps = []
+        for index, unit in enumerate(units):
+            for tool, commands in unit:
+                steps.append(commands)
+                script.append(f'echo "@@start {index} $(date +%s%N)"')
+                script.append(f"{tool} -force -batch - 2>&1 <<'EOF'")
+                script.extend(cmd[len(tool) + 1:] if cmd.startswith(f"{tool} ") else cmd for cmd in commands)
+                script.append("EOF")
+                script.append(f's=$?; echo "@@end {index} $s $(date +%s%N)"')
+        spans = [None] * len(units)
+        if not steps:
+            return spans
+        exit_status, output, error = self._exec("sh -s", data="\n".join(script) + "\n")
+        results = []
+        lines = []
+        for line in output.splitlines():
+            words = line.split()
+            if words[:1] == ["@@start"]:
+                start = int(words[2])
+                lines = []
+            elif words[:1] == ["@@end"] and steps:
+                index = int(words[1])
+                begin, end = spans[index] or (start, start)
+                spans[index] = (min(begin, start), max(end, int(words[3])))
+                # -force keeps going, the errors of the step are what it printed
+                results.extend(batch_results(steps.pop(0), int(words[2]), "\n".join(lines), check=False))
+            else:
+                lines.append(line)
+        if steps:
+            print(f"[    Error ] ==> kernel commands stopped with exit status {exit_status}: {error.strip()}")
+            sys.exit(EXIT_COMMAND)
+        if check and (failed := [result for result in results if not result["ok"]]):
+            for result in failed:
+                print(f"[    Error ] ==> '{result['command']}' failed: {result['error']}")
+            sys.exit(EXIT_COMMAND)
+        return [(span[1] - span[0]) / 1e9 if span else None for span in spans]
+
+    def open_sftp(self):
+        # one sftp session per ssh connection, opened on first use
+        self.wait()
+        self.ensure_connected()
+        if self.sftp is None:
+            with TRACE.span("sftp open", "sftp"):
+                self.sftp = self.client.open_sftp()
+            self.channel_count += 1
+        return self.sftp
+
+    def get_lab_file(self, lab_info) -> LAB_FILE:
+        # read the lab file, only the parts that are edited get parsed later.
+        # the file is downloaded only when its size or mtime changed since the last read.
+        path = lab_file_path(lab_info)
+        sftp = self.open_sftp()
+        with TRACE.span("sftp stat", "sftp", path=path):
+            stat = sftp.stat(path)
+        lab_file, settled = self.lab_file_cache.get(path, stat.st_size, stat.st_mtime)
+        if lab_file is not None and not settled:
+            # the copy may be older than a change in the second of its mtime
+            server_time, digest = self.server_sha1(path)
+            if digest != hashlib.sha1(lab_file).hexdigest():
+                lab_file = None
+            elif server_time > int(stat.st_mtime):
+                settled = True
+                self.lab_file_cache.put(path, None, stat.st_size, stat.st_mtime, settled=True)
+        if lab_file is None:
+            with TRACE.span("sftp read", "sftp", path=path, bytes=stat.st_size):
+                with sftp.open(path, "rb") as file:
+                    file.prefetch(stat.st_size)
+                    lab_file = file.read()
+            self.lab_file_cache.put(path, lab_file, stat.st_size, stat.st_mtime)
+        lab_file = LAB_FILE(lab_file)
+        # version of the file that was read, used to detect changes before writing
+        lab_file.stat = (stat.st_size, stat.st_mtime)
+        lab_file.settled = settled
+        return lab_file
+
+    def server_sha1(self, path):
+        # (time, sha1) of a file, both taken on the server so its mtime is compared with its own clock
+        _exit_status, output, _error = self._exec(f"date +%s; sha1sum '{path}'")
+        words = output.split()
+        return int(words[0]), words[1]
+
+    def lab_file_changed(self, lab_info, lab_file: LAB_FILE) -> bool:
+        # true when the lab file on the server is not the version in lab_file.
+        # size and mtime are enough for a settled copy, else the content hash on the server is compared.
+        path = lab_file_path(lab_info)
+        with TRACE.span("sftp stat", "sftp", path=path):
+            stat = self.open_sftp().stat(path)
+        if (stat.st_size, stat.st_mtime) != lab_file.stat:
+            return True
+        if lab_file.settled:
+            return False
+        _server_time, digest = self.server_sha1(path)
+        return digest != hashlib.sha1(lab_file.data).hexdigest()
+
+    def update_lab_file(self, lab_info, file_data: LAB_FILE, check_changed=False) -> bool:
+        # write to a temp file next to the lab and rename it over the lab,
+        # so a broken write never leaves a truncated lab file behind.
+        # with check_changed the write is skipped and False returned when the lab
+        # file changed since file_data was read.
+        path = lab_file_path(lab_info)
+        new_unl = file_data.tobytes()
+        sftp = self.open_sftp()
+        with TRACE.span("sftp stat", "sftp", path=path):
+            stat = sftp.stat(path)
+        tmp_path = f"{os.path.dirname(path)}/.{os.path.basename(path)}.{os.getpid()}.tmp"
+        try:
+            with TRACE.span("sftp write", "sftp", path=tmp_path, bytes=len(new_unl)):
+                with sftp.open(tmp_path, "wb") as file:
+                    file.set_pipelined(True)
+                    file.write(new_unl)
+                sftp.chmod(tmp_path, stat.st_mode & 0o7777)
+                sftp.chown(tmp_path, stat.st_uid, stat.st_gid)
+            if check_changed and self.lab_file_changed(lab_info, file_data):
+                sftp.remove(tmp_path)
+                return False
+            with TRACE.span("sftp rename", "sftp", path=path):
+                sftp.posix_rename(tmp_path, path)
+        except Exception:
+            try:
+                sftp.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with TRACE.span("sftp stat", "sftp", path=path):
+            stat = sftp.stat(path)
+        self.lab_file_cache.put(path, new_unl, stat.st_size, stat.st_mtime)
+        return True
+
+    @contextmanager
+    def lock_lab(self, lab_info, timeout=30):
+        # server side lock for one lab, held by a flock process on its own channel.
+        # the lock is released when we close stdin or when the connection drops.
+        self.wait()
+        self.ensure_connected()
+        path = lab_file_path(lab_info)
+        lock_path = lab_lock_path(lab_info)
+        with TRACE.span("lock lab", "ssh", path=path) as span:
+            _stdin, _stdout, _stderr = self.client.exec_command(
+                f"{SERVER_DIR_MAKE} && flock -x -w {timeout} {lock_path} -c 'echo locked; read line'")
+            self.channel_count += 1
+            span["locked"] = _stdout.readline().strip() == "locked"
+        if not span["locked"]:
+            error = _stderr.read().decode().strip()
+            print(f"[    Error ] ==> could not lock lab file {path}: {error or 'timeout'}")
+            sys.exit(EXIT_LAB_FILE)
+        self.locks_held += 1
+        try:
+            yield
+        finally:
+            self.locks_held -= 1
+            _stdin.write("\n")
+            _stdin.channel.shutdown_write()
+            _stdout.channel.recv_exit_status()
+
+    def edit_lab_file(self, lab_info, edit, retries=5):
+        # read, edit and write the lab file under the server side lock.
+        # if the file changed after it was read (for example from the eve-ng web ui)
+        # it is read again and the edit applied to the new content.
+        # network ids must be chosen inside edit, from the lab file it gets.
+        # nothing is written when edit did not change the lab file.
+        with self.lock_lab(lab_info):
+            for _ in range(retries):
+                lab_file = self.get_lab_file(lab_info)
+                result = edit(lab_file)
+                if not lab_file.changed():
+                    return result
+                if self.update_lab_file(lab_info, lab_file, check_changed=True):
+                    return result
+                print("[    Warrning ] ==> lab file changed while editing, read it again")
+        print(f"[    Error ] ==> lab file {lab_info['path']} kept changing, giving up after {retries} tries")
+        sys.exit(EXIT_LAB_FILE)
+
+    def run_helper(self, plan):
+        # one link change on the server with util/server_helper.py: the lab file is edited there and
+        # the kernel commands run there, one exec with the plan as json instead of lab file download,
+        # upload and ip commands. the helper is uploaded once for every version of it, and it runs
+        # only when its content has the hash of the local one, else it is uploaded again.
+        # returns the helper result, or None when the server cannot run it (no python3),
+        # the caller then makes the change from here.
+        with open(SERVER_HELPER, "rb") as file:
+            source = file.read()
+        digest = hashlib.sha1(source).hexdigest()
+        path = f"{SERVER_DIR}/helper-{digest[:16]}.py"
+        run = f'test "$(sha1sum < {path} 2>/dev/null)" = "{digest}  -" || exit 98; exec python3 {path}'
+        data = json.dumps(plan)
+        with TRACE.span("server helper", "ssh", path=plan["path"]):
+            exit_status, output, error = self._exec(run, data=data)
+            if exit_status == 98:
+                print("[    Info  ] ==> Upload server helper")
+                exit_status, _output, error = self._exec(f"{SERVER_DIR_MAKE} && cat > {path}.$$ && mv -f {path}.$$ {path}",
+                                                         data=source)
+                if exit_status == 0:
+                    exit_status, output, error = self._exec(run, data=data)
+        if exit_status == 127 or (exit_status == 98 and not output):
+            print(f"[    Warrning ] ==> server helper cannot run on {self.ip}, change the lab from here: {error.strip()}")
+            return None
+        try:
+            result = json.loads(output)
+        except ValueError:
+            print(f"[    Error ] ==> server helper failed with exit status {exit_status}: {error.strip()}")
+            sys.exit(EXIT_COMMAND)
+        if not result["ok"]:
+            print(f"[    Error ] ==> {result['error']}")
+            sys.exit(HELPER_EXIT.get(result["code"], EXIT_ERROR))
+        for step in result["kernel"]:
+            batch_results(step["commands"], step["exit status"], step["error"])
+        return result
 
     def get_linux_interfaces(self) -> json.loads:
         # get linux server interfaces as json 
-        _stdin, _stdout,_stderr = self.client.exec_command("ip --json add")
-        linux_interfaces = _stdout.read().decode()
+        _exit_status, linux_interfaces, _error = self._exec("ip --json add")
+        return json.loads(linux_interfaces)
+
+    def get_link_stats(self) -> list:
+        # counters (stats64) of every host interface with one command
+        _exit_status, linux_interfaces, _error = self._exec("ip -s -json link")
         return json.loads(linux_interfaces)
 
+    def get_ingress_qdiscs(self) -> set:
+        # interfaces with an ingress qdisc, the taps of direct (tc mirred) links have one
+        _exit_status, qdiscs, _error = self._exec("tc -json qdisc show")
+        return {qdisc["dev"] for qdisc in json.loads(qdiscs or "[]") if qdisc.get("kind") == "ingress"}
+
+def lab_file_path(lab_info) -> str:
+    # path of a lab file on the eve-ng server
+    return f"/opt/unetlab/labs/{lab_info['path'].lstrip('/')}"
+
+def lab_lock_path(lab_info) -> str:
+    # flock file of a lab on the eve-ng server, taken by lock_lab and by the server helper
+    return f"{SERVER_DIR}/{hashlib.sha1(lab_file_path(lab_info).encode()).hexdigest()[:16]}.lock"
+
+def helper_plan(lab_info, tenant, edits, kernel, allocate=False) -> dict:
+    # plan of a link change for util/server_helper.py, "{network_id}" in edits and kernel
+    # commands is the network id the helper allocates when allocate is true
+    return {"path": lab_file_path(lab_info), "lock": lab_lock_path(lab_info), "tenant": str(tenant),
+            "allocate": allocate, "edits": edits, "kernel": kernel}
+
+def batch_results(commands, exit_status, error, check=True) -> list:
+    # result of every command of an "ip -force -batch -" (or tc) run from its stderr.
+    # -force keeps going after a failed line, every failure is reported as
+    # "Command failed -:<line>" after the error message of that line.
+    failed = {}
+    message = []
+    for line in error.splitlines():
+        if match := re.match(r"Command failed \S+:(\d+)", line):
+            failed[int(match.group(1))] = " ".join(message) or line
+            message = []
+        elif line.strip():
+            message.append(line.strip())
+    results = [{"command": cmd, "ok": index not in failed, "error": failed.get(index, "")}
+               for index, cmd in enumerate(commands, start=1)]
+    if exit_status != 0 and not failed:
+        # the batch process itself failed, for example ip is missing
+        for result in results:
+            result["ok"] = False
+            result["error"] = " ".join(message) or f"exit status {exit_status}"
+    if check and exit_status != 0:
+        for result in results:
+            if not result["ok"]:
+                print(f"[    Error ] ==> '{result['command']}' failed: {result['error']}")
+        sys.exit(EXIT_COMMAND)
+    return results
+
+def normalize_interfaces(data) -> list:
+    # qemu and vpcs nodes return a list of interfaces, iol nodes a dict keyed by id
+    if data["sort"] == "iol" or isinstance(data["ethernet"], dict):
+        ethernet = data["ethernet"].items()
+    else:
+        ethernet = enumerate(data["ethernet"])
+    result = []
+    for id, link in ethernet:
+        link["network_id"] = str(link["network_id"])
+        link["connected"] = "True" if int(link["network_id"]) != 0 else "False"
+        link["id"] = str(id)
+        result.append(link)
+    return result
+
 def handler(signal_received, frame):
     # Handle any cleanup here
     print('\nSIGINT or CTRL-C detected. Exiting gracefully')
     exit(0)
 
 
-def show_table(table_data):
-    # show information as a table
+def make_table(table_data):
+    # rich table of the rows, the first key of table_data is the title
+    from rich.table import Table
     table = Table(title=list(table_data.keys())[0], show_lines=True)
     for _, rows in table_data.items():
         for cell in rows[0].keys():
@@ -213,29 +807,131 @@ def show_table(table_data):
     for _, rows in table_data.items():
         for id, row in enumerate(rows):
             table.add_row(*tuple(row.values()))
+    return table
+
+def show_table(table_data):
+    # show information as a table
+    from rich.console import Console
     console = Console()
-    console.print(table)
+    console.print(make_table(table_data))
+
+def ask(prompt) -> str:
+    # input() that fails with a clear error when there is nobody to answer
+    try:
+        return input(prompt)
+    except EOFError:
+        print(f"\n[    Error ] ==> no answer for '{prompt.strip()}', give it as an argument instead")
+        sys.exit(EXIT_USAGE)
+
+def show_rows(title, rows, output="table", stream=None):
+    # show rows as a rich table, as json, or as tsv written row by row.
+    # tsv needs no rendering of the whole table, so it stays fast for big labs.
+    stream = stream or sys.stdout
+    if output == "json":
+        json.dump(rows, stream)
+        stream.write("\n")
+    elif output == "tsv":
+        columns = list(rows[0].keys()) if rows else []
+        stream.write("\t".join(columns) + "\n")
+        for row in rows:
+            stream.write("\t".join(str(row.get(column, "")).replace("\t", " ").replace("\n", " ")
+                                   for column in columns) + "\n")
+    elif rows:
+        show_table({title: rows})
+    stream.flush()
+
+def show_result(result, output="table", stream=None):
+    # result of a link change as info lines, one json object or one tsv row
+    if output == "json":
+        stream = stream or sys.stdout
+        json.dump(result, stream)
+        stream.write("\n")
+        stream.flush()
+    elif output == "tsv":
+        show_rows("Result", [{key: ",".join(value) if isinstance(value, list) else value
+                              for key, value in result.items()}], output, stream)
+    else:
+        for key, value in result.items():
+            print(f"[    Info  ] ==> {key} = {', '.join(value) if isinstance(value, list) else value}")
+
+def set_children(element, name, children):
+    # store child elements back, the element is dropped when there is no child left
+    if children:
+        element[name] = children
+    else:
+        element.pop(name, None)
+
+def is_interface_connected(lab_file, node_id, intf_id) -> bool:
+    # true when the lab file already has a network on this node interface
+    if xml_node := lab_file.node(node_id):
+        return any(x["@id"] == str(intf_id) for x in as_list(xml_node.get("interface")))
+    return False
 
-def create_network(lab_networks, network_id, network_name):
+def create_network(lab_file, network_id, network_name):
     # this function will edit the lab file and add a new network
-    if not lab_networks:
-        lab_networks["network"] = {'@id': network_id, '@type': 'bridge', '@name': network_name, '@left': '504', '@top': '289', '@visibility': '0'}
-    elif isinstance(lab_networks["network"],dict):
-        lab_networks["network"] = [lab_networks["network"], {'@id': network_id, '@type': 'bridge', '@name': network_name, '@left': '504', '@top': '289', '@visibility': '0'}]
-    elif isinstance(lab_networks["network"], list):
-        lab_networks["network"].append({'@id': network_id, '@type': 'bridge', '@name': network_name, '@left': '504', '@top': '289', '@visibility': '0'})
-
-def connect_node_to_network(lab_nodes, node, node_intf, network_id):
+    lab_networks = lab_file.networks
+    networks = as_list(lab_networks.get("network"))
+    networks.append(xml_network(network_id, network_name))
+    set_children(lab_networks, "network", networks)
+
+def connect_node_to_network(lab_file, node, node_intf, network_id):
     # this function will edit the lab file and connect node to a network
-    for xml_node in lab_nodes["node"]:
-        if xml_node["@id"] == str(node["id"]):
-            if not xml_node.get("interface", None):
-                xml_node["interface"] = {'@id': node_intf["id"], '@name': node_intf["name"], '@type': 'ethernet', '@network_id': network_id}
-            elif isinstance(xml_node["interface"],dict):
-                xml_node["interface"] = [xml_node["interface"], {'@id': node_intf["id"], '@name': node_intf["name"], '@type': 'ethernet', '@network_id': network_id}]
-            elif isinstance(xml_node["interface"], list):
-                xml_node["interface"].append({'@id': node_intf["id"], '@name': node_intf["name"], '@type': 'ethernet', '@network_id': network_id})
+    if xml_node := lab_file.node(node.id):
+        interfaces = as_list(xml_node.get("interface"))
+        interfaces.append(xml_interface(node_intf, network_id))
+        set_children(xml_node, "interface", interfaces)
+
+def disconnect_node_interface(lab_file, node_id, intf_id):
+    # this function will edit the lab file and remove one node interface from its network
+    if xml_node := lab_file.node(node_id):
+        interfaces = [x for x in as_list(xml_node.get("interface")) if x["@id"] != str(intf_id)]
+        set_children(xml_node, "interface", interfaces)
+
+def remove_network(lab_file, network_id):
+    # this function will edit the lab file, disconnect every node from a network and remove it
+    for node_id in lab_file.nodes_on_network(network_id):
+        xml_node = lab_file.node(node_id)
+        interfaces = [x for x in as_list(xml_node.get("interface")) if int(x["@network_id"]) != int(network_id)]
+        set_children(xml_node, "interface", interfaces)
+    lab_networks = lab_file.networks
+    networks = [x for x in as_list(lab_networks.get("network")) if int(x["@id"]) != int(network_id)]
+    set_children(lab_networks, "network", networks)
+
+def direct_link_commands(tap_a, tap_b) -> list:
+    # tc commands that cross connect two taps without a bridge: what comes in on one tap
+    # is sent out of the other. u32 with an empty match is used as matchall is not in every kernel
+    commands = []
+    for tap_in, tap_out in [(tap_a, tap_b), (tap_b, tap_a)]:
+        commands.append(f"tc qdisc add dev {tap_in} handle ffff: ingress")
+        commands.append(f"tc filter add dev {tap_in} parent ffff: protocol all prio 1 u32 match u32 0 0 "
+                        f"action mirred egress redirect dev {tap_out}")
+    return commands
 
+def direct_unlink_commands(taps) -> list:
+    # tc commands that remove a direct link, the filters go with the ingress qdisc
+    return [f"tc qdisc del dev {tap} ingress" for tap in taps]
+
+
+def add_transport_args(parser):
+    # timeouts and retries of the http and ssh connections, see util/transport.py
+    parser.add_argument(
+        "--connect-timeout",
+        required=False,
+        type=float,
+        help="Seconds to open an http or ssh connection to eve-ng (default 10, or eve_connect_timeout).",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        required=False,
+        type=float,
+        help="Seconds to wait for an http answer of eve-ng (default 60, or eve_read_timeout).",
+    )
+    parser.add_argument(
+        "--retries",
+        required=False,
+        type=int,
+        help="Tries again for http GET requests and ssh connects that fail or time out (default 3, or eve_retries).",
+    )
 
 def init_args() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
@@ -253,6 +949,14 @@ def init_args() -> argparse.ArgumentParser:
         action="store_true",
         help="Show list of avalible lab in eve-ng.",
     )
+    gr_eve.add_argument(
+        "-W",
+        "--workers",
+        required=False,
+        type=int,
+        default=8,
+        help="Number of concurrent http requests used to discover labs (default 8).",
+    )
     gr_eve.add_argument(
         "-U",
         "--users-list",
@@ -260,6 +964,58 @@ def init_args() -> argparse.ArgumentParser:
         action="store_true",
         help="Show list of all users in eve-ng.",
     )
+    gr_eve.add_argument(
+        "-o",
+        "--output",
+        required=False,
+        choices=["table", "json", "tsv"],
+        default="table",
+        help="table (default), json or tsv. With json and tsv only results go to stdout, messages go to stderr.",
+    )
+    gr_eve.add_argument(
+        "--compress",
+        required=False,
+        action="store_true",
+        help="Compress the ssh connection, useful for big labs over slow links.",
+    )
+    add_transport_args(gr_eve)
+    gr_eve.add_argument(
+        "--server-helper",
+        required=False,
+        action="store_true",
+        help="Edit the lab file and program the bridges on the eve-ng server with a small helper, one ssh "
+             "command per change instead of lab file download and upload. Also eve_server_helper=1 in .env.",
+    )
+    gr_eve.add_argument(
+        "--bridge-profile",
+        required=False,
+        help="Bridge profile for bridges and taps of this run: default, fast, transparent or one of "
+             "bridge_profiles_file. Without it bridge_profile_p2p and bridge_profile_network from .env are used.",
+    )
+    gr_eve.add_argument(
+        "--cache-ttl",
+        required=False,
+        type=int,
+        default=300,
+        help="Seconds the local lab index is trusted before labs are discovered again, 0 disables it (default 300).",
+    )
+    gr_eve.add_argument(
+        "--refresh",
+        required=False,
+        action="store_true",
+        help="Refresh the local lab index from eve-ng before looking up the lab.",
+    )
+    gr_eve.add_argument(
+        "--profile",
+        required=False,
+        action="store_true",
+        help="Print time, requests and bytes of every phase when the script ends.",
+    )
+    gr_eve.add_argument(
+        "--trace-file",
+        required=False,
+        help="Write a trace of all http, ssh and sftp calls in chrome trace format (json) to this file.",
+    )
     gr_lab = parser.add_argument_group('EVE-NG LAB Info')
     gr_lab.add_argument(
         "-C",
@@ -275,10 +1031,29 @@ def init_args() -> argparse.ArgumentParser:
         action="store_true",
         help="Show list of all Nodes on chosen lab.",
     )
+    gr_node.add_argument(
+        "-P",
+        "--port-map",
+        required=False,
+        action="store_true",
+        help="Show all interfaces of every Node on chosen lab and their networks.",
+    )
     gr_node.add_argument(
         "-N",
         "--node-id",
         required=False,
         help="Show list of all interfaces for provided node ID.",
     )
+    gr_node.add_argument(
+        "-a",
+        "--node-a",
+        required=False,
+        help="Node A as node:interface or net:network (names or ids), no questions are asked for it.",
+    )
+    gr_node.add_argument(
+        "-b",
+        "--node-b",
+        required=False,
+        help="Node B as node:interface or net:network (names or ids), no questions are asked for it.",
+    )
     return parser
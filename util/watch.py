@@ -0,0 +1,130 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .util import normalize_interfaces
+from .trace import TRACE
+
+
+class LAB_WATCH():
+    # changes of a lab seen by polling the rest api over one session: node power, nodes and networks
+    # added or removed and interfaces connected, disconnected or moved to another network.
+    # every answer is hashed, an answer that is the same as the poll before is not parsed or compared.
+    # interfaces are one request per node, they are asked for the nodes that changed, for every node
+    # when the networks changed (a link landed or left) and every full_every polls, for moves that
+    # change neither.
+    def __init__(self, eve_http, full_every=10) -> None:
+        self.eve_http = eve_http
+        self.full_every = max(1, full_every)
+        # path -> hash of its last answer
+        self.digests = {}
+        # node id -> {"name", "status"}, network id -> {"name", "type", "visibility", "count"},
+        # (node id, interface id) -> {"name", "network_id"}
+        self.nodes = {}
+        self.networks = {}
+        self.ports = {}
+        self.polls = 0
+        self.requests = 0
+        self.unchanged = 0
+
+    def get(self, path):
+        self.requests += 1
+        data = self.eve_http.get_changed(f"/labs{self.eve_http.lab_path}{path}", self.digests)
+        if data is None:
+            self.unchanged += 1
+        return data
+
+    def network_label(self, network_id) -> str:
+        if network_id == "0":
+            return ""
+        network = self.networks.get(network_id)
+        return f"{network['name']} ({network_id})" if network else network_id
+
+    def event(self, events, event, name, old="", new=""):
+        events.append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "lab": self.eve_http.lab["path"],
+                       "event": event, "object": name, "old": old, "new": new})
+
+    def poll(self) -> list:
+        # one poll, returns the changes since the poll before. the first poll takes the lab as it is
+        first = self.polls == 0
+        self.polls += 1
+        events = []
+        with TRACE.span(f"watch poll {self.polls}", "watch") as span:
+            changed_nodes = set()
+            if (data := self.get("/nodes")) is not None:
+                # php gives an empty list for a lab without nodes
+                nodes = {str(node["id"]): {"name": node["name"], "status": "OFF" if node["status"] == 0 else "ON"}
+                         for node in (data or {}).values()}
+                for node_id, node in nodes.items():
+                    old = self.nodes.get(node_id)
+                    if old == node:
+                        continue
+                    changed_nodes.add(node_id)
+                    if first:
+                        continue
+                    if old is None:
+                        self.event(events, "node added", node["name"], new=node["status"])
+                    elif old["status"] != node["status"]:
+                        self.event(events, "node power", node["name"], old["status"], node["status"])
+                for node_id in self.nodes.keys() - nodes.keys():
+                    self.event(events, "node removed", self.nodes[node_id]["name"], old=self.nodes[node_id]["status"])
+                    self.ports = {key: value for key, value in self.ports.items() if key[0] != node_id}
+                self.nodes = nodes
+
+            networks_changed = False
+            if (data := self.get("/networks")) is not None:
+                networks = {str(network_id): {"name": item.get("name", ""), "type": item.get("type", ""),
+                                              "visibility": int(item.get("visibility", 0)),
+                                              "count": int(item.get("count", 0))}
+                            for network_id, item in (data or {}).items()}
+                networks_changed = True
+                if not first:
+                    for network_id in networks.keys() - self.networks.keys():
+                        self.event(events, "network added", f"{networks[network_id]['name']} ({network_id})",
+                                   new=networks[network_id]["type"])
+                    for network_id in self.networks.keys() - networks.keys():
+                        self.event(events, "network removed", self.network_label(network_id),
+                                   old=self.networks[network_id]["type"])
+                # removed networks keep their name for the interface events of this poll
+                self.networks = {**self.networks, **networks}
+                removed = self.networks.keys() - networks.keys()
+
+            if first or networks_changed or self.polls % self.full_every == 0:
+                targets = list(self.nodes)
+            else:
+                targets = sorted(changed_nodes)
+            with ThreadPoolExecutor(max_workers=self.eve_http.workers) as pool:
+                answers = list(pool.map(lambda node_id: self.get(f"/nodes/{node_id}/interfaces"), targets))
+            for node_id, data in zip(targets, answers):
+                if data is None:
+                    continue
+                node_name = self.nodes[node_id]["name"]
+                for intf in normalize_interfaces(data):
+                    key = (node_id, intf["id"])
+                    port = {"name": intf.get("name", intf["id"]), "network_id": intf["network_id"]}
+                    old = self.ports.get(key, {"network_id": "0"})["network_id"]
+                    self.ports[key] = port
+                    if first or old == port["network_id"]:
+                        continue
+                    name = f"{node_name}:{port['name']}"
+                    if old == "0":
+                        self.event(events, "interface connected", name, new=self.network_label(port["network_id"]))
+                    elif port["network_id"] == "0":
+                        self.event(events, "interface disconnected", name, old=self.network_label(old))
+                    else:
+                        self.event(events, "interface moved", name, self.network_label(old),
+                                   self.network_label(port["network_id"]))
+            if networks_changed:
+                for network_id in removed:
+                    self.networks.pop(network_id)
+            span["interfaces"] = len(targets)
+            span["events"] = len(events)
+        return events
+
+    def node_rows(self) -> list:
+        # the lab as it is now, a row per node with its connected interfaces
+        links = {}
+        for (node_id, _intf_id), port in sorted(self.ports.items(), key=lambda item: (int(item[0][0]), int(item[0][1]))):
+            if port["network_id"] != "0":
+                links.setdefault(node_id, []).append(f"{port['name']} > {self.network_label(port['network_id'])}")
+        return [{"id": node_id, "name": node["name"], "status": node["status"], "links": ", ".join(links.get(node_id, []))}
+                for node_id, node in sorted(self.nodes.items(), key=lambda item: int(item[0]))]
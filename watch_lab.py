@@ -0,0 +1,113 @@
+import sys
+import json
+import time
+import dotenv
+from collections import deque
+from signal import signal, SIGINT
+
+from util import EVE_HTTP
+from util import EVE_INFO
+
+from util import init_args
+from util import handler
+from util import init_server_info
+from util import args_check
+from util import show_rows
+from util import make_table
+from util import LAB_WATCH
+from util import TRACE
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    eve_info = EVE_INFO()
+
+    init_server_info(eve_info)
+
+    signal(SIGINT, handler)
+    parser = init_args()
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between polls (default 2).",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=0,
+        help="Number of polls after the first one, 0 (default) runs until CTRL-C.",
+    )
+    parser.add_argument(
+        "--full-every",
+        type=int,
+        default=10,
+        help="Ask the interfaces of every node each this many polls, also when nothing else changed (default 10).",
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        default=10,
+        help="Number of last changes shown under the live table (default 10).",
+    )
+    args = parser.parse_args()
+
+    # login to eve api server as admin, the watch needs no ssh
+    eve_http = EVE_HTTP(eve_url=eve_info.url, http_user=eve_info.http_user, http_password=eve_info.http_pass,
+                        workers=args.workers)
+
+    args_check(args, eve_http)
+
+    TRACE.phase("watch")
+    lab_watch = LAB_WATCH(eve_http, full_every=args.full_every)
+    lab_watch.poll()
+    print(f"[    Info  ] ==> Watching {len(lab_watch.nodes)} nodes and {len(lab_watch.networks)} networks "
+          f"of {eve_http.lab['path']}, poll every {args.interval}s")
+    # only the last changes are kept for the live table, all of them are counted
+    history = deque(maxlen=max(1, args.history))
+    changes = 0
+
+    def draw():
+        # nodes with their links and the last changes, redrawn in place
+        from rich.console import Group
+        title = f"Watch {eve_http.lab['path']} {time.strftime('%H:%M:%S')}"
+        tables = [make_table({title: lab_watch.node_rows()})] if lab_watch.nodes else []
+        if history:
+            tables.append(make_table({"Changes": list(history)}))
+        live.update(Group(*tables), refresh=True)
+
+    live = None
+    if args.output == "table" and sys.stdout.isatty():
+        from rich.live import Live
+        live = Live(auto_refresh=False)
+        live.start()
+        draw()
+    polls = 0
+    try:
+        while not args.count or polls < args.count:
+            time.sleep(args.interval)
+            events = lab_watch.poll()
+            polls += 1
+            history.extend(events)
+            changes += len(events)
+            if live:
+                draw()
+                continue
+            if not events:
+                continue
+            if args.output == "json":
+                # one json object per change, a line is written as soon as the change is seen
+                for event in events:
+                    args.stream.write(json.dumps(event) + "\n")
+                args.stream.flush()
+            else:
+                show_rows("Changes", events, args.output, args.stream)
+    finally:
+        if live:
+            live.stop()
+
+    TRACE.phase("close")
+    print(f"[    Info  ] ==> {lab_watch.polls} polls, {lab_watch.requests} requests, "
+          f"{lab_watch.unchanged} answers unchanged, {changes} changes")
+    print("[    Info  ] ==> Close HTTP connection")
+    eve_http.session.close()